@@ -0,0 +1,205 @@
+"""
+Download cache for files the examples need (e.g. the mock ERP executable).
+
+A download is streamed in chunks to a ".part" file next to the cached file, and the SHA-256
+is computed on the way. If the connection breaks, the download is resumed where it stopped
+(HTTP Range request, guarded by If-Range so a changed file isn't stitched together from two
+versions), in this run or in the next one. Only a complete download whose checksum matches
+is renamed to its final name, atomically, and a small metadata file (URL, size, SHA-256, ETag)
+is written next to it.
+
+A later run uses the cached file without touching the network only if it still matches its
+metadata (and the expected checksum, if one is given). A file that doesn't, e.g. one truncated
+by an earlier version of this example, is downloaded again.
+
+    cache = ArtifactCache()
+    path = await cache.fetch("mini-erp-mock.exe", url, sha256=None)
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class DownloadError(Exception):
+    """The artifact could not be downloaded or didn't pass verification."""
+
+
+def file_sha256(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_path, path)
+
+
+class ArtifactCache:
+    """Verified, resumable downloads into a cache directory."""
+    def __init__(self, directory: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 max_attempts: int = 3, timeout: float = 60.0):
+        """
+        Args:
+            directory: Cache directory (default: "smooth-operator-artifacts" in the temp directory).
+            chunk_size: Size of the chunks written to disk.
+            max_attempts: Connection attempts per fetch; each one resumes the previous one.
+            timeout: Timeout of the HTTP requests (per read, not for the whole download).
+        """
+        self.directory = directory or os.path.join(tempfile.gettempdir(), "smooth-operator-artifacts")
+        self.chunk_size = chunk_size
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _metadata_path(self, name: str) -> str:
+        return self.path(name) + ".json"
+
+    def _part_path(self, name: str) -> str:
+        return self.path(name) + ".part"
+
+    def cached(self, name: str, url: str, sha256: Optional[str] = None) -> Optional[str]:
+        """Return the path of the cached file if it is complete and verified, otherwise None."""
+        path = self.path(name)
+        metadata = _read_json(self._metadata_path(name))
+        if not metadata or not os.path.exists(path) or metadata.get("url") != url:
+            return None
+        if os.path.getsize(path) != metadata.get("size"):
+            return None
+        expected = (sha256 or metadata.get("sha256") or "").lower()
+        if not expected or file_sha256(path, self.chunk_size) != expected:
+            return None
+        return path
+
+    async def fetch(self, name: str, url: str, sha256: Optional[str] = None) -> str:
+        """
+        Return the path of a verified copy of `url`, downloading (or resuming) it if necessary.
+
+        Args:
+            name: File name in the cache directory.
+            url: Download URL.
+            sha256: Expected SHA-256 (hex). Without it, the download is checked against the
+                    announced size, and the checksum recorded then protects the cached copy.
+
+        Raises:
+            DownloadError: If the download fails or doesn't match the expected size or checksum.
+        """
+        path = self.cached(name, url, sha256)
+        if path:
+            print(f"{name} found in cache and verified, skipping download.")
+            return path
+
+        import httpx
+
+        last_error: Optional[Exception] = None
+        async with httpx.AsyncClient(follow_redirects=True, timeout=self.timeout) as http_client:
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    return await self._download(http_client, name, url, sha256)
+                except (httpx.TransportError, httpx.HTTPStatusError) as ex:
+                    last_error = ex
+                    print(f"Download of {name} interrupted ({ex.__class__.__name__}: {ex}), "
+                          f"attempt {attempt}/{self.max_attempts}.")
+        raise DownloadError(f"Could not download {name}: {last_error}")
+
+    async def _download(self, http_client, name: str, url: str, sha256: Optional[str]) -> str:
+        part_path = self._part_path(name)
+        part_metadata_path = part_path + ".json"
+        part_metadata = _read_json(part_metadata_path) or {}
+        if part_metadata.get("url") != url and os.path.exists(part_path):
+            os.remove(part_path)  # Leftover of another URL
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+
+        # Byte ranges and sizes refer to the file itself, not to a compressed transfer
+        headers = {"Accept-Encoding": "identity"}
+        validator = part_metadata.get("etag") or part_metadata.get("last_modified")
+        if offset and validator:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = validator
+        elif offset:
+            offset = 0  # Without a validator, a resumed download could mix two versions of the file
+
+        async with http_client.stream("GET", url, headers=headers) as response:
+            if response.status_code == 416:
+                # The part file is not a prefix of the current file (e.g. it is complete or too long)
+                os.remove(part_path)
+                raise httpx.HTTPStatusError("Range not satisfiable, restarting download",
+                                            request=response.request, response=response)
+            response.raise_for_status()
+            if response.status_code == 206:
+                content_range = response.headers.get("content-range") or ""
+                if not content_range.startswith(f"bytes {offset}-"):
+                    os.remove(part_path)
+                    raise httpx.TransportError(f"Unexpected Content-Range '{content_range}', restarting download")
+                print(f"Resuming download of {name} at {offset} bytes...")
+                total_size = _total_size_from_content_range(content_range)
+            else:
+                offset = 0  # Server sent the whole file
+                content_length = response.headers.get("content-length")
+                total_size = int(content_length) if content_length else None
+            _write_json(part_metadata_path, {
+                "url": url,
+                "etag": response.headers.get("etag") or part_metadata.get("etag"),
+                "last_modified": response.headers.get("last-modified") or part_metadata.get("last_modified"),
+                "size": total_size,
+            })
+
+            digest = hashlib.sha256()
+            if offset:
+                with open(part_path, "rb") as f:
+                    while chunk := f.read(self.chunk_size):
+                        digest.update(chunk)
+            with open(part_path, "ab" if offset else "wb") as f:
+                async for chunk in response.aiter_bytes(self.chunk_size):
+                    f.write(chunk)
+                    digest.update(chunk)
+
+        size = os.path.getsize(part_path)
+        if total_size is not None and size != total_size:
+            raise httpx.TransportError(f"Download incomplete: {size} of {total_size} bytes")
+        actual = digest.hexdigest()
+        if sha256 and actual != sha256.lower():
+            os.remove(part_path)
+            os.remove(part_metadata_path)
+            raise DownloadError(f"Checksum mismatch for {name}: expected {sha256}, got {actual}")
+
+        path = self.path(name)
+        os.replace(part_path, path)
+        os.remove(part_metadata_path)
+        _write_json(self._metadata_path(name), {
+            "url": url,
+            "size": size,
+            "sha256": actual,
+            "etag": response.headers.get("etag"),
+            "downloaded_at": time.time(),
+        })
+        print(f"Downloaded {name} ({size} bytes, sha256 {actual[:12]}...).")
+        return path
+
+
+def _total_size_from_content_range(content_range: Optional[str]) -> Optional[int]:
+    """Parse the total size from a header like "bytes 100-999/1000"."""
+    if not content_range or "/" not in content_range:
+        return None
+    total = content_range.rsplit("/", 1)[1]
+    return int(total) if total.isdigit() else None
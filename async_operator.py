@@ -0,0 +1,152 @@
+"""
+Awaitable facade over the synchronous SmoothOperatorClient and OpenAI clients.
+
+The client libraries block while their HTTP requests are in flight. Calling them directly
+from a coroutine stalls the whole event loop, so nothing else (e.g. an LLM extraction) can
+make progress at the same time. This facade runs every call on a bounded thread pool and
+returns awaitables instead:
+
+    ops = AsyncSmoothOperator(client, openai_api_key=openai_api_key)
+    overview = await ops.system.get_overview()
+    completion = await ops.chat(model="gpt-4o", messages=[...])
+
+Client calls are grouped into lanes with their own concurrency limits:
+- "input": anything that drives mouse, keyboard, browser or UI elements. Only one at a time,
+  because concurrent input on the same desktop would interleave.
+- "read": calls that only observe the desktop (overview, window details, screenshots, page text).
+
+OpenAI requests go through the shared LlmScheduler (see llm_scheduler.py), which has its own
+concurrency and rate limits.
+
+Every call is recorded as a tracing span (see tracing.py) with its lane, queue wait and payload sizes.
+"""
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from llm_scheduler import LlmScheduler, PRIORITY_INTERACTIVE, get_shared_scheduler
+from tracing import call_attributes, record_result, span
+
+READ_METHODS = {
+    "screenshot.take",
+    "screenshot.find_ui_element",
+    "system.get_overview",
+    "system.get_window_details",
+    "automation.get_window_details",
+    "chrome.explain_current_tab",
+    "chrome.get_dom",
+    "chrome.get_text",
+}
+
+DEFAULT_LIMITS = {"input": 1, "read": 4}
+
+API_NAMES = ("screenshot", "system", "mouse", "keyboard", "chrome", "automation", "code")
+
+
+class _AsyncApi:
+    """Wraps one API category of the client (e.g. `client.chrome`) so its methods return awaitables."""
+    def __init__(self, owner: 'AsyncSmoothOperator', api: Any, api_name: str):
+        self._owner = owner
+        self._api = api
+        self._api_name = api_name
+
+    def __getattr__(self, method_name: str) -> Callable:
+        method = getattr(self._api, method_name)
+        if not callable(method):
+            return method
+        call_name = f"{self._api_name}.{method_name}"
+
+        @functools.wraps(method)
+        def call(*args, **kwargs):
+            return self._owner.run(call_name, method, *args, **kwargs)
+        return call
+
+
+class AsyncSmoothOperator:
+    """Awaitable facade over a SmoothOperatorClient and (optionally) OpenAI."""
+    def __init__(self, client, openai_api_key: Optional[str] = None, openai_client=None,
+                 llm_scheduler: Optional[LlmScheduler] = None,
+                 max_workers: int = 8, limits: Optional[Dict[str, int]] = None):
+        """
+        Args:
+            client: The SmoothOperatorClient to wrap.
+            openai_api_key: Uses the shared LlmScheduler for this key if given.
+            openai_client: An existing OpenAI client to schedule chat() requests on instead.
+            llm_scheduler: An existing LlmScheduler to use for chat().
+            max_workers: Size of the thread pool the client calls run on.
+            limits: Concurrency limit per lane ("input", "read") or per call name
+                    (e.g. {"mouse.click_by_description": 1}). Merged over DEFAULT_LIMITS.
+        """
+        self.client = client
+        if llm_scheduler is None and openai_client is not None:
+            llm_scheduler = LlmScheduler(openai_client=openai_client)
+        elif llm_scheduler is None and openai_api_key:
+            llm_scheduler = get_shared_scheduler(openai_api_key)
+        self.llm = llm_scheduler
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="smooth-operator")
+        self._limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+        for api_name in API_NAMES:
+            setattr(self, api_name, _AsyncApi(self, getattr(client, api_name), api_name))
+
+    @property
+    def openai_client(self):
+        """The OpenAI client used by chat(), or None if OpenAI is not configured."""
+        return self.llm.client if self.llm else None
+
+    def lane_for(self, call_name: str) -> str:
+        """Return the concurrency lane a call belongs to."""
+        if call_name in self._limits:
+            return call_name
+        return "read" if call_name in READ_METHODS else "input"
+
+    def _semaphore(self, lane: str) -> asyncio.Semaphore:
+        if lane not in self._semaphores:
+            self._semaphores[lane] = asyncio.Semaphore(self._limits[lane])
+        return self._semaphores[lane]
+
+    async def run(self, call_name: str, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking call on the thread pool, respecting the limit of its lane."""
+        lane = self.lane_for(call_name)
+        # The span is opened here, not in the worker thread, because run_in_executor() doesn't
+        # copy the context and the span would lose its parent stage
+        with span(call_name, lane=lane, **call_attributes(call_name, args, kwargs)) as current:
+            queued_at = time.perf_counter()
+            async with self._semaphore(lane):
+                current.set(queue_wait_ms=round((time.perf_counter() - queued_at) * 1000, 3))
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+            if not call_name.startswith("server."):
+                record_result(current, result)
+            return result
+
+    async def chat(self, priority: int = PRIORITY_INTERACTIVE, **kwargs) -> Any:
+        """Awaitable `chat.completions.create(**kwargs)`, scheduled by the LlmScheduler."""
+        if self.llm is None:
+            raise ValueError("No OpenAI client configured. Pass openai_api_key, openai_client or llm_scheduler.")
+        return await self.llm.chat(priority=priority, **kwargs)
+
+    def chat_stream(self, priority: int = PRIORITY_INTERACTIVE, **kwargs) -> AsyncIterator[str]:
+        """Streamed chat completion: an async iterator of the pieces of the answer (see LlmScheduler.chat_stream())."""
+        if self.llm is None:
+            raise ValueError("No OpenAI client configured. Pass openai_api_key, openai_client or llm_scheduler.")
+        return self.llm.chat_stream(priority=priority, **kwargs)
+
+    async def start_server(self) -> None:
+        await self.run("server.start", self.client.start_server)
+
+    async def stop_server(self) -> None:
+        await self.run("server.stop", self.client.stop_server)
+
+    def close(self) -> None:
+        """Shut down the thread pool (running calls are allowed to finish)."""
+        self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
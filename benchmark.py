@@ -0,0 +1,268 @@
+"""
+Benchmark of the example flows against local fakes, without Windows, ScreenGrasp or OpenAI.
+
+The real flows (main_calculator, run_twitter_checker, run_minimal_twitter_checker and
+run_collect_orders_erp) run unchanged; only SmoothOperatorClient and the OpenAI client are
+replaced by the fakes from fake_agent.py, which answer with configurable latencies. The mock
+ERP is downloaded from a local HTTP server, input() returns immediately, and the fixed sleeps
+in the flows can be scaled down.
+
+    python benchmark.py --iterations 5
+    python benchmark.py --flows calculator orders --latency-scale 0.2 --sleep-scale 0.1
+    python benchmark.py --json results.json
+    python benchmark.py --compare results.json   # exit code 1 if a flow got slower
+    python benchmark.py --trace-jsonl spans.jsonl --openmetrics spans.prom
+    python benchmark.py --flows orders --iterations 1 --record orders.jsonl
+    python benchmark.py --flows orders --replay orders.jsonl --replay-speed 0
+
+The report shows, per flow, the end-to-end latency percentiles, the throughput and the latency
+of each client / OpenAI call (as answered by the fakes).
+
+With --replay, a flow runs against a recorded session (see session_recording.py) instead of the
+fakes, e.g. one recorded on a real desktop with SESSION_RECORD. With --replay-speed 0 the calls
+return immediately, so only the Python code of the flow is measured.
+"""
+import argparse
+import asyncio
+import builtins
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import calculator_example
+import collect_orders_erp
+import twitter_ai_news_checker
+import twitter_ai_news_checker_minimal
+from fake_agent import (DEFAULT_LATENCIES, CallRecorder, FakeArtifactServer, FakeDesktop, FakeOpenAI,
+                        FakeSmoothOperatorClient)
+from llm_scheduler import LlmScheduler, set_shared_scheduler
+from session_recording import SessionReplayer, start_recording, start_replay
+from timing_stats import StageStats
+from tracing import tracer
+
+FAKE_SCREENGRASP_API_KEY = "benchmark-screengrasp-key"
+FAKE_OPENAI_API_KEY = "benchmark-openai-key"
+FAKE_ERP_EXECUTABLE = b"MZ" + b"\0" * 256 * 1024
+
+
+class Flow:
+    """A benchmarked flow: the coroutine function, the module it creates its client in, and a success check."""
+    def __init__(self, name: str, run: Callable, module: Any, succeeded: Callable[[FakeDesktop, List[str]], bool]):
+        self.name = name
+        self.run = run
+        self.module = module
+        self.succeeded = succeeded
+
+
+FLOWS = {
+    "calculator": Flow("calculator", calculator_example.main_calculator, calculator_example,
+                       lambda desktop, calls: desktop.calculator_display == "7"),
+    "twitter": Flow("twitter", twitter_ai_news_checker.run_twitter_checker, twitter_ai_news_checker,
+                    lambda desktop, calls: "openai.chat" in calls),
+    "twitter-minimal": Flow("twitter-minimal", twitter_ai_news_checker_minimal.run_minimal_twitter_checker,
+                            twitter_ai_news_checker_minimal, lambda desktop, calls: "openai.chat" in calls),
+    "orders": Flow("orders", collect_orders_erp.run_collect_orders_erp, collect_orders_erp,
+                   lambda desktop, calls: desktop.orders_saved == 1),
+}
+
+
+class FlowResult:
+    """End-to-end and per-call latencies of the runs of one flow."""
+    def __init__(self, name: str):
+        self.name = name
+        self.end_to_end = StageStats(name)
+        self.steps: Dict[str, StageStats] = {}
+        self.failures = 0
+        self.elapsed = 0.0
+        self.last_failure_output = ""
+
+    @property
+    def runs(self) -> int:
+        return len(self.end_to_end.durations)
+
+    @property
+    def runs_per_minute(self) -> float:
+        return self.runs / (self.elapsed / 60) if self.elapsed > 0 else 0.0
+
+    def add_calls(self, calls: List[Tuple[str, float]]) -> None:
+        for call_name, duration in calls:
+            self.steps.setdefault(call_name, StageStats(call_name)).add(duration)
+
+    def report(self) -> str:
+        stats = self.end_to_end
+        lines = [f"{self.name}: {self.runs} runs ({self.failures} failed), {self.runs_per_minute:.1f} runs/minute, "
+                 f"end-to-end p50={stats.percentile(50):.2f}s p95={stats.percentile(95):.2f}s max={max(stats.durations):.2f}s"]
+        lines.append(f"  {'step':<32} {'calls/run':>9} {'p50':>7} {'p95':>7} {'total/run':>9}")
+        for step in sorted(self.steps.values(), key=lambda s: -sum(s.durations)):
+            lines.append(f"  {step.name:<32} {len(step.durations) / self.runs:>9.1f} {step.percentile(50):>6.2f}s "
+                         f"{step.percentile(95):>6.2f}s {sum(step.durations) / self.runs:>8.2f}s")
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "runs_per_minute": self.runs_per_minute,
+            "p50": self.end_to_end.percentile(50),
+            "p95": self.end_to_end.percentile(95),
+            "steps": {name: {"calls_per_run": len(step.durations) / self.runs,
+                             "p50": step.percentile(50), "p95": step.percentile(95)}
+                      for name, step in self.steps.items()},
+        }
+
+
+@contextlib.contextmanager
+def fake_environment(sleep_scale: float):
+    """Environment variables, temp directory, artifact server and patched builtins for the benchmark."""
+    with FakeArtifactServer(FAKE_ERP_EXECUTABLE, etag='"benchmark"') as server:
+        variables = {
+            "SCREENGRASP_API_KEY": FAKE_SCREENGRASP_API_KEY,
+            "OPENAI_API_KEY": FAKE_OPENAI_API_KEY,
+            "MOCK_ERP_URL": server.url,
+            # Set (empty) so that a local .env doesn't add them
+            "MOCK_ERP_SHA256": "",
+            "EMAIL_SCREENSHOT_REGION": "",
+            "ORDER_LEDGER_PATH": "",
+        }
+        saved_variables = {name: os.environ.get(name) for name in variables}
+        saved_tempdir, saved_input, saved_sleep = tempfile.tempdir, builtins.input, asyncio.sleep
+
+        def scaled_sleep(delay, result=None):
+            return saved_sleep(delay * sleep_scale, result)
+
+        os.environ.update(variables)
+        # Caches and stores of the flows (tweets, element IDs, downloads) go to a fresh directory
+        tempfile.tempdir = tempfile.mkdtemp(prefix="smooth-operator-benchmark-")
+        builtins.input = lambda *args: ""
+        asyncio.sleep = scaled_sleep
+        try:
+            yield
+        finally:
+            asyncio.sleep = saved_sleep
+            builtins.input = saved_input
+            tempfile.tempdir = saved_tempdir
+            for name, value in saved_variables.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+
+async def benchmark_flow(flow: Flow, iterations: int, latency_scale: float, seed: int, verbose: bool,
+                         replayer: Optional[SessionReplayer] = None) -> FlowResult:
+    result = FlowResult(flow.name)
+    recorder = CallRecorder()
+    # While a session is replayed (start_replay()), session_client() and session_openai() replace the
+    # whole client chain of the flows, the same layer the recording was made at, so the fakes get no calls
+    scheduler = LlmScheduler(openai_client=FakeOpenAI(DEFAULT_LATENCIES, recorder, latency_scale, seed=seed))
+    set_shared_scheduler(FAKE_OPENAI_API_KEY, scheduler)
+    original_client_class = flow.module.SmoothOperatorClient
+    started_at = time.perf_counter()
+    try:
+        for iteration in range(iterations):
+            desktop = FakeDesktop()
+            # Every run starts with an empty ERP, so the orders must not be skipped as entered by the last run
+            os.environ["ORDER_LEDGER_PATH"] = os.path.join(tempfile.gettempdir(), f"orders-{flow.name}-{iteration}.sqlite3")
+            if replayer:
+                replayer.rewind()
+            flow.module.SmoothOperatorClient = lambda api_key=None, base_url=None: FakeSmoothOperatorClient(
+                api_key, base_url, desktop=desktop, latencies=DEFAULT_LATENCIES, recorder=recorder,
+                latency_scale=latency_scale, seed=seed + iteration)
+            output = io.StringIO()
+            start_time = time.perf_counter()
+            with contextlib.redirect_stdout(sys.stdout if verbose else output):
+                await flow.run()
+            result.end_to_end.add(time.perf_counter() - start_time)
+            calls = recorder.take()
+            result.add_calls(calls)
+            succeeded = replayer.missing == 0 if replayer else flow.succeeded(desktop, [call_name for call_name, _ in calls])
+            if not succeeded:
+                result.failures += 1
+                result.last_failure_output = output.getvalue()
+    finally:
+        flow.module.SmoothOperatorClient = original_client_class
+        scheduler.close()
+    result.elapsed = time.perf_counter() - started_at
+    return result
+
+
+def compare(results: Dict[str, FlowResult], baseline_path: str, tolerance: float) -> bool:
+    """Print the change of the end-to-end p50 against a baseline; returns False on a regression."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    ok = True
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]["p50"], result.end_to_end.percentile(50)
+        change = (after - before) / before if before else 0.0
+        regressed = change > tolerance
+        ok = ok and not regressed
+        print(f"{name}: p50 {before:.2f}s -> {after:.2f}s ({change:+.0%}){'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+async def run_benchmark(flow_names: List[str], iterations: int = 3, latency_scale: float = 1.0,
+                        sleep_scale: float = 1.0, seed: int = 0, verbose: bool = False,
+                        replayer: Optional[SessionReplayer] = None) -> Dict[str, FlowResult]:
+    results = {}
+    with fake_environment(sleep_scale):
+        for name in flow_names:
+            print(f"Benchmarking {name} ({iterations} runs)...")
+            results[name] = await benchmark_flow(FLOWS[name], iterations, latency_scale, seed, verbose, replayer)
+            if replayer:
+                print(f"  Replay: {replayer.stats()}")
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the example flows against local fakes.")
+    parser.add_argument("--flows", nargs="+", choices=list(FLOWS), default=list(FLOWS))
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplier for the fake latencies")
+    parser.add_argument("--sleep-scale", type=float, default=1.0, help="Multiplier for asyncio.sleep() in the flows")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--compare", help="Compare with the results of an earlier --json run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p50 slowdown for --compare")
+    parser.add_argument("--verbose", action="store_true", help="Show the output of the flows")
+    parser.add_argument("--trace-jsonl", help="Append every span (see tracing.py) to this file")
+    parser.add_argument("--openmetrics", help="Write the span histograms to this file")
+    parser.add_argument("--record", help="Record the client and OpenAI calls of the runs into this session file")
+    parser.add_argument("--replay", help="Run the flows against this recorded session instead of the fakes")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="1 replays the recorded latencies, larger values faster, 0 without latency")
+    args = parser.parse_args(argv)
+    if args.record and args.replay:
+        parser.error("--record and --replay can't be combined")
+    if args.record:
+        start_recording(args.record)
+    replayer = start_replay(args.replay, args.replay_speed) if args.replay else None
+    if args.trace_jsonl:
+        tracer.jsonl_path = args.trace_jsonl
+
+    results = asyncio.run(run_benchmark(args.flows, args.iterations, args.latency_scale, args.sleep_scale,
+                                        args.seed, args.verbose, replayer))
+    print()
+    for result in results.values():
+        print(result.report())
+        if result.failures and not args.verbose:
+            print(f"  Output of the last failed run:\n{result.last_failure_output[-2000:]}")
+        print()
+    print(tracer.summary())
+    if args.openmetrics:
+        tracer.write_openmetrics(args.openmetrics)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({name: result.to_dict() for name, result in results.items()}, f, indent=2)
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import os
+import asyncio
+from dotenv import load_dotenv
+from smooth_operator_agent_tools import SmoothOperatorClient
+from async_operator import AsyncSmoothOperator
+from tracing import traced
+from session_recording import session_client
+from server_lifecycle import shared_server
+from click_cache import click_cache, get_click_cache
+from tree_compaction import compact_tree
+from ui_query import UiIndex
+from ui_tree import get_field
+from console import wait_for_enter
+
+@traced("flow: calculator")
+async def main_calculator():
+    # Load environment variables from .env file
+    load_dotenv()
+
+    screengrasp_api_key = os.getenv("SCREENGRASP_API_KEY")
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+
+    if not screengrasp_api_key:
+        raise ValueError("SCREENGRASP_API_KEY not found in .env file. Get a free key at https://screengrasp.com/api.html")
+
+    if not openai_api_key:
+        print("Warning: OPENAI_API_KEY not found in .env file. OpenAI part will be skipped. Get a key at https://platform.openai.com/api-keys")
+
+    # Start the Smooth Operator server and perform actions
+    client = session_client(click_cache(shared_server(SmoothOperatorClient, screengrasp_api_key)))
+    # Awaitable facade: client and OpenAI calls run on a thread pool instead of blocking the event loop
+    ops = AsyncSmoothOperator(client, openai_api_key=openai_api_key)
+    print("Starting server (or attaching to the running one; the first start can take a while, because it's installing the server)...")
+    await ops.start_server()
+
+    try:
+        # Start the windows calculator and calculate 3+4
+        print("Opening calculator...")
+        await ops.system.open_application("calc")
+        
+        print("Typing 3+4...")
+        await ops.keyboard.type("3+4") # assumes the calc app is focused
+        
+        print("Clicking equals sign...")        
+        # Using AI vision to find and click th equals button - alternatives:
+        # - ops.keyboard.type("=") - simpler and faster
+        # - ops.automation.invoke - using Windows UI Automation, a bit more complex to implement but very robust (not affected by focus changes)                        
+        await ops.mouse.click_by_description("the equals sign")
+
+        print("Getting window overview...")
+        overview = await ops.system.get_overview() # assumes calc is focused, when debugging be aware you might be influencing which app is focused
+        focused_window = overview.focus_info.focused_element_parent_window if overview and overview.focus_info else None
+
+        # The calculator names its display "Display is <value>", so the result can be read
+        # locally from the automation tree. The LLM is only needed if that lookup fails.
+        display = UiIndex(focused_window).find('Text[name^="Display is"]') if focused_window else None
+        if display:
+            print(f"Result (read from automation tree): {get_field(display, 'name')[len('Display is'):].strip()}")
+        elif not focused_window:
+            print("Could not get focused window information.")
+        elif openai_api_key:
+            # Only send the parts of the tree that can show the result, to save tokens and latency
+            focused_window_json, compaction_report = compact_tree(focused_window, control_types=("Text", "Edit"))
+            print(f"Compacted automation tree: {compaction_report}")
+            
+            # You can use GPT-4o or other ai models for all sorts of tasks together with the Smooth Operator Agent Tools. 
+            # In this case we use it to read the result of the calculator from its automation tree.
+            # But it can also for example be used to decide which button to click next, what text to type, etc.
+            print("Asking OpenAI about the result...")
+            chat_completion = await ops.chat(
+                model="gpt-4o", 
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": f"What result does the calculator display? You can read it from its automation tree: {focused_window_json}"
+                            }
+                        ]
+                    }
+                ]
+            )
+            result_text = chat_completion.choices[0].message.content
+            print(f"OpenAI Result: {result_text}")
+        else:
+            print("Could not read the result locally and OpenAI key not provided, skipping result verification.")
+
+        # Alternative using screenshot (more costly and potentially less reliable):
+        # print("Taking screenshot...")
+        # screenshot = await ops.screenshot.take()
+        # if openai_api_key:
+        #     print("Asking OpenAI about the screenshot...")
+        #     chat_completion = await ops.chat(
+        #         model="gpt-4o",
+        #         messages=[
+        #             {
+        #                 "role": "user",
+        #                 "content": [
+        #                     {
+        #                         "type": "text",
+        #                         "text": "What result does the calculator display based on the screenshot?"
+        #                     },
+        #                     {
+        #                         "type": "image_url",
+        #                         "image_url": {
+        #                             "url": f"data:image/jpeg;base64,{screenshot.base64_image}"
+        #                         }
+        #                     }
+        #                 ]
+        #             }
+        #         ]
+        #     )
+        #     result_text = chat_completion.choices[0].message.content
+        #     print(f"OpenAI Screenshot Result: {result_text}")
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+    finally:
+        print(f"Click cache: {get_click_cache().stats()}")
+        # Ensure the server is stopped even if errors occur
+        print("Stopping server...")
+        await ops.stop_server() # Optional: uncomment if you want to explicitly stop the server
+        ops.close()
+
+    print("\nExample finished.")
+    wait_for_enter() # Keep console open
+
+# To run this example directly (or use: python example.py calculator)
+if __name__ == "__main__":
+    asyncio.run(main_calculator())
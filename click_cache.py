@@ -0,0 +1,256 @@
+"""
+Cache of the screen points found by click_by_description(), so repeated clicks skip the vision model.
+
+`mouse.click_by_description("the equals sign")` sends a screenshot to the ScreenGrasp vision model
+on every call, although the same targets sit in the same spot on every run. The cache splits the
+call into `screenshot.find_ui_element()` and `mouse.click(x, y)` and remembers the point per
+
+    (window: process and title, screen size, layout fingerprint of the window, description)
+
+Before a cached point is clicked, it is validated against the current screen: a small grayscale
+thumbnail of the region around the point must look like the one stored with the entry. The
+window's layout fingerprint (see element_id_cache.py) is part of the key, so a changed window
+layout is a miss as well. On a mismatch the vision model is asked again and the entry refreshed.
+The screen is only read up front if there is an entry for the description; otherwise it is read
+while the vision model is looking for the element, so a miss costs no extra round trip.
+
+    client = click_cache(SmoothOperatorClient(api_key))
+    client.mouse.click_by_description("the equals sign")   # vision on the first run, cached later
+    print(get_click_cache().stats())
+
+Entries are stored in "smooth-operator-clicks.json" in the temp directory, written when an entry
+is added and at exit. Set CLICK_CACHE=0 to
+disable the cache. Requires Pillow for the validation; without it, clicks go to
+click_by_description() unchanged.
+"""
+import atexit
+import base64
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Set
+
+from element_id_cache import tree_fingerprint
+
+# Side of the screen region around a point that is compared, and of its thumbnail (pixels)
+REGION_SIZE = 48
+THUMBNAIL_SIZE = 12
+# Mean difference of the thumbnail pixels (0-255) up to which a region counts as unchanged
+MAX_REGION_DIFFERENCE = 12.0
+
+
+def _region_thumbnail(image: Any, x: int, y: int) -> bytes:
+    half = REGION_SIZE // 2
+    box = (max(0, x - half), max(0, y - half), min(image.width, x + half), min(image.height, y + half))
+    return image.crop(box).convert("L").resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE)).tobytes()
+
+
+def _normalize(description: str) -> str:
+    return " ".join(description.lower().split())
+
+
+def _region_difference(a: bytes, b: bytes) -> float:
+    if len(a) != len(b):
+        return 255.0
+    return sum(abs(pixel_a - pixel_b) for pixel_a, pixel_b in zip(a, b)) / len(a)
+
+
+class _ScreenState:
+    """What a click is keyed and validated by: the foreground window and the screenshot."""
+    def __init__(self, key_parts: Dict[str, Any], image: Any):
+        self.key_parts = key_parts
+        self.image = image
+
+    def key(self, description: str) -> str:
+        parts = dict(self.key_parts, description=_normalize(description))
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ClickCache:
+    """LRU cache of resolved click points, persisted as a JSON file, with hit rate and saved time."""
+    def __init__(self, path: Optional[str] = None, max_entries: int = 200):
+        self.path = path or os.path.join(tempfile.gettempdir(), "smooth-operator-clicks.json")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.mismatches = 0
+        self.saved_seconds = 0.0
+        self._entries: Dict[str, Dict[str, Any]] = self._load()
+        self._descriptions: Set[str] = {_normalize(entry["description"]) for entry in self._entries.values()}
+        # Hits only update the last use, which is written at exit
+        self._changed = False
+        # The screen state is read on a worker, which takes the screenshot on another one
+        self._executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="click-cache")
+        atexit.register(self.flush)
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"entries": self._entries}, f)
+            os.replace(temp_path, self.path)
+            self._changed = False
+        except OSError as ex:
+            print(f"Warning: Could not write click cache {self.path}: {ex}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def flush(self) -> None:
+        """Write the last uses of the entries, if they changed since the file was written."""
+        if self._changed:
+            self._save()
+
+    def _screen_state(self, client: Any) -> Optional[_ScreenState]:
+        """Read the foreground window and take a screenshot; None if either isn't available."""
+        try:
+            return self._read_screen_state(client)
+        except Exception as ex:
+            # The cache is only an optimization; the click goes ahead without it
+            print(f"Warning: Click cache could not read the screen: {ex}")
+            return None
+
+    def _read_screen_state(self, client: Any) -> Optional[_ScreenState]:
+        from PIL import Image
+        screenshot_future = self._executor.submit(client.screenshot.take)
+        overview = client.system.get_overview()
+        screenshot = screenshot_future.result()
+        window = overview.focus_info.focused_element_parent_window if overview and overview.focus_info else None
+        if window is None or not screenshot or not screenshot.success or not screenshot.image_base64:
+            return None
+        details = client.system.get_window_details(window.id) if window.id else None
+        image = Image.open(io.BytesIO(base64.b64decode(screenshot.image_base64)))
+        image.load()
+        return _ScreenState({
+            # Counters in titles (e.g. unread emails) change from run to run
+            "window": [window.process_name or window.executable_path or "", re.sub(r"\d+", "#", window.title or "")],
+            "screen": list(image.size),
+            "layout": tree_fingerprint(details) if details else "",
+        }, image)
+
+    def click(self, client: Any, description: str, **options) -> Any:
+        """click_by_description() with the point from the cache if the screen still matches, else from vision."""
+        try:
+            import PIL  # noqa: F401 (needed for the validation)
+        except ImportError:
+            return client.mouse.click_by_description(description, **options)
+        start_time = time.perf_counter()
+        if _normalize(description) not in self._descriptions:
+            # Nothing to validate: the screen is read while the vision model looks for the element
+            self.misses += 1
+            state_future = self._executor.submit(self._screen_state, client)
+            return self._look_up_and_click(client, description, options, state_future.result)
+
+        state = self._screen_state(client)
+        if state is None:
+            return client.mouse.click_by_description(description, **options)
+        entry = self._entries.get(state.key(description))
+        if entry is not None:
+            thumbnail = _region_thumbnail(state.image, entry["x"], entry["y"])
+            if _region_difference(thumbnail, bytes.fromhex(entry["region"])) <= MAX_REGION_DIFFERENCE:
+                response = client.mouse.click(entry["x"], entry["y"])
+                if response and response.success:
+                    self.hits += 1
+                    self.saved_seconds += entry["lookup_seconds"] - (time.perf_counter() - start_time)
+                    entry["last_used"] = time.time()
+                    self._changed = True
+                    return response
+            self.mismatches += 1
+        else:
+            self.misses += 1
+        return self._look_up_and_click(client, description, options, lambda: state)
+
+    def _look_up_and_click(self, client: Any, description: str, options: Dict[str, Any],
+                           screen_state: Callable[[], Optional[_ScreenState]]) -> Any:
+        """Ask the vision model for the point, click it and remember it with the screen before the click."""
+        lookup_start = time.perf_counter()
+        found = client.screenshot.find_ui_element(description, **options)
+        if not found or not found.success or found.x is None or found.y is None:
+            # Not found; the response says why
+            return found
+        lookup_seconds = time.perf_counter() - lookup_start
+        # Read before the click changes the screen (usually done already, the vision lookup takes longer)
+        state = screen_state()
+        response = client.mouse.click(found.x, found.y)
+        if response and response.success and state is not None:
+            self._entries[state.key(description)] = {
+                "x": found.x, "y": found.y, "description": description,
+                "region": _region_thumbnail(state.image, found.x, found.y).hex(),
+                "lookup_seconds": round(lookup_seconds, 3), "last_used": time.time()}
+            while len(self._entries) > self.max_entries:
+                oldest = min(self._entries, key=lambda name: self._entries[name]["last_used"])
+                del self._entries[oldest]
+            self._descriptions = {_normalize(entry["description"]) for entry in self._entries.values()}
+            self._save()
+        return response
+
+    def clear(self) -> None:
+        self._entries = {}
+        self._descriptions = set()
+        self._save()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses + self.mismatches
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> str:
+        return (f"{self.hits} hits, {self.misses} misses, {self.mismatches} refreshed ({self.hit_rate:.0%} hit rate), "
+                f"{self.saved_seconds:.1f}s of vision lookups saved, {len(self)} entries")
+
+
+class _CachedMouseApi:
+    def __init__(self, client: Any, cache: ClickCache):
+        self._client = client
+        self._mouse = client.mouse
+        self._cache = cache
+
+    def click_by_description(self, user_element_description: str, mechanism: Any = None) -> Any:
+        options = {"mechanism": mechanism} if mechanism is not None else {}
+        return self._cache.click(self._client, user_element_description, **options)
+
+    def __getattr__(self, name: str):
+        return getattr(self._mouse, name)
+
+
+class ClickCacheClient:
+    """Wraps a SmoothOperatorClient so that mouse.click_by_description() goes through the ClickCache."""
+    def __init__(self, client: Any, cache: ClickCache):
+        self._client = client
+        self.mouse = _CachedMouseApi(client, cache)
+
+    def __getattr__(self, name: str):
+        return getattr(self._client, name)
+
+
+_shared_cache: Optional[ClickCache] = None
+
+
+def get_click_cache() -> ClickCache:
+    """Return the process-wide click cache, creating it on first use."""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = ClickCache()
+    return _shared_cache
+
+
+def click_cache(client: Any) -> Any:
+    """Let the client's click_by_description() use the shared click cache (unless CLICK_CACHE=0)."""
+    if os.getenv("CLICK_CACHE", "1").lower() in ("0", "false", "no"):
+        return client
+    return ClickCacheClient(client, get_click_cache())
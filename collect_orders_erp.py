@@ -1,13 +1,56 @@
 import os
 import asyncio
 import json
-import tempfile
 import time
 from pathlib import Path
 from typing import Optional, Dict, List, Any
 from dotenv import load_dotenv
-from openai import OpenAI
 from smooth_operator_agent_tools import SmoothOperatorClient, ExistingChromeInstanceStrategy
+from artifact_cache import ArtifactCache
+from async_operator import AsyncSmoothOperator
+from llm_scheduler import PRIORITY_INTERACTIVE
+from tracing import traced
+from session_recording import session_client
+from server_lifecycle import shared_server
+from click_cache import click_cache, get_click_cache
+from console import wait_for_enter
+from screenshot_preprocessing import main_content_region, preprocess_image, region_from_env
+from form_fill import INVOKE, SET_VALUE, FormFiller, FormFillError, FormOperation, fill_form
+from incremental_json import IncrementalJsonParser
+from order_ledger import ENTERING, LedgerEntry, OrderLedger, email_fingerprint
+from order_parser import PARSER, TEXT_LLM, VISION_LLM, parse_order_text
+from element_id_cache import ElementIdCache, tree_fingerprint
+from stage_graph import StageGraph
+from tree_compaction import compact_tree
+from ui_query import UiIndex
+from ui_tree import control_texts, get_field, window_root
+from ui_wait import (wait_until, window_exists, focused_element_is, focused_window_titled, element_present,
+                     window_contains_text, window_tree_changed, page_text_contains, page_text_changed)
+
+ORDER_EMAIL_SUBJECT = "New Computerstuff.com Order"
+
+# Selectors for the controls of the Mini ERP Mock (see ui_query.py). Inputs are matched by their
+# own name first, then by the text label in front of them.
+ERP_ELEMENT_SELECTORS = {
+    "elementIdCustomerName": ('Edit[name*="customer"]', "customer"),
+    "elementIdArticleName": ('Edit[name*="article"]', "article"),
+    "elementIdQuantity": ('Edit[name*="quantity"]', "quantity"),
+    "elementIdPricePerUnit": ('Edit[name*="price"]', "price"),
+    "elementIdAddItemButton": ('Button[name*="add item"]', None),
+    "elementIdSaveOrderButton": ('Button[name*="save order"]', None),
+}
+
+ORDER_JSON_FORMAT = """{
+  "customerName": "name of the customer",
+  "orderedArticles": [
+    {
+      "articleName": "name of the article",
+      "quantity": quantity_as_number,
+      "pricePerUnit": price_as_number
+    }
+    // ... more articles if present
+  ]
+}"""
 
 # Order data classes for deserializing OpenAI responses
 class OrderedArticle:
@@ -21,6 +64,24 @@ class Order:
         self.customer_name = customer_name
         self.ordered_articles = ordered_articles
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Order':
+        """Create from the JSON format used in the OpenAI prompt."""
+        return cls(
+            customer_name=data.get("customerName", ""),
+            ordered_articles=[OrderedArticle(article_name=article.get("articleName", ""),
+                                             quantity=int(article.get("quantity", 0)),
+                                             price_per_unit=float(article.get("pricePerUnit", 0.0)))
+                              for article in data.get("orderedArticles", [])]
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "customerName": self.customer_name,
+            "orderedArticles": [{"articleName": article.article_name, "quantity": article.quantity,
+                                 "pricePerUnit": article.price_per_unit} for article in self.ordered_articles]
+        }
+
 class ErpElementIds:
     def __init__(self, element_id_customer_name: str, element_id_article_name: str, 
                  element_id_quantity: str, element_id_price_per_unit: str,
@@ -32,9 +93,140 @@ class ErpElementIds:
         self.element_id_add_item_button = element_id_add_item_button
         self.element_id_save_order_button = element_id_save_order_button
 
-async def get_order_screenshot_from_gmail(client: SmoothOperatorClient):
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ErpElementIds':
+        """Create from the JSON format used in the OpenAI prompt."""
+        return cls(
+            element_id_customer_name=data.get("elementIdCustomerName", ""),
+            element_id_article_name=data.get("elementIdArticleName", ""),
+            element_id_quantity=data.get("elementIdQuantity", ""),
+            element_id_price_per_unit=data.get("elementIdPricePerUnit", ""),
+            element_id_add_item_button=data.get("elementIdAddItemButton", ""),
+            element_id_save_order_button=data.get("elementIdSaveOrderButton", "")
+        )
+
+    def to_dict(self) -> Dict[str, str]:
+        return {
+            "elementIdCustomerName": self.element_id_customer_name,
+            "elementIdArticleName": self.element_id_article_name,
+            "elementIdQuantity": self.element_id_quantity,
+            "elementIdPricePerUnit": self.element_id_price_per_unit,
+            "elementIdAddItemButton": self.element_id_add_item_button,
+            "elementIdSaveOrderButton": self.element_id_save_order_button
+        }
+
+class OrderEmail:
+    """An opened order email: its text, its fingerprint and ledger entry, and a screenshot if one is needed."""
+    def __init__(self, position: int, text: str, screenshot=None, entry: Optional[LedgerEntry] = None):
+        self.position = position
+        self.text = text
+        self.fingerprint = email_fingerprint(text)
+        self.screenshot = screenshot
+        self.entry = entry
+        # Set once the order is extracted, with the path that was used (see order_parser.py)
+        self.order: Optional[Order] = None
+        self.extracted_by: Optional[str] = None
+
+    @property
+    def needs_extraction(self) -> bool:
+        return self.order is None and (self.entry is None or self.entry.needs_extraction)
+
+    @property
+    def stored_order(self) -> Optional[Order]:
+        """The order extracted by an earlier run, if the ledger has it."""
+        return Order.from_dict(self.entry.order) if self.entry and self.entry.order else None
+
+async def _capture_order_email(ops: AsyncSmoothOperator, position: int, text: str,
+                               ledger: Optional[OrderLedger]) -> OrderEmail:
+    """
+    Look the opened email up in the ledger and try the local parser on its text.
+
+    The screenshot is only taken if neither has the order, as the last fallback of the extraction.
+    """
+    email = OrderEmail(position, text)
+    if ledger:
+        email.entry = ledger.seen(email.fingerprint, text)
+        if not email.entry.needs_extraction:
+            print(f"Email {position} is '{email.entry.stage}' in the order ledger, no screenshot needed.")
+            return email
+    parsed = parse_order_text(text)
+    if parsed.confident:
+        email.order, email.extracted_by = Order.from_dict(parsed.order), PARSER
+        print(f"Parsed the order of email {position} from its text: {parsed.report()}")
+        if ledger:
+            ledger.extracted(email.fingerprint, parsed.order, extracted_by=PARSER)
+        return email
+    print(f"The order of email {position} couldn't be parsed from its text: {parsed.report()}")
+    print("Taking screenshot of the email...")
+    email.screenshot = await take_email_screenshot(ops)
+    return email
+
+async def take_email_screenshot(ops: AsyncSmoothOperator):
+    """
+    Take a screenshot of the opened email, cropped to the email and downscaled for the vision model.
+
+    The crop region is read from EMAIL_SCREENSHOT_REGION ("left,top,width,height") if set,
+    otherwise it is the main content area of the Chrome tab.
     """
-    Get a screenshot of an order email from Gmail.
+    region = region_from_env()
+    if region is None:
+        screenshot, overview = await asyncio.gather(ops.screenshot.take(), ops.system.get_overview())
+        if overview and overview.focus_info and overview.focus_info.is_chrome:
+            region = main_content_region(overview.focus_info.current_chrome_tab_most_relevant_elements)
+    else:
+        screenshot = await ops.screenshot.take()
+    if not screenshot or not screenshot.success or not screenshot.image_base64:
+        return screenshot
+    
+    processed = preprocess_image(screenshot.image_base64, region)
+    if processed.report:
+        print(f"Preprocessed screenshot: {processed.report}")
+    return processed
+
+def _ordinal(position: int) -> str:
+    words = ["first", "second", "third", "fourth", "fifth", "sixth", "seventh", "eighth", "ninth", "tenth"]
+    return words[position - 1] if position <= len(words) else f"{position}th"
+
+@traced("search emails")
+async def search_order_emails_in_gmail(ops: AsyncSmoothOperator) -> Optional[str]:
+    """Open Gmail in Chrome and search for order emails. Returns the text of the result page, or None on error."""
+    print("Opening Gmail in Chrome...")
+    # Use ForceClose strategy to handle existing instances
+    open_result = await ops.chrome.open_chrome("https://mail.google.com/", 
+                                               ExistingChromeInstanceStrategy.FORCE_CLOSE)
+    print(open_result.message)
+    if open_result.message.startswith('Error'):
+        return None
+    
+    # Give Gmail time to load and potentially log in
+    await wait_until(page_text_contains(ops, "Inbox"), timeout=30, description="Gmail to load")
+    
+    print("Searching for 'order' in Gmail...")
+    # Try to find and click the search bar
+    await ops.mouse.click_by_description("the search mail input field")  # Adjust description if needed
+    await ops.keyboard.type(ORDER_EMAIL_SUBJECT)
+    await ops.keyboard.press("Enter")
+    search_results = await wait_until(page_text_contains(ops, ORDER_EMAIL_SUBJECT), timeout=20,
+                                      description="search results")
+    return search_results.value or ""
+
+@traced("capture email")
+async def open_order_email_in_gmail(ops: AsyncSmoothOperator, position: int, results_text: str,
+                                    ledger: Optional[OrderLedger] = None) -> Optional[OrderEmail]:
+    """Open the email at `position` (1-based) of the Gmail result list. Returns None if it didn't open."""
+    print(f"Clicking the {_ordinal(position)} email in the search results...")
+    # Adjust description if needed
+    click_result = await ops.mouse.click_by_description(f"the {_ordinal(position)} email result in the list")
+    if not click_result or not click_result.success:
+        return None
+    email_loaded = await wait_until(page_text_changed(ops, results_text), timeout=20, description="email to load")
+    if not email_loaded.value:
+        return None
+    return await _capture_order_email(ops, position, email_loaded.value, ledger)
+
+async def get_order_email_from_gmail(ops: AsyncSmoothOperator, ledger: Optional[OrderLedger] = None) -> Optional[OrderEmail]:
+    """
+    Open an order email in Gmail (with a screenshot, unless the ledger has its order already).
     
     Example Email Content to send to your Gmail for testing:
     
@@ -57,155 +249,222 @@ async def get_order_screenshot_from_gmail(client: SmoothOperatorClient):
     John Doe
     Sales Representative
     """
-    print("Opening Gmail in Chrome...")
-    # Use ForceClose strategy to handle existing instances
-    open_result = client.chrome.open_chrome("https://mail.google.com/", 
-                                           ExistingChromeInstanceStrategy.FORCE_CLOSE)
-    print(open_result.message)
-    if open_result.message.startswith('Error'):
+    results_text = await search_order_emails_in_gmail(ops)
+    if results_text is None:
         return None
-    
-    # Give Gmail time to load and potentially log in
-    await asyncio.sleep(10)  
-    
-    print("Searching for 'order' in Gmail...")
-    # Try to find and click the search bar
-    client.mouse.click_by_description("the search mail input field")  # Adjust description if needed
-    await asyncio.sleep(1)
-    client.keyboard.type("New Computerstuff.com Order")
-    await asyncio.sleep(0.5)
-    client.keyboard.press("Enter")
-    await asyncio.sleep(5)  # Wait for search results
-    
-    print("Clicking the first email in the search results...")
-    # Click the first email result - adjust description if needed
-    client.mouse.click_by_description("the first email result in the list")
-    await asyncio.sleep(5)  # Wait for email to load
-    
-    print("Taking screenshot of the email...")
-    screenshot = client.screenshot.take()
-    return screenshot
+    return await open_order_email_in_gmail(ops, 1, results_text, ledger)
 
-async def get_order_screenshot_from_outlook(client: SmoothOperatorClient):
-    """Get a screenshot of an order email from Outlook."""
+async def iter_order_emails_from_gmail(ops: AsyncSmoothOperator, max_emails: int, ledger: Optional[OrderLedger] = None):
+    """Yield an OrderEmail for each email of the Gmail result list, up to `max_emails`."""
+    results_text = await search_order_emails_in_gmail(ops)
+    if results_text is None:
+        return
+    gmail_window = (await wait_until(window_exists(ops, "Gmail"), timeout=5, description="Gmail window")).value
+    seen_emails = set()
+    email_text = None
+    for position in range(1, max_emails + 1):
+        if position > 1:
+            # Back from the previous email to the result list
+            await ops.chrome.go_back()
+            results_text = (await wait_until(page_text_changed(ops, email_text), timeout=20,
+                                             description="search results")).value or results_text
+        if gmail_window:
+            # Another window (e.g. the ERP) may have been brought to the front in the meantime
+            await ops.automation.bring_to_front(gmail_window.id)
+        email = await open_order_email_in_gmail(ops, position, results_text, ledger)
+        if not email or email.text in seen_emails:
+            # No further result in the list
+            return
+        email_text = email.text
+        seen_emails.add(email_text)
+        yield email
+
+@traced("search emails")
+async def search_order_emails_in_outlook(ops: AsyncSmoothOperator):
+    """Open Outlook and search for order emails. Returns the Outlook window, or None on error."""
     print("Opening Outlook...")
     try:
-        client.system.open_application("outlook")
-        await asyncio.sleep(10)  # Give Outlook time to load
+        await ops.system.open_application("outlook")
+        outlook_window = (await wait_until(window_exists(ops, "Outlook"), timeout=60,
+                                           description="Outlook to load")).value
     except Exception as ex:
         print(f"Failed to open Outlook: {ex}. Make sure Outlook is installed.")
         return None
+    if not outlook_window:
+        print("Failed to open Outlook. Make sure Outlook is installed.")
+        return None
     
+    # The shortcuts go to the focused window, and Outlook may still be starting behind another one
+    if not await wait_until(focused_window_titled(ops, "Outlook"), timeout=10, description="Outlook focus"):
+        await ops.automation.bring_to_front(outlook_window.id)
+        await wait_until(focused_window_titled(ops, "Outlook"), timeout=5, description="Outlook focus")
+
     print("Searching for 'order' in Outlook...")
     # Using keyboard shortcuts for search
-    client.keyboard.press("Ctrl+E")  # Focus search bar shortcut
-    await asyncio.sleep(2)
-    client.keyboard.type("New Computerstuff.com Order")
-    await asyncio.sleep(5)
-    client.keyboard.press("Enter")
-    await asyncio.sleep(5)  # Wait for search results
-    
-    print("Clicking the first email in the Outlook search results...")
-    # Click the first email - adjust description if needed
-    client.mouse.click_by_description("the first email shown in the list pane")
-    await asyncio.sleep(5)  # Wait for email to load
-    
-    print("Taking screenshot of Outlook...")
-    screenshot = client.screenshot.take()
-    return screenshot
-
-async def download_mock_erp() -> Optional[str]:
-    """Download the mock ERP application."""
-    download_url = "https://www.dropbox.com/scl/fi/4qc9w57zrmmisyqu3ojnp/mini-erp-mock.exe?rlkey=x5m3ob810zt1scf0mpfn15l4v&dl=1"
-    temp_dir = tempfile.gettempdir()
-    file_name = "mini-erp-mock.exe"
-    destination_path = os.path.join(temp_dir, file_name)
-    
-    if os.path.exists(destination_path):
-        print("Mock ERP already exists, skipping download.")
-        return destination_path
-    
+    await ops.keyboard.press("Ctrl+E")  # Focus search bar shortcut
+    await wait_until(focused_element_is(ops, "Edit"), timeout=5, description="search bar focus")
+    await ops.keyboard.type(ORDER_EMAIL_SUBJECT)
+    await ops.keyboard.press("Enter")
+    await wait_until(window_contains_text(ops, outlook_window.id, ORDER_EMAIL_SUBJECT), timeout=20,
+                     description="search results")
+    return outlook_window
+
+@traced("capture email")
+async def open_order_email_in_outlook(ops: AsyncSmoothOperator, outlook_window, position: int,
+                                      ledger: Optional[OrderLedger] = None) -> Optional[OrderEmail]:
+    """Open the email at `position` (1-based) of the Outlook list pane. Returns None if it didn't open."""
+    print(f"Clicking the {_ordinal(position)} email in the Outlook search results...")
+    # Adjust description if needed
+    list_details = await ops.system.get_window_details(outlook_window.id)
+    click_result = await ops.mouse.click_by_description(f"the {_ordinal(position)} email shown in the list pane")
+    if not click_result or not click_result.success:
+        return None
+    email_loaded = await wait_until(
+        window_tree_changed(ops, outlook_window.id, list_details.to_json_string() if list_details else None),
+        timeout=20, description="email to load")
+    if not email_loaded.value:
+        return None
+    # The reading pane is part of the window tree, so its texts identify the email
+    email_text = "\n".join(control_texts(window_root(email_loaded.value)))
+    return await _capture_order_email(ops, position, email_text, ledger)
+
+async def get_order_email_from_outlook(ops: AsyncSmoothOperator, ledger: Optional[OrderLedger] = None) -> Optional[OrderEmail]:
+    """Open an order email in Outlook (with a screenshot, unless the ledger has its order already)."""
+    outlook_window = await search_order_emails_in_outlook(ops)
+    if not outlook_window:
+        return None
+    return await open_order_email_in_outlook(ops, outlook_window, 1, ledger)
+
+async def iter_order_emails_from_outlook(ops: AsyncSmoothOperator, max_emails: int, ledger: Optional[OrderLedger] = None):
+    """Yield an OrderEmail for each email of the Outlook result list, up to `max_emails`."""
+    outlook_window = await search_order_emails_in_outlook(ops)
+    if not outlook_window:
+        return
+    previous_text = None
+    for position in range(1, max_emails + 1):
+        await ops.automation.bring_to_front(outlook_window.id)
+        email = await open_order_email_in_outlook(ops, outlook_window, position, ledger)
+        if not email or email.text == previous_text:
+            # No further result in the list
+            return
+        previous_text = email.text
+        yield email
+
+MOCK_ERP_URL = "https://www.dropbox.com/scl/fi/4qc9w57zrmmisyqu3ojnp/mini-erp-mock.exe?rlkey=x5m3ob810zt1scf0mpfn15l4v&dl=1"
+
+async def download_mock_erp(artifact_cache: Optional[ArtifactCache] = None) -> Optional[str]:
+    """
+    Download the mock ERP application (or use the verified copy from an earlier run).
+
+    MOCK_ERP_URL and MOCK_ERP_SHA256 can be set in the environment, e.g. to test against a local server.
+    """
+    download_url = os.getenv("MOCK_ERP_URL", MOCK_ERP_URL)
+    expected_sha256 = os.getenv("MOCK_ERP_SHA256")
+    artifact_cache = artifact_cache or ArtifactCache()
     try:
-        import httpx
-        print(f"Downloading mock ERP application to {destination_path}...")
-        
-        async with httpx.AsyncClient() as http_client:
-            response = await http_client.get(download_url)
-            response.raise_for_status()
-            
-            with open(destination_path, 'wb') as f:
-                f.write(response.content)
-                
-        return destination_path
+        return await artifact_cache.fetch("mini-erp-mock.exe", download_url, sha256=expected_sha256)
     except Exception as ex:
         print(f"Error downloading mock ERP: {ex}")
         return None
 
-async def parse_order_data_from_screenshot(screenshot, openai_api_key):
+@traced("extract order")
+async def extract_order(ops: AsyncSmoothOperator, email: OrderEmail, priority: int = PRIORITY_INTERACTIVE) -> Optional[Order]:
+    """
+    Extract the order of an email that the local parser couldn't read: OpenAI with the email text first,
+    then with the screenshot. Sets email.order and email.extracted_by.
+    """
+    if email.order:
+        return email.order
+    has_screenshot = bool(email.screenshot and email.screenshot.success)
+    order = await parse_order_data_from_text(ops, email.text, priority=priority)
+    if order and (not validate_order(order) or not has_screenshot):
+        email.order, email.extracted_by = order, TEXT_LLM
+        return order
+    if has_screenshot:
+        print("Falling back to the email screenshot...")
+        order = await parse_order_data_from_screenshot(ops, email.screenshot, priority=priority)
+        if order:
+            email.order, email.extracted_by = order, VISION_LLM
+    return order
+
+def order_text_messages(email_text: str) -> List[Dict[str, Any]]:
+    """The OpenAI messages for extracting the order from the email text."""
+    prompt = f"""Extract the order details from the following email text. Provide the output strictly in the following JSON format:
+{ORDER_JSON_FORMAT}
+
+Email text:
+{email_text}"""
+    return [{"role": "user", "content": prompt}]
+
+def order_screenshot_messages(screenshot) -> List[Dict[str, Any]]:
+    """The OpenAI messages for extracting the order from the email screenshot."""
+    prompt = f"""Extract the order details from the email in the screenshot. Provide the output strictly in the following JSON format:
+{ORDER_JSON_FORMAT}"""
+    return [
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": prompt
+                },
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/jpeg;base64,{screenshot.image_base64}"
+                    }
+                }
+            ]
+        }
+    ]
+
+@traced("extract order from text")
+async def parse_order_data_from_text(ops: AsyncSmoothOperator, email_text: str, priority: int = PRIORITY_INTERACTIVE):
+    """Extract order data from the email text using OpenAI (no image, so much smaller and faster than the screenshot)."""
+    if ops.openai_client is None:
+        print("No OpenAI API key provided, skipping order extraction.")
+        return None
+
+    print("Asking OpenAI to extract order data from the email text...")
+    try:
+        chat_completion = await ops.chat(
+            priority=priority,
+            model="gpt-4o",
+            response_format={"type": "json_object"},
+            messages=order_text_messages(email_text)
+        )
+
+        json_response = chat_completion.choices[0].message.content
+        print(f"OpenAI Order Extraction Response: {json_response}")
+        order = Order.from_dict(json.loads(json_response))
+        print(f"Successfully extracted order for customer: {order.customer_name}")
+        return order
+
+    except Exception as ex:
+        print(f"Error calling OpenAI for order extraction: {ex}")
+        return None
+
+@traced("extract order from screenshot")
+async def parse_order_data_from_screenshot(ops: AsyncSmoothOperator, screenshot, priority: int = PRIORITY_INTERACTIVE):
     """Extract order data from screenshot using OpenAI."""
-    if not openai_api_key:
+    if ops.openai_client is None:
         print("No OpenAI API key provided, skipping order extraction.")
         return None
         
     print("Asking OpenAI to extract order data from screenshot...")
     try:
-        client = OpenAI(api_key=openai_api_key)
-        
-        prompt = """Extract the order details from the email in the screenshot. Provide the output strictly in the following JSON format:
-{
-  "customerName": "name of the customer",
-  "orderedArticles": [
-    {
-      "articleName": "name of the article",
-      "quantity": quantity_as_number,
-      "pricePerUnit": price_as_number
-    }
-    // ... more articles if present
-  ]
-}"""
-
-        chat_completion = client.chat.completions.create(
+        chat_completion = await ops.chat(
+            priority=priority,
             model="gpt-4o",
             response_format={"type": "json_object"},
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": prompt
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{screenshot.image_base64}"
-                            }
-                        }
-                    ]
-                }
-            ]
+            messages=order_screenshot_messages(screenshot)
         )
         
         json_response = chat_completion.choices[0].message.content
         print(f"OpenAI Order Extraction Response: {json_response}")
         
         # Parse the JSON response into our order class
-        order_data = json.loads(json_response)
-        
-        # Create Order object with OrderedArticle objects
-        ordered_articles = []
-        for article_data in order_data.get("orderedArticles", []):
-            article = OrderedArticle(
-                article_name=article_data.get("articleName", ""),
-                quantity=int(article_data.get("quantity", 0)),
-                price_per_unit=float(article_data.get("pricePerUnit", 0.0))
-            )
-            ordered_articles.append(article)
-            
-        order = Order(
-            customer_name=order_data.get("customerName", ""),
-            ordered_articles=ordered_articles
-        )
+        order = Order.from_dict(json.loads(json_response))
         
         print(f"Successfully extracted order for customer: {order.customer_name}")
         return order
@@ -214,15 +473,119 @@ async def parse_order_data_from_screenshot(screenshot, openai_api_key):
         print(f"Error calling OpenAI for order extraction: {ex}")
         return None
 
-async def identify_erp_element_ids(client, window_details_json, openai_api_key):
-    """Use OpenAI to identify the element IDs in the ERP UI."""
-    if not openai_api_key:
+class OrderStream:
+    """
+    An order extracted by a streamed completion: the customer and each article are available while it is generated.
+
+    Like extract_order(), OpenAI gets the email text first and the screenshot if that gives no valid
+    order. The completion is parsed with the IncrementalJsonParser, and events() yields
+    ("customer", name) and ("article", OrderedArticle) as soon as they are complete. The customer can
+    come again from the screenshot attempt; the screenshot is only tried if no article was streamed yet.
+    """
+    def __init__(self, ops: AsyncSmoothOperator, email: OrderEmail, priority: int = PRIORITY_INTERACTIVE):
+        self.email = email
+        self.started_at = time.perf_counter()
+        self.articles_streamed = 0
+        self.order: Optional[Order] = None
+        self._events: asyncio.Queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._extract(ops, priority))
+
+    async def _attempt(self, ops: AsyncSmoothOperator, messages: List[Dict[str, Any]], priority: int) -> Order:
+        parser = IncrementalJsonParser()
+        async for piece in ops.chat_stream(priority=priority, model="gpt-4o", response_format={"type": "json_object"},
+                                           messages=messages):
+            for path, value in parser.feed(piece):
+                if path == ("customerName",) and value:
+                    self._events.put_nowait(("customer", value))
+                elif len(path) == 2 and path[0] == "orderedArticles":
+                    self.articles_streamed += 1
+                    self._events.put_nowait(("article", Order.from_dict({"orderedArticles": [value]}).ordered_articles[0]))
+        print(f"OpenAI Order Extraction Response (streamed): {parser.text}")
+        return Order.from_dict(parser.finish())
+
+    async def _extract(self, ops: AsyncSmoothOperator, priority: int) -> Optional[Order]:
+        attempts = [(TEXT_LLM, "the email text", order_text_messages(self.email.text))]
+        if self.email.screenshot and self.email.screenshot.success:
+            attempts.append((VISION_LLM, "the screenshot", order_screenshot_messages(self.email.screenshot)))
+        try:
+            for path, source, messages in attempts:
+                print(f"Streaming the order extraction from {source}...")
+                articles_before = self.articles_streamed
+                self.order = await self._attempt(ops, messages, priority)
+                self.email.extracted_by = path
+                if not validate_order(self.order):
+                    self.email.order = self.order
+                    break
+                if self.articles_streamed > articles_before:
+                    # Those articles were entered already; the order is rejected by the final validation
+                    break
+        except Exception as ex:
+            print(f"Error streaming the order extraction: {ex}")
+            self.order = None
+        finally:
+            self._events.put_nowait(None)
+        return self.order
+
+    async def events(self):
+        """Yield ("customer", name) and ("article", OrderedArticle) events until the extraction is done."""
+        while (event := await self._events.get()) is not None:
+            yield event
+
+    async def result(self) -> Optional[Order]:
+        """The complete order (None if the extraction failed); check it with validate_order()."""
+        return await self._task
+
+    async def close(self) -> None:
+        """Stop the extraction if it is still running, e.g. because the ERP entry was cancelled."""
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+def find_erp_element_ids_locally(window_details_json) -> Optional[ErpElementIds]:
+    """Resolve the ERP element IDs with local selectors. Returns None if any control is not found unambiguously."""
+    start_time = time.perf_counter()
+    index = UiIndex(window_details_json)
+    element_ids_data = {}
+    for key, (selector, label) in ERP_ELEMENT_SELECTORS.items():
+        control = index.find(selector)
+        if control is None and label:
+            control = index.find_labeled("Edit", label)
+        if control is None:
+            print(f"Local lookup found no unique match for {selector}.")
+            return None
+        element_ids_data[key] = get_field(control, "id")
+    print(f"Resolved ERP element IDs locally in {(time.perf_counter() - start_time) * 1000:.1f} ms.")
+    return ErpElementIds.from_dict(element_ids_data)
+
+@traced("identify element ids")
+async def identify_erp_element_ids(ops: AsyncSmoothOperator, window_details_json,
+                                   element_id_cache: Optional[ElementIdCache] = None):
+    """
+    Use OpenAI to identify the element IDs in the ERP UI.
+
+    Local selectors are tried first; OpenAI is the fallback. Its results are cached by the
+    layout fingerprint of the window, so the LLM is only asked again when the layout of the
+    ERP window changes.
+    """
+    local_ids = find_erp_element_ids_locally(window_details_json)
+    if local_ids:
+        return local_ids
+
+    element_id_cache = element_id_cache or ElementIdCache()
+    fingerprint = tree_fingerprint(window_details_json)
+    cached_ids = element_id_cache.get(fingerprint)
+    if cached_ids:
+        print(f"Using cached ERP element IDs ({element_id_cache.stats()}).")
+        return ErpElementIds.from_dict(cached_ids)
+
+    if ops.openai_client is None:
         print("No OpenAI API key provided, skipping element ID identification.")
         return None
         
     print("Asking OpenAI to identify ERP element IDs...")
     try:
-        openai_client = OpenAI(api_key=openai_api_key)
+        # The model only needs the input fields, buttons and their labels
+        compact_json, compaction_report = compact_tree(window_details_json, control_types=("Edit", "Button", "Text"))
+        print(f"Compacted automation tree: {compaction_report}")
         
         prompt = f"""Based on the following UI automation tree JSON for the 'Mini ERP Mock' application, identify the element IDs for the specified controls. Provide the output strictly in the following JSON format:
 {{
@@ -235,9 +598,9 @@ async def identify_erp_element_ids(client, window_details_json, openai_api_key):
 }}
 
 UI Automation Tree JSON:
-{window_details_json}"""
+{compact_json}"""
 
-        chat_completion = openai_client.chat.completions.create(
+        chat_completion = await ops.chat(
             model="gpt-4o",
             response_format={"type": "json_object"},
             messages=[
@@ -255,28 +618,189 @@ UI Automation Tree JSON:
         element_ids_data = json.loads(json_response)
         
         # Create ErpElementIds object
-        element_ids = ErpElementIds(
-            element_id_customer_name=element_ids_data.get("elementIdCustomerName", ""),
-            element_id_article_name=element_ids_data.get("elementIdArticleName", ""),
-            element_id_quantity=element_ids_data.get("elementIdQuantity", ""),
-            element_id_price_per_unit=element_ids_data.get("elementIdPricePerUnit", ""),
-            element_id_add_item_button=element_ids_data.get("elementIdAddItemButton", ""),
-            element_id_save_order_button=element_ids_data.get("elementIdSaveOrderButton", "")
-        )
+        element_ids = ErpElementIds.from_dict(element_ids_data)
         
         if not element_ids.element_id_customer_name:
             print("Error: Could not find necessary element IDs")
             return None
             
-        print("Successfully identified ERP element IDs.")
+        element_id_cache.put(fingerprint, element_ids.to_dict())
+        print(f"Successfully identified ERP element IDs ({element_id_cache.stats()}).")
         return element_ids
         
     except Exception as ex:
         print(f"Error calling OpenAI for element ID extraction: {ex}")
         return None
 
-async def run_collect_orders_erp():
-    """Main function to run the email-to-ERP example."""
+@traced("launch erp")
+async def launch_mock_erp(ops: AsyncSmoothOperator, erp_exe_path: Optional[str] = None) -> Optional[str]:
+    """Download (unless `erp_exe_path` is given) and start the mock ERP application. Returns the path of the executable, or None."""
+    if erp_exe_path is None:
+        print("Downloading mock ERP application...")
+        erp_exe_path = await download_mock_erp()
+        if not erp_exe_path:
+            return None
+        print(f"Mock ERP downloaded to: {erp_exe_path}")
+    
+    print("Launching mock ERP application...")
+    await ops.system.open_application(erp_exe_path)
+    # Give the app time to start
+    await wait_until(window_exists(ops, "ERP system"), timeout=30, description="Mock ERP window")
+    print("Mock ERP application launched.")
+    return erp_exe_path
+
+@traced("find erp window")
+async def get_erp_window_details(ops: AsyncSmoothOperator):
+    """Find the mock ERP window. Returns (window, automation tree JSON) or (None, None)."""
+    print("Getting system overview...")
+    overview = await ops.system.get_overview()
+    if not overview:
+        print("Error: Could not get the system overview.")
+        return None, None
+
+    if (overview.focus_info and 
+        overview.focus_info.focused_element_parent_window and 
+        overview.focus_info.focused_element_parent_window.title == "ERP system"):
+        erp_window = overview.focus_info.focused_element_parent_window
+        return erp_window, erp_window.to_json_string()
+    
+    # Find the ERP window by title
+    erp_window = next((w for w in overview.windows or []
+                      if w.title and "erp system" in w.title.lower()), None)
+    
+    if not erp_window:
+        print("Error: Could not find the Mock ERP window.")
+        return None, None
+        
+    print(f"Found Mock ERP window: {erp_window.id} - {erp_window.title}")
+    
+    print("Getting ERP window details...")
+    window_details = await ops.system.get_window_details(erp_window.id)
+    if not window_details or not window_details.user_interface_elements:
+        print("Error: Could not get details for the Mock ERP window.")
+        return None, None
+        
+    return erp_window, window_details.to_json_string()
+
+def validate_order(order: Order) -> List[str]:
+    """Return the problems that prevent entering the order (empty if it is valid)."""
+    problems = []
+    if not order.customer_name or not order.customer_name.strip():
+        problems.append("customer name is missing")
+    if not order.ordered_articles:
+        problems.append("order has no articles")
+    for article in order.ordered_articles:
+        if not article.article_name or not article.article_name.strip():
+            problems.append("article without name")
+        if article.quantity <= 0:
+            problems.append(f"quantity of '{article.article_name}' is {article.quantity}")
+        if article.price_per_unit < 0:
+            problems.append(f"price of '{article.article_name}' is {article.price_per_unit}")
+    return problems
+
+def article_form_operations(erp_element_ids: ErpElementIds, number: int, article: OrderedArticle) -> List[FormOperation]:
+    """The form operations that add the article with the given (1-based) number to the order."""
+    item = f"article {number} ({article.article_name})"
+    return [
+        FormOperation(erp_element_ids.element_id_article_name, SET_VALUE, article.article_name, item=item),
+        FormOperation(erp_element_ids.element_id_quantity, SET_VALUE, str(article.quantity), item=item),
+        FormOperation(erp_element_ids.element_id_price_per_unit, SET_VALUE, f"{article.price_per_unit:.2f}", item=item),
+        FormOperation(erp_element_ids.element_id_add_item_button, INVOKE, item=item),
+    ]
+
+def order_form_operations(erp_element_ids: ErpElementIds, order_data: Order) -> List[FormOperation]:
+    """The form operations that enter an order (without saving it): customer, then each article plus 'Add Item'."""
+    operations = [FormOperation(erp_element_ids.element_id_customer_name, SET_VALUE, order_data.customer_name)]
+    for number, article in enumerate(order_data.ordered_articles, start=1):
+        operations += article_form_operations(erp_element_ids, number, article)
+    return operations
+
+def _article_key(article: OrderedArticle):
+    return article.article_name, article.quantity, round(article.price_per_unit, 2)
+
+@traced("enter order")
+async def enter_order_into_erp(ops: AsyncSmoothOperator, erp_window, erp_element_ids: ErpElementIds, order_data: Order):
+    """
+    Enter an order into the mock ERP window and save it.
+
+    All fields and 'Add Item' clicks run back to back; the window is read once to check the customer
+    and the added articles before 'Save Order' is clicked.
+
+    Raises:
+        FormFillError: If a field could not be set or the verification failed (the order is not saved then).
+    """
+    await wait_until(element_present(ops, erp_window.id, erp_element_ids.element_id_customer_name),
+                     timeout=10, description="customer name field")
+    print(f"Entering order for {order_data.customer_name} with {len(order_data.ordered_articles)} articles...")
+    result = await fill_form(
+        ops, erp_window.id, order_form_operations(erp_element_ids, order_data),
+        submit=FormOperation(erp_element_ids.element_id_save_order_button, INVOKE),
+        expected_values={erp_element_ids.element_id_customer_name: order_data.customer_name},
+        expected_texts={f"article {number}": article.article_name
+                        for number, article in enumerate(order_data.ordered_articles, start=1)})
+    print(result.report())
+    if not result.success:
+        raise FormFillError(result)
+    # The filled form was read for the verification; saving changes it
+    before_save = result.window_details
+    await wait_until(window_tree_changed(ops, erp_window.id, before_save.to_json_string() if before_save else None),
+                     timeout=5, description="order to be saved")
+
+@traced("enter order")
+async def enter_order_stream_into_erp(ops: AsyncSmoothOperator, erp_window, erp_element_ids: ErpElementIds,
+                                      stream: OrderStream) -> Order:
+    """
+    Enter an order into the mock ERP while it is being extracted, and save it if the complete order is valid.
+
+    The customer field is filled and each article added as soon as the stream has it. When the
+    completion is done, the order is validated and compared with the entered articles, and the
+    window is read once to check the form, before 'Save Order' is clicked.
+
+    Raises:
+        FormFillError: If the extraction failed, the order is not valid, a field could not be set or the
+                       verification failed (the order is not saved then).
+    """
+    await wait_until(element_present(ops, erp_window.id, erp_element_ids.element_id_customer_name),
+                     timeout=10, description="customer name field")
+    filler = FormFiller(ops, erp_window.id)
+    entered_articles: List[OrderedArticle] = []
+    async for kind, value in stream.events():
+        if kind == "customer":
+            print(f"Entering customer {value} while the order is extracted...")
+            await filler.run([FormOperation(erp_element_ids.element_id_customer_name, SET_VALUE, value)])
+        else:
+            entered_articles.append(value)
+            print(f"Adding article {len(entered_articles)} ({value.article_name}) while the order is extracted...")
+            await filler.run(article_form_operations(erp_element_ids, len(entered_articles), value))
+    if filler.first_operation_at is not None:
+        print(f"First ERP entry {filler.first_operation_at - stream.started_at:.2f}s after the extraction started, "
+              f"extraction done after {time.perf_counter() - stream.started_at:.2f}s.")
+
+    # Final validation of the complete order before 'Save Order'
+    order_data = await stream.result()
+    if order_data is None:
+        problems = ["order extraction failed"]
+    else:
+        problems = validate_order(order_data)
+        if [_article_key(article) for article in entered_articles] != [_article_key(article) for article in order_data.ordered_articles]:
+            problems.append("the entered articles differ from the extracted order")
+    result = await filler.finish(
+        submit=FormOperation(erp_element_ids.element_id_save_order_button, INVOKE),
+        expected_values={erp_element_ids.element_id_customer_name: order_data.customer_name} if order_data else None,
+        expected_texts={f"article {number}": article.article_name
+                        for number, article in enumerate(entered_articles, start=1)},
+        problems=problems)
+    print(result.report())
+    if not result.success:
+        raise FormFillError(result)
+    before_save = result.window_details
+    await wait_until(window_tree_changed(ops, erp_window.id, before_save.to_json_string() if before_save else None),
+                     timeout=5, description="order to be saved")
+    return order_data
+
+@traced("flow: collect orders")
+async def run_collect_orders_erp(source: str = "gmail"):
+    """Main function to run the email-to-ERP example; the email comes from Gmail (or local Outlook)."""
     print("Starting Email-to-ERP Example...")
     
     # Load environment variables from .env file
@@ -287,134 +811,146 @@ async def run_collect_orders_erp():
     
     if not screengrasp_api_key:
         print("Error: SCREENGRASP_API_KEY not found in .env file. Get a free key at https://screengrasp.com/api.html")
-        input("Press Enter to exit.")
+        wait_for_enter()
         return
         
     if not openai_api_key:
         print("Warning: OPENAI_API_KEY not found in .env file. OpenAI part will be skipped. Get a key at https://platform.openai.com/api-keys")
     
     # Initialize the Smooth Operator Client
-    client = SmoothOperatorClient(screengrasp_api_key)
-    
-    print("Starting server (can take a while, especially on first run, because it's installing the server)...")
-    client.start_server()
-    
-    email_screenshot = None
-    try:
-        # --- Get Order Email Screenshot ---
-        # By default, uses Gmail via Chrome.
-        # To use local Outlook instead (if installed), comment the Gmail line and uncomment the Outlook line below.
-        print("Attempting to get order email screenshot via Gmail...")
-        email_screenshot = await get_order_screenshot_from_gmail(client)
-        # print("Attempting to get order email screenshot via Outlook...")
-        # email_screenshot = await get_order_screenshot_from_outlook(client)
-        
-        if not email_screenshot or not email_screenshot.success:
-            print("Error: Could not get email screenshot.")
-            return
-        print("Successfully captured email screenshot.")
-        
-    except Exception as ex:
-        print(f"Error getting email screenshot: {ex}")
-        return
-    
-    # --- Download and Run Mock ERP ---
-    erp_exe_path = None
-    try:
-        print("Downloading mock ERP application...")
-        erp_exe_path = await download_mock_erp()
-        print(f"Mock ERP downloaded to: {erp_exe_path}")
-        
-        print("Launching mock ERP application...")
-        client.system.open_application(erp_exe_path)
-        await asyncio.sleep(5)  # Give the app time to start
-        print("Mock ERP application launched.")
-        
-    except Exception as ex:
-        print(f"Error with mock ERP application: {ex}")
-        # Continue even if ERP fails
+    client = session_client(click_cache(shared_server(SmoothOperatorClient, screengrasp_api_key)))
+    # Awaitable facade, so that LLM calls and UI steps don't block each other
+    ops = AsyncSmoothOperator(client, openai_api_key=openai_api_key)
     
-    # --- Extract Order Data using AI ---
-    order_data = None
-    if openai_api_key and email_screenshot and email_screenshot.success:
-        order_data = await parse_order_data_from_screenshot(email_screenshot, openai_api_key)
-    else:
-        print("Skipping AI order extraction (OpenAI key missing or screenshot failed).")
+    print("Starting server (or attaching to the running one; the first start can take a while, because it's installing the server)...")
+    await ops.start_server()
     
-    # --- Automate ERP Data Entry ---
-    if openai_api_key and order_data and erp_exe_path:
+    # Remembers which emails were processed, so a rerun skips them (or resumes where it stopped)
+    ledger = OrderLedger()
+
+    async def capture_email():
+        # By default, uses Gmail via Chrome; source="outlook" uses local Outlook instead (if installed)
+        if source == "outlook":
+            print("Attempting to get order email via Outlook...")
+            email = await get_order_email_from_outlook(ops, ledger)
+        else:
+            print("Attempting to get order email via Gmail...")
+            email = await get_order_email_from_gmail(ops, ledger)
+        if not email:
+            print("Error: Could not open the order email.")
+            return None
+        if email.entry and email.entry.stage == ENTERING:
+            print("Warning: An earlier run stopped while entering this order, so it may or may not have been saved. "
+                  "Check the ERP, then reset the email in the order ledger to enter it again.")
+            return None
+        if email.entry and email.entry.is_done:
+            print("This order was entered by an earlier run (order ledger), nothing to do.")
+            return None
+        if email.needs_extraction and (not email.screenshot or not email.screenshot.success):
+            print("Warning: Could not get email screenshot, only the email text can be used for the extraction.")
+        return email
+
+    async def get_order(email: OrderEmail):
+        if email.order:
+            print("Using the order parsed from the email text, no OpenAI request needed.")
+            order_data = email.order
+        elif email.stored_order:
+            print("Using the order extracted by an earlier run (order ledger).")
+            order_data = email.stored_order
+        elif not openai_api_key:
+            print("Skipping AI order extraction (OpenAI key missing).")
+            return None
+        elif os.getenv("ORDER_STREAMING", "1").lower() not in ("0", "false", "no"):
+            # The ERP entry consumes the order while it is generated, and validates it before saving
+            return OrderStream(ops, email)
+        else:
+            order_data = await extract_order(ops, email)
+            if not order_data:
+                ledger.failed(email.fingerprint, "order extraction failed", keep_order=False)
+                return None
+            print(f"Order extracted by: {email.extracted_by}")
+            ledger.extracted(email.fingerprint, order_data.to_dict(), extracted_by=email.extracted_by)
+        problems = validate_order(order_data)
+        if problems:
+            # The next run extracts the order again
+            ledger.failed(email.fingerprint, f"invalid order: {', '.join(problems)}", keep_order=False)
+            print(f"Error: Extracted order is not valid: {', '.join(problems)}")
+            return None
+        return order_data
+
+    async def launch_erp(erp_exe_path: str, email: OrderEmail):
+        # Launched after the email is captured, so the ERP window doesn't take the focus while Gmail is used
+        return await launch_mock_erp(ops, erp_exe_path)
+
+    async def find_erp_window(erp_exe_path: str):
+        erp_window, window_details_json = await get_erp_window_details(ops)
+        return (erp_window, window_details_json) if erp_window else None
+
+    async def get_element_ids(erp):
+        erp_element_ids = await identify_erp_element_ids(ops, erp[1])
+        if not erp_element_ids:
+            print("Error: Could not identify ERP element IDs.")
+        return erp_element_ids
+
+    def record_streamed_order(email: OrderEmail, stream: OrderStream) -> bool:
+        """Store the order of a finished stream in the ledger; False if it isn't valid."""
+        if stream.order is None or validate_order(stream.order):
+            return False
+        print(f"Order extracted by: {email.extracted_by} (streamed)")
+        ledger.extracted(email.fingerprint, stream.order.to_dict(), extracted_by=email.extracted_by)
+        return True
+
+    async def enter_order(email: OrderEmail, order_data, erp, erp_element_ids: ErpElementIds):
         print("Attempting to automate data entry into mock ERP...")
+        # From here on the order may be saved; if the run stops, the next one doesn't enter it twice
+        ledger.entering(email.fingerprint)
         try:
-            # 1. Get Overview and Find ERP Window
-            print("Getting system overview...")
-            overview = client.system.get_overview()
-            
-            window_details_json = None
-            
-            if (overview.focus_info and 
-                overview.focus_info.focused_element_parent_window and 
-                overview.focus_info.focused_element_parent_window.title == "ERP system"):
-                window_details_json = overview.focus_info.focused_element_parent_window.to_json_string()
+            if isinstance(order_data, OrderStream):
+                await enter_order_stream_into_erp(ops, erp[0], erp_element_ids, order_data)
+                record_streamed_order(email, order_data)
             else:
-                # Find the ERP window by title
-                erp_window = next((w for w in overview.windows 
-                                  if w.title and "ERP system" in w.title.lower()), None)
-                
-                if not erp_window:
-                    print("Error: Could not find the Mock ERP window.")
-                    return
-                    
-                print(f"Found Mock ERP window: {erp_window.id} - {erp_window.title}")
-                
-                print("Getting ERP window details...")
-                window_details = client.system.get_window_details(erp_window.id)
-                if not window_details or not window_details.user_interface_elements:
-                    print("Error: Could not get details for the Mock ERP window.")
-                    return
-                    
-                window_details_json = window_details.to_json_string()
-            
-            # 2. Get Element IDs using AI
-            erp_element_ids = await identify_erp_element_ids(client, window_details_json, openai_api_key)
-            if not erp_element_ids:
-                print("Error: Could not identify ERP element IDs.")
-                return
-            
-            # 3. Enter Data using Automation
-            print(f"Entering customer name: {order_data.customer_name} into element {erp_element_ids.element_id_customer_name}")
-            client.automation.set_value(erp_element_ids.element_id_customer_name, order_data.customer_name)
-            await asyncio.sleep(0.5)  # Small delay between actions
-            
-            for article in order_data.ordered_articles:
-                print(f"Entering article: {article.article_name}")
-                client.automation.set_value(erp_element_ids.element_id_article_name, article.article_name)
-                await asyncio.sleep(0.2)
-                client.automation.set_value(erp_element_ids.element_id_quantity, str(article.quantity))
-                await asyncio.sleep(0.2)
-                client.automation.set_value(erp_element_ids.element_id_price_per_unit, f"{article.price_per_unit:.2f}")
-                await asyncio.sleep(0.2)
-                
-                print("Clicking 'Add Item' button...")
-                client.automation.invoke(erp_element_ids.element_id_add_item_button)
-                await asyncio.sleep(1)  # Delay after adding item
-            
-            print("Clicking 'Save Order' button...")
-            client.automation.invoke(erp_element_ids.element_id_save_order_button)
-            await asyncio.sleep(0.5)
-            
-            print("Data entry automation complete.")
-            
-        except Exception as ex:
-            print(f"Error during ERP data entry automation: {ex}")
-    else:
-        print("Skipping ERP data entry (AI steps failed or ERP not running).")
-    
-    # Ensure the server is stopped even if errors occur
-    print("Stopping server...")
-    client.stop_server()
+                await enter_order_into_erp(ops, erp[0], erp_element_ids, order_data)
+        except FormFillError as ex:
+            # Nothing was saved, the next run enters the stored order again (or extracts it again if it wasn't valid)
+            keep_order = not isinstance(order_data, OrderStream) or record_streamed_order(email, order_data)
+            ledger.failed(email.fingerprint, str(ex), keep_order=keep_order)
+            raise
+        ledger.entered(email.fingerprint)
+        print("Data entry automation complete.")
+        return True
+
+    # Each stage starts as soon as the stages it needs are done: the ERP download doesn't need the
+    # email, and the order extraction runs while the ERP is launched and its element IDs identified.
+    # If a stage fails, the stages that depend on it are cancelled.
+    graph = StageGraph()
+    graph.add("email", capture_email)
+    graph.add("erp download", download_mock_erp)
+    graph.add("order", get_order, "email")
+    graph.add("erp launch", launch_erp, "erp download", "email")
+    graph.add("erp window", find_erp_window, "erp launch")
+    graph.add("element ids", get_element_ids, "erp window")
+    graph.add("erp entry", enter_order, "email", "order", "erp window", "element ids")
+    try:
+        await graph.run()
+        print(graph.report())
+
+        print(f"Order ledger: {ledger.summary()}")
+        print(f"Order extraction paths (all runs): {ledger.extraction_summary()}")
+        if ops.llm and ops.llm.cache:
+            print(f"LLM cache: {ops.llm.cache.stats()}")
+        print(f"Click cache: {get_click_cache().stats()}")
+    finally:
+        # Ensure the stream and the server are stopped even if errors occur
+        order = graph.stages["order"].result
+        if isinstance(order, OrderStream):
+            await order.close()
+        ledger.close()
+        print("Stopping server...")
+        await ops.stop_server()
+        ops.close()
     
-    print("\nEmail-to-ERP Example finished. Press Enter to exit.")
-    input()
+    print("\nEmail-to-ERP Example finished.")
+    wait_for_enter()
 
 if __name__ == "__main__":
     asyncio.run(run_collect_orders_erp()) 
\ No newline at end of file
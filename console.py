@@ -0,0 +1,17 @@
+"""
+The "Press Enter to exit" pause at the end of the flows, which keeps the console window open.
+
+Scheduled runs (cron, Windows Task Scheduler) have nobody to press Enter. Set NON_INTERACTIVE=1
+(or run `python example.py <flow> --non-interactive`) and the flows exit right away instead.
+"""
+import os
+
+
+def is_interactive() -> bool:
+    return os.getenv("NON_INTERACTIVE", "0").lower() in ("", "0", "false", "no")
+
+
+def wait_for_enter(prompt: str = "Press Enter to exit.") -> None:
+    """input() with the prompt, unless NON_INTERACTIVE is set."""
+    if is_interactive():
+        input(prompt)
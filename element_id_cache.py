@@ -0,0 +1,102 @@
+"""
+Disk-backed cache for element IDs identified by the LLM, keyed by a structural fingerprint
+of the window's UI automation tree.
+
+The fingerprint only looks at the layout (control types, element IDs, capabilities and the
+tree shape), not at volatile values such as texts, current values or the rows of lists. As
+long as the window's layout stays the same, the cached IDs are returned without an LLM round
+trip. When the layout changes, the fingerprint changes and the IDs are identified again.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, Optional
+
+from ui_tree import get_field, load_tree, window_root
+
+# Children of these controls are content (rows, items, page text), not layout
+CONTENT_CONTROL_TYPES = {"List", "DataGrid", "Table", "Tree", "Document"}
+
+
+def tree_fingerprint(tree: Any) -> str:
+    """Return a hash of the structure of a UI automation tree (model object, dict or JSON string)."""
+    digest = hashlib.sha256()
+    stack = [(window_root(load_tree(tree)), 0)]
+    while stack:
+        node, depth = stack.pop()
+        if node is None:
+            continue
+        control_type = get_field(node, "control_type", "")
+        children = [] if control_type in CONTENT_CONTROL_TYPES else get_field(node, "children", [])
+        digest.update(json.dumps([
+            depth,
+            control_type,
+            get_field(node, "id", ""),
+            bool(get_field(node, "supports_set_value")),
+            bool(get_field(node, "supports_invoke")),
+            len(children),
+        ]).encode("utf-8"))
+        stack.extend((child, depth + 1) for child in reversed(children))
+    return digest.hexdigest()
+
+
+class ElementIdCache:
+    """Size-bounded (least recently used) cache of element IDs, persisted as a JSON file."""
+    def __init__(self, path: Optional[str] = None, max_entries: int = 32):
+        self.path = path or os.path.join(tempfile.gettempdir(), "smooth-operator-element-ids.json")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, Dict[str, Any]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"entries": self._entries}, f)
+            os.replace(temp_path, self.path)
+        except OSError as ex:
+            print(f"Warning: Could not write element ID cache {self.path}: {ex}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def get(self, fingerprint: str) -> Optional[Dict[str, str]]:
+        """Return the cached element IDs for a fingerprint, or None."""
+        entry = self._entries.get(fingerprint)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry["last_used"] = time.time()
+        self._save()
+        return entry["element_ids"]
+
+    def put(self, fingerprint: str, element_ids: Dict[str, str]) -> None:
+        """Store element IDs for a fingerprint, evicting the least recently used entries if full."""
+        self._entries[fingerprint] = {"element_ids": element_ids, "last_used": time.time()}
+        while len(self._entries) > self.max_entries:
+            oldest = min(self._entries, key=lambda key: self._entries[key]["last_used"])
+            del self._entries[oldest]
+        self._save()
+
+    def clear(self) -> None:
+        self._entries = {}
+        self._save()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> str:
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups * 100 if lookups else 0.0
+        return f"{self.hits} hits, {self.misses} misses ({hit_rate:.0f}% hit rate), {len(self)} entries"
@@ -1,127 +1,122 @@
-import os
+"""
+Command-line entry point for the examples: choose the flow and its parameters by argument.
+
+    python example.py                                      # calculator
+    python example.py twitter --accounts sama,kimmonismus --tabs 3
+    python example.py orders --source outlook
+    python example.py orders-batch --batch-size 50 --non-interactive
+    python example.py twitter-daemon --accounts sama,datachaz
+
+Only the module of the chosen flow (and what it imports) is loaded, so a scheduled run of the
+calculator doesn't pay for the Twitter and ERP modules. --non-interactive skips the closing
+"Press Enter to exit" (see console.py). --import-time prints how long the flow's imports took;
+with --import-budget SECONDS, exceeding it is reported, and with --import-only the script exits
+with status 3 then, without running the flow, e.g. as a check of the cold start of cron jobs.
+For a per-module breakdown, run `python -X importtime example.py <flow> --import-only`.
+"""
+import argparse
 import asyncio
-from dotenv import load_dotenv
-from openai import OpenAI
-from smooth_operator_agent_tools import SmoothOperatorClient
+import importlib
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Sequence, Tuple
 
-# Import the examples
-from twitter_ai_news_checker import run_twitter_checker
-from twitter_ai_news_checker_minimal import run_minimal_twitter_checker
-from collect_orders_erp import run_collect_orders_erp
+EXIT_IMPORT_BUDGET_EXCEEDED = 3
 
-async def main_calculator():
-    # Load environment variables from .env file
-    load_dotenv()
 
-    screengrasp_api_key = os.getenv("SCREENGRASP_API_KEY")
-    openai_api_key = os.getenv("OPENAI_API_KEY")
+class Flow:
+    """A flow of the command line: the module and coroutine function that run it, and the options it takes."""
+    def __init__(self, module: str, function: str, description: str, options: Sequence[str] = ()):
+        self.module = module
+        self.function = function
+        self.description = description
+        self.options = options
 
-    if not screengrasp_api_key:
-        raise ValueError("SCREENGRASP_API_KEY not found in .env file. Get a free key at https://screengrasp.com/api.html")
 
-    if not openai_api_key:
-        print("Warning: OPENAI_API_KEY not found in .env file. OpenAI part will be skipped. Get a key at https://platform.openai.com/api-keys")
+FLOWS = {
+    "calculator": Flow("calculator_example", "main_calculator", "Calculate 3+4 in the Windows calculator"),
+    "twitter": Flow("twitter_ai_news_checker", "run_twitter_checker",
+                    "Summarize the new tweets of some accounts", ("accounts", "tabs")),
+    "twitter-minimal": Flow("twitter_ai_news_checker_minimal", "run_minimal_twitter_checker",
+                            "The Twitter example in a few lines", ("accounts",)),
+    "twitter-daemon": Flow("twitter_daemon", "run_twitter_daemon",
+                           "Poll the accounts and alert on breaking news (until Ctrl+C)", ("accounts",)),
+    "twitter-scrape": Flow("twitter_scraper", "run_scrape_comparison",
+                           "Compare reading the accounts sequentially and in tabs", ("accounts", "tabs")),
+    "orders": Flow("collect_orders_erp", "run_collect_orders_erp",
+                   "Enter the first order email into the mock ERP", ("source",)),
+    "orders-batch": Flow("order_pipeline", "run_collect_orders_erp_batch",
+                         "Enter all order emails into the mock ERP",
+                         ("source", "max_emails", "queue_size", "extraction_workers")),
+}
 
-    # Start the Smooth Operator server and perform actions
-    client = SmoothOperatorClient(screengrasp_api_key)
-    print("Starting server (can take a while, especially on first run, because it's installing the server)...")
-    client.start_server()
 
-    try:
-        # Start the windows calculator and calculate 3+4
-        print("Opening calculator...")
-        client.system.open_application("calc")
-        
-        print("Typing 3+4...")
-        client.keyboard.type("3+4") # assumes the calc app is focused
-        
-        print("Clicking equals sign...")        
-        # Using AI vision to find and click th equals button - alternatives:
-        # - client.keyboard.type("=") - simpler and faster
-        # - client.automation.invoke - using Windows UI Automation, a bit more complex to implement but very robust (not affected by focus changes)                        
-        client.mouse.click_by_description("the equals sign")
-
-        if openai_api_key:
-            print("Getting window overview...")
-            overview = client.system.get_overview() # assumes calc is focused, when debugging be aware you might be influencing which app is focused
-            
-            # Check if focused window info is available
-            if overview.focus_info and overview.focus_info.focused_element_parent_window:
-                focused_window_json = overview.focus_info.focused_element_parent_window.to_json_string()
-                
-                # You can use GPT-4o or other ai models for all sorts of tasks together with the Smooth Operator Agent Tools. 
-                # In this case we use it to read the result of the calculator from its automation tree.
-                # But it can also for example be used to decide which button to click next, what text to type, etc.
-                print("Asking OpenAI about the result...")
-                openai_client = OpenAI(api_key=openai_api_key)
-                chat_completion = openai_client.chat.completions.create(
-                    model="gpt-4o", 
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": f"What result does the calculator display? You can read it from its automation tree: {focused_window_json}"
-                                }
-                            ]
-                        }
-                    ]
-                )
-                result_text = chat_completion.choices[0].message.content
-                print(f"OpenAI Result: {result_text}")
-            else:
-                print("Could not get focused window information to send to OpenAI.")
-        else:
-            print("OpenAI key not provided, skipping result verification.")
-
-        # Alternative using screenshot (more costly and potentially less reliable):
-        # print("Taking screenshot...")
-        # screenshot = client.screenshot.take()
-        # if openai_api_key:
-        #     print("Asking OpenAI about the screenshot...")
-        #     openai_client = OpenAI(api_key=openai_api_key)
-        #     chat_completion = openai_client.chat.completions.create(
-        #         model="gpt-4o",
-        #         messages=[
-        #             {
-        #                 "role": "user",
-        #                 "content": [
-        #                     {
-        #                         "type": "text",
-        #                         "text": "What result does the calculator display based on the screenshot?"
-        #                     },
-        #                     {
-        #                         "type": "image_url",
-        #                         "image_url": {
-        #                             "url": f"data:image/jpeg;base64,{screenshot.base64_image}"
-        #                         }
-        #                     }
-        #                 ]
-        #             }
-        #         ]
-        #     )
-        #     result_text = chat_completion.choices[0].message.content
-        #     print(f"OpenAI Screenshot Result: {result_text}")
-
-    except Exception as e:
-        print(f"An error occurred: {e}")
-    finally:
-        # Ensure the server is stopped even if errors occur
-        print("Stopping server...")
-        client.stop_server() # Optional: uncomment if you want to explicitly stop the server
-        pass
+def import_flow(flow: Flow) -> Tuple[Callable, float, int]:
+    """Import the flow's module. Returns its coroutine function, the import time and the number of modules loaded."""
+    modules_before = len(sys.modules)
+    start_time = time.perf_counter()
+    module = importlib.import_module(flow.module)
+    elapsed = time.perf_counter() - start_time
+    return getattr(module, flow.function), elapsed, len(sys.modules) - modules_before
+
 
-    print("\nExample finished. Press Enter to exit.")
-    input() # Keep console open
+def _account_list(text: str) -> List[str]:
+    return [account.strip().lstrip("@") for account in text.split(",") if account.strip()]
 
-async def main():
-    # Choose which example to run by uncommenting one line and commenting out the others
-    await main_calculator()  # Default example: calculator
-    # await run_twitter_checker()  # Twitter example
-    # await run_minimal_twitter_checker()  # Minimal Twitter example 
-    # await run_collect_orders_erp()  # Email to ERP example
-    return
+
+def parse_arguments(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run one of the Smooth Operator examples.",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog="flows:\n" + "\n".join(f"  {name:<16} {flow.description}"
+                                                                 for name, flow in FLOWS.items()))
+    parser.add_argument("flow", nargs="?", default="calculator", choices=list(FLOWS), metavar="flow",
+                        help="The example to run (default: calculator)")
+    parser.add_argument("--accounts", type=_account_list, help="Twitter/X accounts, comma-separated")
+    parser.add_argument("--tabs", type=int, help="Load this many accounts at once in background tabs")
+    parser.add_argument("--source", choices=["gmail", "outlook"], help="Where the order emails are read (default: gmail)")
+    parser.add_argument("--max-emails", "--batch-size", dest="max_emails", type=int,
+                        help="Order emails to process at most in the batch mode (default: 20)")
+    parser.add_argument("--queue-size", type=int, help="Orders waiting between the stages of the batch mode (default: 2)")
+    parser.add_argument("--extraction-workers", type=int, help="Orders extracted concurrently in the batch mode (default: 2)")
+    parser.add_argument("--non-interactive", action="store_true",
+                        help="Don't wait for Enter at the end (for scheduled runs); same as NON_INTERACTIVE=1")
+    parser.add_argument("--import-time", action="store_true", help="Print how long importing the flow took")
+    parser.add_argument("--import-budget", type=float, metavar="SECONDS",
+                        help="Report imports slower than this (implies --import-time)")
+    parser.add_argument("--import-only", action="store_true",
+                        help="Only import the flow and report the import time; exit status 3 if over the budget")
+    args = parser.parse_args(argv)
+    flow = FLOWS[args.flow]
+    for option in ("accounts", "tabs", "source", "max_emails", "queue_size", "extraction_workers"):
+        if getattr(args, option) is not None and option not in flow.options:
+            parser.error(f"--{option.replace('_', '-')} doesn't apply to the {args.flow} flow")
+    return args
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_arguments(sys.argv[1:] if argv is None else argv)
+    flow = FLOWS[args.flow]
+    if args.non_interactive:
+        os.environ["NON_INTERACTIVE"] = "1"
+
+    run, import_seconds, modules_loaded = import_flow(flow)
+    over_budget = args.import_budget is not None and import_seconds > args.import_budget
+    if args.import_time or args.import_only or args.import_budget is not None:
+        print(f"Imported {flow.module} in {import_seconds * 1000:.0f}ms ({modules_loaded} modules)"
+              + (f", budget {args.import_budget * 1000:.0f}ms" if args.import_budget is not None else ""))
+    if over_budget:
+        print(f"Warning: Importing the {args.flow} flow took longer than the budget of {args.import_budget:.3f}s.")
+    if args.import_only:
+        return EXIT_IMPORT_BUDGET_EXCEEDED if over_budget else 0
+
+    options: Dict[str, Any] = {option: getattr(args, option) for option in flow.options
+                               if getattr(args, option) is not None}
+    try:
+        asyncio.run(run(**options))
+    except KeyboardInterrupt:
+        pass
+    return 0
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,628 @@
+"""
+Local stand-ins for the Smooth Operator server and the OpenAI chat API, for benchmarks.
+
+FakeSmoothOperatorClient has the same API categories as SmoothOperatorClient (screenshot,
+system, mouse, keyboard, chrome, automation, code) and returns the library's own response
+models. Behind it, FakeDesktop simulates just enough of the desktop for the example flows:
+the calculator, Gmail with a list of order emails, X/Twitter timelines in Chrome tabs and the
+mock ERP form. FakeOpenAI answers chat completions based on the prompt.
+
+Every call sleeps for a latency drawn from a configurable distribution and is recorded, so a
+benchmark can report per-step latencies:
+
+    recorder = CallRecorder()
+    client = FakeSmoothOperatorClient(desktop=FakeDesktop(), latencies=DEFAULT_LATENCIES, recorder=recorder)
+    openai_client = FakeOpenAI(latencies=DEFAULT_LATENCIES, recorder=recorder)
+
+See benchmark.py.
+
+For the server lifecycle (server_lifecycle.py), launch_fake_agent_server() starts a process that
+answers the server's ping on a local port, reported through a port file like the real server does.
+FakeArtifactServer serves a download with byte ranges and broken connections (artifact_cache.py).
+"""
+import base64
+import itertools
+import json
+import os
+import random
+import re
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+from smooth_operator_agent_tools.models.models import (ActionResponse, ChromeElementInfo, ControlDTO, FocusInformation,
+                                                       OverviewResponse, Point, ScreenGrasp2Response, ScreenshotResponse,
+                                                       SimpleResponse, WindowDetailInfosDTO, WindowDetailResponse,
+                                                       WindowInfoDTO)
+
+from token_estimate import estimate_tokens
+
+ORDINALS = ["first", "second", "third", "fourth", "fifth", "sixth", "seventh", "eighth", "ninth", "tenth"]
+SCREEN_SIZE = (1920, 1080)
+
+
+class LatencyModel:
+    """Latency distribution of one call: log-normal around `median` seconds (or fixed if spread is 0)."""
+    def __init__(self, median: float, spread: float = 0.35):
+        self.median = median
+        self.spread = spread
+
+    def sample(self, rng: random.Random, scale: float = 1.0) -> float:
+        if self.spread <= 0:
+            return self.median * scale
+        return rng.lognormvariate(0, self.spread) * self.median * scale
+
+
+# Rough latencies of a local Smooth Operator server on a desktop PC and of GPT-4o
+DEFAULT_LATENCIES: Dict[str, LatencyModel] = {
+    "default": LatencyModel(0.03),
+    "system.get_overview": LatencyModel(0.15),
+    "system.get_window_details": LatencyModel(0.2),
+    "automation.get_window_details": LatencyModel(0.2),
+    "system.open_application": LatencyModel(0.8),
+    "screenshot.take": LatencyModel(0.25),
+    "screenshot.find_ui_element": LatencyModel(1.5),
+    "mouse.click_by_description": LatencyModel(1.5),
+    "chrome.open_chrome": LatencyModel(2.0),
+    "chrome.navigate": LatencyModel(0.6),
+    "chrome.new_tab": LatencyModel(0.3),
+    "chrome.get_text": LatencyModel(0.1),
+    "server.start": LatencyModel(0.5),
+    "openai.chat": LatencyModel(1.5, 0.5),
+    "openai.chat.vision": LatencyModel(4.0, 0.4),
+}
+
+
+class CallRecorder:
+    """Thread-safe record of (call name, duration) of the fake calls."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls: List[Tuple[str, float]] = []
+
+    def add(self, call_name: str, duration: float) -> None:
+        with self._lock:
+            self.calls.append((call_name, duration))
+
+    def take(self) -> List[Tuple[str, float]]:
+        """Return the recorded calls and start over."""
+        with self._lock:
+            calls, self.calls = self.calls, []
+        return calls
+
+
+class _Latency:
+    """Samples and sleeps the latency of a call, and records it."""
+    def __init__(self, latencies: Dict[str, LatencyModel], recorder: Optional[CallRecorder], scale: float, seed: int):
+        self.latencies = latencies
+        self.recorder = recorder
+        self.scale = scale
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self, call_name: str) -> float:
+        """The latency of a call, recorded but not slept (e.g. to spread it over a stream)."""
+        model = self.latencies.get(call_name) or self.latencies["default"]
+        with self._lock:
+            duration = model.sample(self._rng, self.scale)
+        if self.recorder:
+            self.recorder.add(call_name, duration)
+        return duration
+
+    def wait(self, call_name: str) -> None:
+        time.sleep(self.sample(call_name))
+
+
+def _png_base64(width: int, height: int) -> str:
+    """A plain gray PNG (without Pillow), standing in for a screenshot."""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+    rows = b"".join(b"\x00" + bytes([200, 200, 200]) * width for _ in range(height))
+    png = (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+           + chunk(b"IDAT", zlib.compress(rows, 9)) + chunk(b"IEND", b""))
+    return base64.b64encode(png).decode("ascii")
+
+
+def _control(id: str, control_type: str, name: str = "", value: Optional[str] = None,
+             children: Optional[List[ControlDTO]] = None, settable: bool = False, invokable: bool = False) -> ControlDTO:
+    return ControlDTO(id=id, name=name, control_type=control_type, current_value=value, children=children or [],
+                      supports_set_value=settable, supports_invoke=invokable)
+
+
+class FakeDesktop:
+    """State of the simulated desktop: calculator, Chrome (Gmail, X/Twitter) and the mock ERP."""
+    # Shared by all desktops, so that a new run of a flow finds new tweets as well
+    _tweet_numbers = itertools.count(1)
+    # Screen point -> description of the target found there; targets sit in the same spot on every desktop
+    _click_targets: Dict[Tuple[int, int], str] = {}
+    ERP_FIELDS = {"erp-customer": "Customer name", "erp-article": "Article name",
+                  "erp-quantity": "Quantity", "erp-price": "Price per unit"}
+
+    def __init__(self, order_emails: int = 3):
+        self._lock = threading.RLock()
+        self.order_emails = order_emails
+        self.foreground: Optional[str] = None  # "calculator", "chrome" or "erp"
+        self.windows: Dict[str, str] = {}  # window ID -> kind
+        self.calculator_input = ""
+        self.calculator_display = "0"
+        self.tabs: List[List[str]] = []  # history of pages per tab
+        self.active_tab = 0
+        self.typed_text = ""
+        self.erp_values: Dict[str, str] = {}
+        self.erp_items: List[str] = []
+        self.orders_saved = 0
+        self.screenshot_base64 = _png_base64(*SCREEN_SIZE)
+
+    # --- Pages ---
+
+    @property
+    def page(self) -> Optional[str]:
+        return self.tabs[self.active_tab][-1] if self.tabs else None
+
+    def _open_page(self, url: str) -> None:
+        self.tabs[self.active_tab].append(url)
+
+    def page_text(self) -> str:
+        page = self.page or ""
+        if page.startswith("gmail:search"):
+            results = "\n".join(f"Smith & Co. Ltd. {i + 1}  New Computerstuff.com Order  Dear you, I just visited..."
+                                for i in range(self.order_emails))
+            return f"Gmail\nInbox\nSearch results\n{results}"
+        if page.startswith("gmail:email:"):
+            number = page.rsplit(":", 1)[1]
+            return (f"Gmail\nNew Computerstuff.com Order\nDear you,\nI just visited our customer Smith & Co. Ltd. {number}.\n"
+                    "They want to order:\n- Product Name: High-Speed Router X200\n  Quantity: 5 units\n  Price per unit: 120.00\n"
+                    "Best regards,\nJohn Doe")
+        if "mail.google.com" in page:
+            return "Gmail\nInbox\nPrimary\nPromotions\nSocial"
+        match = re.match(r"https://x\.com/(\w+)", page)
+        if match:
+            return self._timeline_text(match.group(1))
+        return ""
+
+    def _timeline_text(self, account: str) -> str:
+        # Every read brings one new tweet, like an active account
+        newest = next(self._tweet_numbers)
+        lines = [account.title(), f"@{account}", "1,234 posts"]
+        for age in range(5):
+            number = newest - age
+            lines += [account.title(), f"@{account}", "·", f"{age * 7 + 1}m",
+                      f"Tweet {number} of @{account} about a new AI model release and its benchmark results.",
+                      str(age * 3), str(age * 11), f"{age + 1}.2K"]
+        return "\n".join(lines)
+
+    # --- Windows ---
+
+    def _window(self, window_id: str) -> WindowInfoDTO:
+        kind = self.windows[window_id]
+        titles = {"calculator": "Calculator", "erp": "ERP system",
+                  "chrome": "Gmail - Google Chrome" if "gmail" in (self.page or "") or "mail.google" in (self.page or "") else "X - Google Chrome"}
+        root = {"calculator": self._calculator_tree, "erp": self._erp_tree, "chrome": self._chrome_tree}[kind]()
+        window = WindowInfoDTO(id=window_id, title=titles[kind], is_foreground=self.foreground == kind,
+                               process_name=kind)
+        window.detail_infos = WindowDetailResponse(details=WindowDetailInfosDTO(user_interface_elements=root))
+        return window
+
+    def _calculator_tree(self) -> ControlDTO:
+        buttons = [_control(f"calc-{name}", "Button", name, invokable=True)
+                   for name in ["Zero", "One", "Two", "Three", "Four", "Plus", "Minus", "Equals", "Clear"]]
+        return _control("calc-window", "Window", "Calculator", children=[
+            _control("calc-display", "Text", f"Display is {self.calculator_display}"),
+            _control("calc-keypad", "Group", "Standard operators", children=buttons)])
+
+    def _erp_tree(self) -> ControlDTO:
+        form = []
+        for element_id, label in self.ERP_FIELDS.items():
+            form.append(_control(f"{element_id}-label", "Text", label))
+            form.append(_control(element_id, "Edit", label, value=self.erp_values.get(element_id, ""), settable=True))
+        form.append(_control("erp-add", "Button", "Add Item", invokable=True))
+        items = [_control(f"erp-item-{i}", "ListItem", item) for i, item in enumerate(self.erp_items)]
+        form.append(_control("erp-items", "List", "Order items", children=items))
+        form.append(_control("erp-save", "Button", "Save Order", invokable=True))
+        form.append(_control("erp-status", "Text", f"{self.orders_saved} orders saved"))
+        return _control("erp-window", "Window", "ERP system", children=form)
+
+    def _chrome_tree(self) -> ControlDTO:
+        return _control("chrome-window", "Window", "Google Chrome", children=[
+            _control("chrome-document", "Document", self.page or "")])
+
+    def _focus_info(self) -> Optional[FocusInformation]:
+        window_id = next((i for i, kind in self.windows.items() if kind == self.foreground), None)
+        if window_id is None:
+            return None
+        window = self._window(window_id)
+        focus_info = FocusInformation(focused_element=window.detail_infos.details.user_interface_elements,
+                                      focused_element_parent_window=window, is_chrome=self.foreground == "chrome")
+        if self.foreground == "chrome":
+            width, height = 1500, 950
+            focus_info.current_chrome_tab_most_relevant_elements = [ChromeElementInfo(
+                tag_name="div", role="main", is_visible=True, bounding_rect=[0, 0, width, height],
+                center_point=Point(x=400 + width // 2, y=120 + height // 2))]
+        return focus_info
+
+    def _show(self, kind: str) -> None:
+        if kind not in self.windows.values():
+            self.windows[f"{kind}-{len(self.windows) + 1}"] = kind
+        self.foreground = kind
+
+    # --- API handlers (named <category>_<method>) ---
+
+    def system_get_overview(self):
+        with self._lock:
+            return OverviewResponse(windows=[self._window(i) for i in self.windows], focus_info=self._focus_info())
+
+    def system_get_window_details(self, window_id: str):
+        with self._lock:
+            if window_id not in self.windows:
+                return None
+            return self._window(window_id).detail_infos.details
+
+    automation_get_window_details = system_get_window_details
+
+    def system_open_application(self, app_name_or_path: str):
+        with self._lock:
+            name = app_name_or_path.lower()
+            if "calc" in name:
+                self._show("calculator")
+            elif "erp" in name:
+                self._show("erp")
+            else:
+                return SimpleResponse(success=False, message=f"Error: {app_name_or_path} is not installed.")
+            return SimpleResponse(message=f"Opened {app_name_or_path}")
+
+    def automation_bring_to_front(self, window_id: str):
+        with self._lock:
+            if window_id in self.windows:
+                self.foreground = self.windows[window_id]
+            return SimpleResponse()
+
+    def screenshot_take(self):
+        return ScreenshotResponse(success=True, image_base64=self.screenshot_base64)
+
+    def screenshot_find_ui_element(self, user_element_description: str, *args, **kwargs):
+        with self._lock:
+            if not self._target_exists(user_element_description.lower()):
+                return ScreenGrasp2Response(success=False, message="Element not found")
+            # A fixed point per description
+            digest = zlib.crc32(user_element_description.lower().encode("utf-8"))
+            x, y = 100 + digest % (SCREEN_SIZE[0] - 200), 100 + (digest >> 12) % (SCREEN_SIZE[1] - 200)
+            self._click_targets[(x, y)] = user_element_description
+            return ScreenGrasp2Response(success=True, message="found", x=x, y=y)
+
+    def _target_exists(self, description: str) -> bool:
+        if self.foreground == "chrome" and (self.page or "").startswith("gmail:search") and "email" in description:
+            position = next((i + 1 for i, word in enumerate(ORDINALS) if f"the {word} " in description), None)
+            return bool(position and position <= self.order_emails)
+        return True
+
+    def mouse_click(self, x: int, y: int):
+        description = self._click_targets.get((x, y))
+        if description is None:
+            return ActionResponse(success=True, message="clicked (nothing there)")
+        return self.mouse_click_by_description(description)
+
+    def keyboard_type(self, text: str):
+        with self._lock:
+            if self.foreground == "calculator":
+                self.calculator_input += text
+                self.calculator_display = re.split(r"[+\-*/]", self.calculator_input)[-1] or "0"
+            else:
+                self.typed_text += text
+            return ActionResponse(success=True, message="typed")
+
+    def keyboard_press(self, key: str):
+        with self._lock:
+            if self.foreground == "chrome" and key == "Enter" and self.typed_text:
+                self._open_page(f"gmail:search:{self.typed_text}")
+                self.typed_text = ""
+            elif self.foreground == "chrome" and key == "Ctrl+W" and self.tabs:
+                self.tabs.pop(self.active_tab)
+                self.active_tab = max(0, min(self.active_tab, len(self.tabs) - 1))
+            elif self.foreground == "chrome" and re.fullmatch(r"Ctrl\+[1-9]", key):
+                number = int(key[-1])
+                self.active_tab = len(self.tabs) - 1 if number == 9 else min(number, len(self.tabs)) - 1
+            return ActionResponse(success=True, message="pressed")
+
+    def mouse_click_by_description(self, user_element_description: str, *args, **kwargs):
+        with self._lock:
+            description = user_element_description.lower()
+            if self.foreground == "calculator" and "equals" in description:
+                match = re.fullmatch(r"(\d+)([+\-*/])(\d+)", self.calculator_input)
+                if match:
+                    a, operator, b = int(match.group(1)), match.group(2), int(match.group(3))
+                    result = {"+": a + b, "-": a - b, "*": a * b, "/": a / b if b else 0}[operator]
+                    self.calculator_display = str(result)
+                self.calculator_input = ""
+                return ActionResponse(success=True, message="clicked")
+            if self.foreground == "chrome" and (self.page or "").startswith("gmail:search") and "email" in description:
+                if not self._target_exists(description):
+                    return ActionResponse(success=False, message="Element not found")
+                position = next(i + 1 for i, word in enumerate(ORDINALS) if f"the {word} " in description)
+                self._open_page(f"gmail:email:{position}")
+                return ActionResponse(success=True, message="clicked")
+            return ActionResponse(success=True, message="clicked")
+
+    def chrome_open_chrome(self, url: Optional[str] = None, strategy=None):
+        with self._lock:
+            self.tabs = [[url or "about:blank"]]
+            self.active_tab = 0
+            self._show("chrome")
+            return SimpleResponse(message="Chrome opened")
+
+    def chrome_navigate(self, url: str):
+        with self._lock:
+            self._open_page(url)
+            return ActionResponse(success=True, message=f"Navigated to {url}")
+
+    def chrome_new_tab(self, url: Optional[str] = None):
+        with self._lock:
+            self.tabs.append([url or "about:blank"])
+            self.active_tab = len(self.tabs) - 1
+            return ActionResponse(success=True, message="New tab opened")
+
+    def chrome_go_back(self):
+        with self._lock:
+            if self.tabs and len(self.tabs[self.active_tab]) > 1:
+                self.tabs[self.active_tab].pop()
+            return ActionResponse(success=True, message="Went back")
+
+    def chrome_get_text(self):
+        with self._lock:
+            return ActionResponse(success=True, message="ok", result_value=self.page_text())
+
+    def automation_set_value(self, element_id: str, value: str):
+        with self._lock:
+            if element_id not in self.ERP_FIELDS:
+                return SimpleResponse(success=False, message=f"Element {element_id} not found")
+            self.erp_values[element_id] = value
+            return SimpleResponse()
+
+    def automation_invoke(self, element_id: str):
+        with self._lock:
+            if element_id == "erp-add":
+                self.erp_items.append(" | ".join(self.erp_values.get(i, "") for i in list(self.ERP_FIELDS)[1:]))
+            elif element_id == "erp-save":
+                self.orders_saved += 1
+                self.erp_items, self.erp_values = [], {}
+            else:
+                return SimpleResponse(success=False, message=f"Element {element_id} not found")
+            return SimpleResponse()
+
+
+class _FakeApi:
+    """One API category of the fake client; calls go to FakeDesktop.<category>_<method>."""
+    def __init__(self, client: 'FakeSmoothOperatorClient', category: str):
+        self._client = client
+        self._category = category
+
+    def __getattr__(self, method_name: str):
+        handler = getattr(self._client.desktop, f"{self._category}_{method_name}", None)
+        call_name = f"{self._category}.{method_name}"
+
+        def call(*args, **kwargs):
+            self._client.latency.wait(call_name)
+            if handler is None:
+                return ActionResponse(success=True, message=f"{call_name} (no-op in the fake)")
+            return handler(*args, **kwargs)
+        return call
+
+
+class FakeSmoothOperatorClient:
+    """Drop-in replacement for SmoothOperatorClient that works on a FakeDesktop."""
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, desktop: Optional[FakeDesktop] = None,
+                 latencies: Optional[Dict[str, LatencyModel]] = None, recorder: Optional[CallRecorder] = None,
+                 latency_scale: float = 1.0, seed: int = 0):
+        self.desktop = desktop or FakeDesktop()
+        self.latency = _Latency(latencies or DEFAULT_LATENCIES, recorder, latency_scale, seed)
+        for category in ("screenshot", "system", "mouse", "keyboard", "chrome", "automation", "code"):
+            setattr(self, category, _FakeApi(self, category))
+
+    def start_server(self) -> None:
+        self.latency.wait("server.start")
+
+    def stop_server(self) -> None:
+        pass
+
+
+class FakeApiError(Exception):
+    """An error response of the OpenAI API, with the attributes the LlmScheduler looks at."""
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+        headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+        self.response = SimpleNamespace(headers=headers)
+
+
+class FakeOpenAI:
+    """
+    Stand-in for the OpenAI client: `chat.completions.create(**kwargs)` with canned answers.
+
+    The first requests raise `errors` (e.g. FakeApiError(429)), one each. The keyword arguments of
+    every request are kept in `requests`, in the order the requests were made.
+    """
+    def __init__(self, latencies: Optional[Dict[str, LatencyModel]] = None, recorder: Optional[CallRecorder] = None,
+                 latency_scale: float = 1.0, seed: int = 1, errors: Optional[List[Exception]] = None):
+        self.latency = _Latency(latencies or DEFAULT_LATENCIES, recorder, latency_scale, seed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.errors = list(errors or [])
+        self.requests: List[Dict] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _prompt(messages) -> Tuple[str, bool]:
+        texts, has_image = [], False
+        for message in messages:
+            content = message.get("content")
+            if isinstance(content, str):
+                texts.append(content)
+                continue
+            for part in content or []:
+                if part.get("type") == "text":
+                    texts.append(part.get("text", ""))
+                elif part.get("type") == "image_url":
+                    has_image = True
+        return "\n".join(texts), has_image
+
+    @staticmethod
+    def answer(prompt: str) -> str:
+        if "Extract the order details" in prompt and "Email text:" in prompt and "Product Name" not in prompt:
+            # The text doesn't contain the order (e.g. it is an image in the email)
+            return json.dumps({"customerName": "", "orderedArticles": []})
+        if "Extract the order details" in prompt:
+            return json.dumps({"customerName": "Smith & Co. Ltd.", "orderedArticles": [
+                {"articleName": "High-Speed Router X200", "quantity": 5, "pricePerUnit": 120.0},
+                {"articleName": "Cat6 Ethernet Cable (10m)", "quantity": 10, "pricePerUnit": 15.0}]})
+        if "identify the element IDs" in prompt:
+            return json.dumps({"elementIdCustomerName": "erp-customer", "elementIdArticleName": "erp-article",
+                               "elementIdQuantity": "erp-quantity", "elementIdPricePerUnit": "erp-price",
+                               "elementIdAddItemButton": "erp-add", "elementIdSaveOrderButton": "erp-save"})
+        if "summaryBulletPoints" in prompt:
+            return json.dumps({"summaryBulletPoints": ["A new AI model was released.", "Benchmarks were published.",
+                                                       "People discuss the results."],
+                               "breakingNewsProbabilityInPercent": 20})
+        if "calculator" in prompt.lower():
+            return "The calculator displays 7."
+        return "{}"
+
+    def _create(self, **kwargs):
+        with self._lock:
+            self.requests.append(kwargs)
+            error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+        prompt, has_image = self._prompt(kwargs.get("messages", []))
+        content = self.answer(prompt)
+        usage = SimpleNamespace(prompt_tokens=estimate_tokens(prompt), completion_tokens=estimate_tokens(content),
+                                total_tokens=estimate_tokens(prompt) + estimate_tokens(content))
+        if kwargs.get("stream"):
+            return self._stream(self.latency.sample("openai.chat.vision" if has_image else "openai.chat"), content, usage)
+        self.latency.wait("openai.chat.vision" if has_image else "openai.chat")
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content, role="assistant"),
+                                                        finish_reason="stop")],
+                               usage=usage, model=kwargs.get("model"))
+
+
+    @staticmethod
+    def _stream(duration: float, content: str, usage):
+        """Chunks of a streamed completion: the first one after a third of the latency, the rest spread over the remainder."""
+        pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+        time.sleep(duration / 3)
+        for piece in pieces:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece), finish_reason=None)],
+                                  usage=None)
+            time.sleep(duration * 2 / 3 / len(pieces))
+        yield SimpleNamespace(choices=[], usage=usage)
+
+
+class _PingHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/tools-api/ping":
+            self.send_error(404)
+            return
+        body = b'"pong"'
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _ArtifactHandler(BaseHTTPRequestHandler):
+    """Serves FakeArtifactServer.content with an ETag and byte ranges (If-Range)."""
+    def do_GET(self):
+        server: "FakeArtifactServer" = self.server.artifact_server
+        server.requests.append(dict(self.headers))
+        content = server.content
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range", server.etag) == server.etag:
+            start = int(range_header.split("=")[1].split("-")[0])
+            if start >= len(content):
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(content) - 1}/{len(content)}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(content) - start))
+        self.send_header("ETag", server.etag)
+        self.end_headers()
+        body = content[start:]
+        if server.interruptions > 0:
+            # The connection breaks in the middle of the body
+            server.interruptions -= 1
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeArtifactServer:
+    """
+    Local HTTP server for artifact downloads (see artifact_cache.py), in a thread of this process.
+
+    The first `interruptions` responses break off after half of the body. The request headers are
+    kept in `requests`.
+
+        with FakeArtifactServer(b"MZ...", interruptions=1) as server:
+            path = await ArtifactCache(directory).fetch("file.exe", server.url)
+    """
+    def __init__(self, content: bytes, interruptions: int = 0, etag: str = '"v1"'):
+        self.content = content
+        self.interruptions = interruptions
+        self.etag = etag
+        self.requests: List[Dict[str, str]] = []
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _ArtifactHandler)
+        self._server.artifact_server = self
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/artifact.exe"
+
+    def __enter__(self) -> "FakeArtifactServer":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def serve_fake_agent_server(port_file: str, startup_delay: float = 0.0) -> None:
+    """Answer the ping of the agent server on a free local port, written to `port_file` once it is ready."""
+    # Stands in for the installation check and start-up of the real server
+    time.sleep(startup_delay)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _PingHandler)
+    with open(f"{port_file}.tmp", "w") as f:
+        f.write(str(server.server_port))
+    os.replace(f"{port_file}.tmp", port_file)
+    server.serve_forever()
+
+
+def launch_fake_agent_server(startup_delay: float = 0.0) -> Tuple[subprocess.Popen, str]:
+    """Launcher for server_lifecycle.ServerManager: runs serve_fake_agent_server() in a process of its own."""
+    from server_lifecycle import detached_process_options
+
+    port_file = os.path.join(tempfile.gettempdir(), f"fake-agent-port-{uuid.uuid4().hex[:8]}.txt")
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve", port_file, str(startup_delay)],
+                               cwd=os.path.dirname(os.path.abspath(__file__)), **detached_process_options())
+    return process, port_file
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "serve":
+        serve_fake_agent_server(sys.argv[2], float(sys.argv[3]) if len(sys.argv) > 3 else 0.0)
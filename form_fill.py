@@ -0,0 +1,217 @@
+"""
+Batched form filling: all operations of a form (e.g. a whole order) in one go, verified once.
+
+Entering an order field by field, with a wait for the window to change after every click, costs a
+round trip or more per field. fill_form() takes the operations of the whole form, runs them back
+to back and then reads the window once to check that the form holds what was entered. Only then
+is the submit operation (e.g. "Save Order") run.
+
+    operations = [FormOperation("customer-id", SET_VALUE, "Smith & Co."),
+                  FormOperation("article-id", SET_VALUE, "Router", item="article 1"),
+                  FormOperation("add-id", INVOKE, item="article 1")]
+    result = await fill_form(ops, window_id, operations, submit=FormOperation("save-id", INVOKE),
+                             expected_values={"customer-id": "Smith & Co."}, expected_texts={"article 1": "Router"})
+    print(result.report())
+
+Operations can belong to an item (e.g. an order line). If one of them fails, the rest of that
+item is skipped, so a half-filled line is never added, and the failure is reported for the item.
+
+When the operations arrive over time (e.g. order lines parsed from a streamed completion), a
+FormFiller runs them as they come and verifies and submits once at the end:
+
+    filler = FormFiller(ops, window_id)
+    await filler.run([FormOperation("customer-id", SET_VALUE, "Smith & Co.")])
+    ...
+    result = await filler.finish(submit=FormOperation("save-id", INVOKE), expected_values=...)
+"""
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from tracing import span
+from ui_tree import control_texts, find_control_by_id, get_field, window_root
+
+SET_VALUE = "set_value"
+INVOKE = "invoke"
+
+
+class FormOperation:
+    """One step of filling a form: set the value of an element or invoke it (e.g. click a button)."""
+    def __init__(self, element_id: str, action: str, value: Optional[str] = None, item: Optional[str] = None):
+        if action not in (SET_VALUE, INVOKE):
+            raise ValueError(f"Unknown form operation '{action}'")
+        self.element_id = element_id
+        self.action = action
+        self.value = value
+        self.item = item
+
+    def __str__(self) -> str:
+        target = f"{self.action} {self.element_id}" + (f" = '{self.value}'" if self.action == SET_VALUE else "")
+        return f"{self.item}: {target}" if self.item else target
+
+
+class FormFillError(Exception):
+    """The form could not be filled or didn't pass verification; it was not submitted."""
+    def __init__(self, result: 'FormFillResult'):
+        super().__init__(result.report())
+        self.result = result
+
+
+class FormFillResult:
+    """Outcome of fill_form(): failed operations, verification problems, whether it was submitted."""
+    def __init__(self):
+        self.operations_run = 0
+        self.failures: List[Tuple[FormOperation, str]] = []
+        self.skipped: List[FormOperation] = []
+        self.verification_problems: List[str] = []
+        self.submitted = False
+        self.elapsed = 0.0
+        # Window details read for the verification, i.e. the filled form before it was submitted
+        self.window_details: Any = None
+
+    @property
+    def success(self) -> bool:
+        return not self.failures and not self.verification_problems and self.submitted
+
+    @property
+    def failed_items(self) -> List[str]:
+        items = []
+        for operation, _ in self.failures:
+            if operation.item and operation.item not in items:
+                items.append(operation.item)
+        return items
+
+    def report(self) -> str:
+        state = "submitted" if self.submitted else "not submitted"
+        lines = [f"Form {state}: {self.operations_run} operations in {self.elapsed:.2f}s, "
+                 f"{len(self.failures)} failed, {len(self.skipped)} skipped"]
+        lines += [f"  failed: {operation} ({message})" for operation, message in self.failures]
+        lines += [f"  verification: {problem}" for problem in self.verification_problems]
+        return "\n".join(lines)
+
+
+async def _run(ops, operation: FormOperation) -> Optional[str]:
+    """Run one operation; returns an error message or None."""
+    try:
+        if operation.action == SET_VALUE:
+            response = await ops.automation.set_value(operation.element_id, operation.value)
+        else:
+            response = await ops.automation.invoke(operation.element_id)
+    except Exception as ex:
+        return f"{ex.__class__.__name__}: {ex}"
+    if response is None:
+        return "no response"
+    if getattr(response, "success", True) is False:
+        return getattr(response, "message", None) or "failed"
+    return None
+
+
+async def run_operations(ops, operations: List[FormOperation], result: Optional[FormFillResult] = None) -> FormFillResult:
+    """Run the operations back to back; after a failure, the rest of the same item is skipped."""
+    result = result or FormFillResult()
+    failed_items = set(result.failed_items)
+    for operation in operations:
+        if operation.item is not None and operation.item in failed_items:
+            result.skipped.append(operation)
+            continue
+        error = await _run(ops, operation)
+        result.operations_run += 1
+        if error:
+            result.failures.append((operation, error))
+            if operation.item is not None:
+                failed_items.add(operation.item)
+    return result
+
+
+def verify_form(details: Any, expected_values: Optional[Dict[str, str]] = None,
+                expected_texts: Optional[Dict[str, str]] = None) -> List[str]:
+    """
+    Compare the window details of a form with what was entered.
+
+    Args:
+        details: The window details (system.get_window_details()), or None if they couldn't be read.
+        expected_values: Element ID -> value the element must hold (checked if the element exposes its value).
+        expected_texts: Label (e.g. the item) -> text that must be shown somewhere in the window.
+
+    Returns:
+        The problems found (empty if the form is as expected).
+    """
+    if details is None:
+        return ["could not read the window"]
+    root = window_root(details)
+    problems = []
+    for element_id, expected in (expected_values or {}).items():
+        control = find_control_by_id(root, element_id)
+        if control is None:
+            problems.append(f"element {element_id} not found")
+            continue
+        actual = get_field(control, "current_value")
+        if actual is not None and str(actual).strip() != str(expected).strip():
+            problems.append(f"element {element_id} holds '{actual}' instead of '{expected}'")
+    if expected_texts:
+        window_text = "\n".join(control_texts(root)).lower()
+        problems += [f"{label}: '{text}' not shown in the window" for label, text in expected_texts.items()
+                     if text.lower() not in window_text]
+    return problems
+
+
+class FormFiller:
+    """Fills a form with operations that arrive over time; verified and submitted once by finish()."""
+    def __init__(self, ops, window_id: str):
+        self.ops = ops
+        self.window_id = window_id
+        self.result = FormFillResult()
+        self.first_operation_at: Optional[float] = None
+        self._start_time = time.perf_counter()
+
+    async def run(self, operations: List[FormOperation]) -> None:
+        """Run the next operations now (the rest of an item that failed before is skipped)."""
+        if self.first_operation_at is None and operations:
+            self.first_operation_at = time.perf_counter()
+        with span("fill form", operations=len(operations)):
+            await run_operations(self.ops, operations, self.result)
+
+    async def finish(self, submit: Optional[FormOperation] = None, expected_values: Optional[Dict[str, str]] = None,
+                     expected_texts: Optional[Dict[str, str]] = None, problems: Optional[List[str]] = None) -> FormFillResult:
+        """
+        Verify the form with one read and submit it if everything is right.
+
+        Args:
+            submit: Operation that submits the form; only run if no operation failed and the verification passed.
+            expected_values, expected_texts: See verify_form().
+            problems: Problems found by the caller (e.g. the final validation of the data); they prevent the submit.
+        """
+        result = self.result
+        result.verification_problems = list(problems or [])
+        with span("submit form") as current:
+            if not result.failures and not result.verification_problems and (expected_values or expected_texts):
+                with span("verify form"):
+                    result.window_details = await self.ops.system.get_window_details(self.window_id)
+                    result.verification_problems = verify_form(result.window_details, expected_values, expected_texts)
+            if submit and not result.failures and not result.verification_problems:
+                error = await _run(self.ops, submit)
+                result.operations_run += 1
+                if error:
+                    result.failures.append((submit, error))
+                else:
+                    result.submitted = True
+            current.set(failures=len(result.failures), submitted=result.submitted)
+        result.elapsed = time.perf_counter() - self._start_time
+        return result
+
+
+async def fill_form(ops, window_id: str, operations: List[FormOperation], submit: Optional[FormOperation] = None,
+                    expected_values: Optional[Dict[str, str]] = None,
+                    expected_texts: Optional[Dict[str, str]] = None) -> FormFillResult:
+    """
+    Run all operations back to back, verify the form with one read and submit it if everything is right.
+
+    Args:
+        ops: The awaitable client facade.
+        window_id: Window of the form (read for the verification).
+        operations: The operations, in order.
+        submit: Operation that submits the form; only run if no operation failed and the verification passed.
+        expected_values, expected_texts: See verify_form().
+    """
+    filler = FormFiller(ops, window_id)
+    await filler.run(operations)
+    return await filler.finish(submit, expected_values, expected_texts)
@@ -0,0 +1,119 @@
+"""
+Incremental JSON parser for streamed completions: values are emitted as soon as they are complete.
+
+A streamed JSON answer arrives in small pieces. Instead of waiting for the whole document,
+feed() every piece and get back the values that were completed by it, with their path:
+
+    parser = IncrementalJsonParser()
+    for piece in ['{"customerName": "Smith', ' & Co.", "orderedArticles": [{"articleName": "Router", ',
+                  '"quantity": 5, "pricePerUnit": 120.0}, {"articleName": ...']:
+        for path, value in parser.feed(piece):
+            print(path, value)
+    # ('customerName',) Smith & Co.
+    # ('orderedArticles', 0) {'articleName': 'Router', 'quantity': 5, 'pricePerUnit': 120.0}
+    # ...
+    document = parser.finish()   # The whole document; raises ValueError if it is incomplete or invalid
+
+Only values up to `max_depth` levels below the root are emitted (2 by default: the members of the
+root object and the elements of its arrays). The parser only tracks nesting, strings and value
+boundaries; each emitted value is decoded with json.loads(), so it is exactly what json.loads()
+would return for the whole document.
+"""
+import json
+from typing import Any, List, Optional, Tuple, Union
+
+PathPart = Union[str, int]
+
+_WHITESPACE = " \t\r\n"
+
+
+class _Container:
+    def __init__(self, is_object: bool, start: int):
+        self.is_object = is_object
+        self.start = start
+        self.key: Optional[str] = None
+        self.index = 0
+        self.expecting_key = is_object
+
+    @property
+    def path_part(self) -> PathPart:
+        return self.key if self.is_object else self.index
+
+
+class IncrementalJsonParser:
+    """Feeds pieces of a JSON document and returns the (path, value) pairs completed by each piece."""
+    def __init__(self, max_depth: int = 2):
+        self.max_depth = max_depth
+        self.text = ""
+        self._position = 0
+        self._stack: List[_Container] = []
+        self._string_start: Optional[int] = None
+        self._escaped = False
+        self._scalar_start: Optional[int] = None
+        self._root_done = False
+
+    def _path(self) -> Tuple[PathPart, ...]:
+        return tuple(container.path_part for container in self._stack)
+
+    def _complete(self, start: int, end: int, events: List[Tuple[Tuple[PathPart, ...], Any]]) -> None:
+        path = self._path()
+        if 1 <= len(path) <= self.max_depth:
+            events.append((path, json.loads(self.text[start:end])))
+
+    def _end_scalar(self, end: int, events: List[Tuple[Tuple[PathPart, ...], Any]]) -> None:
+        if self._scalar_start is not None:
+            start, self._scalar_start = self._scalar_start, None
+            self._complete(start, end, events)
+
+    def feed(self, piece: str) -> List[Tuple[Tuple[PathPart, ...], Any]]:
+        """Add the next piece of the document. Returns the values it completed, innermost first."""
+        self.text += piece
+        events: List[Tuple[Tuple[PathPart, ...], Any]] = []
+        text = self.text
+        for position in range(self._position, len(text)):
+            char = text[position]
+            if self._string_start is not None:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    start, self._string_start = self._string_start, None
+                    top = self._stack[-1] if self._stack else None
+                    if top is not None and top.is_object and top.expecting_key:
+                        top.key = json.loads(text[start:position + 1])
+                    else:
+                        self._complete(start, position + 1, events)
+                continue
+            if self._root_done or (not self._stack and char not in "{["):
+                # Text around the root value (e.g. whitespace) is ignored
+                continue
+            if char in _WHITESPACE:
+                self._end_scalar(position, events)
+            elif char in "{[":
+                self._stack.append(_Container(char == "{", position))
+            elif char in "}]":
+                self._end_scalar(position, events)
+                container = self._stack.pop()
+                if self._stack:
+                    self._complete(container.start, position + 1, events)
+                else:
+                    self._root_done = True
+            elif char == ",":
+                self._end_scalar(position, events)
+                if self._stack[-1].is_object:
+                    self._stack[-1].expecting_key = True
+                else:
+                    self._stack[-1].index += 1
+            elif char == ":":
+                self._stack[-1].expecting_key = False
+            elif char == '"':
+                self._string_start = position
+            elif self._scalar_start is None:
+                self._scalar_start = position
+        self._position = len(text)
+        return events
+
+    def finish(self) -> Any:
+        """The complete document. Raises ValueError (json.JSONDecodeError) if it is incomplete or invalid."""
+        return json.loads(self.text)
@@ -0,0 +1,195 @@
+"""
+Disk cache for OpenAI chat completions, so repeated runs don't wait for the same answers again.
+
+While developing, the flows send the same requests over and over: the same email screenshot to
+extract the order from, the same ERP automation tree, the same tweets. The cache key is a SHA-256
+of the whole request (model, messages including the base64 image data, response_format and the
+other parameters), so any change of the prompt, the image or the model is a miss.
+
+Entries expire after `ttl` seconds, and the least recently used ones are evicted when the cache
+grows beyond `max_entries` or `max_bytes`. In offline mode a miss raises LlmCacheMiss instead of
+sending the request, e.g. to make sure a rerun doesn't use the API at all.
+
+The shared LlmScheduler uses the cache if it is enabled in the environment:
+    LLM_CACHE=1              enable the cache
+    LLM_CACHE_OFFLINE=1      enable it in offline mode
+    LLM_CACHE_PATH           SQLite file (default: "smooth-operator-llm-cache.sqlite3" in the temp directory)
+    LLM_CACHE_TTL            seconds until an entry expires (default: 7 days)
+    LLM_CACHE_MAX_MB         size limit in MB (default: 200)
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Optional
+
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 10000
+
+# Request options that don't change the answer
+_IGNORED_OPTIONS = ("timeout", "extra_headers", "extra_query", "extra_body", "user")
+
+
+class LlmCacheMiss(Exception):
+    """Raised in offline mode when a request is not in the cache."""
+
+
+def request_key(kwargs: Dict[str, Any]) -> str:
+    """SHA-256 of a chat completion request (model, messages with images, response_format, ...)."""
+    request = {name: value for name, value in kwargs.items() if name not in _IGNORED_OPTIONS}
+    canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def completion_to_data(value: Any) -> Any:
+    """Convert a completion (OpenAI model or plain objects) into JSON-compatible data."""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    if isinstance(value, SimpleNamespace):
+        return {name: completion_to_data(item) for name, item in vars(value).items()}
+    if isinstance(value, dict):
+        return {name: completion_to_data(item) for name, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [completion_to_data(item) for item in value]
+    return value
+
+
+def _to_namespace(data: Any) -> Any:
+    if isinstance(data, dict):
+        return SimpleNamespace(**{name: _to_namespace(item) for name, item in data.items()})
+    if isinstance(data, list):
+        return [_to_namespace(item) for item in data]
+    return data
+
+
+def completion_from_data(data: Dict[str, Any]) -> Any:
+    """Turn cached data back into a ChatCompletion (or an object with the same attributes)."""
+    try:
+        from openai.types.chat import ChatCompletion
+        return ChatCompletion.model_validate(data)
+    except Exception:
+        # No openai package, or a completion of another client (e.g. a fake)
+        return _to_namespace(data)
+
+
+class LlmCache:
+    """SQLite cache of chat completions with TTL, LRU size limits and hit statistics."""
+    def __init__(self, path: Optional[str] = None, ttl: float = DEFAULT_TTL, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, offline: bool = False):
+        """
+        Args:
+            path: SQLite file (default: "smooth-operator-llm-cache.sqlite3" in the temp directory).
+            ttl: Seconds until an entry expires.
+            max_bytes: Total size of the cached responses; least recently used entries are evicted beyond it.
+            max_entries: Maximum number of entries.
+            offline: Raise LlmCacheMiss on a miss instead of letting the request through.
+        """
+        self.path = path or os.path.join(tempfile.gettempdir(), "smooth-operator-llm-cache.sqlite3")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expired = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_by_last_used ON responses (last_used);
+        """)
+
+    @classmethod
+    def from_env(cls) -> Optional['LlmCache']:
+        """The cache configured by LLM_CACHE* environment variables, or None if it is not enabled."""
+        offline = os.getenv("LLM_CACHE_OFFLINE", "").lower() in ("1", "true", "yes")
+        if not offline and os.getenv("LLM_CACHE", "").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(path=os.getenv("LLM_CACHE_PATH") or None,
+                   ttl=float(os.getenv("LLM_CACHE_TTL") or DEFAULT_TTL),
+                   max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB") or DEFAULT_MAX_BYTES / 1024 / 1024) * 1024 * 1024),
+                   offline=offline)
+
+    def get(self, kwargs: Dict[str, Any]) -> Optional[Any]:
+        """
+        Return the cached completion of a request, or None on a miss.
+
+        Raises:
+            LlmCacheMiss: On a miss in offline mode.
+        """
+        key = request_key(kwargs)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] > self.ttl:
+                with self._connection:
+                    self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.expired += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                if self.offline:
+                    raise LlmCacheMiss(f"Request for {kwargs.get('model')} not in the LLM cache ({key[:12]}...) "
+                                       f"and offline mode is on")
+                return None
+            with self._connection:
+                self._connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return completion_from_data(json.loads(row[0]))
+
+    def put(self, kwargs: Dict[str, Any], completion: Any) -> None:
+        """Store the completion of a request and evict entries beyond the size limits."""
+        response = json.dumps(completion_to_data(completion))
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (request_key(kwargs), kwargs.get("model"), response, len(response), now, now))
+            self.stores += 1
+            self._evict()
+
+    def _evict(self) -> None:
+        count, total_size = self._connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total_size <= self.max_bytes:
+            return
+        # Oldest first, until both limits are met again
+        evicted = []
+        for key, size in self._connection.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if count <= self.max_entries and total_size <= self.max_bytes:
+                break
+            evicted.append((key,))
+            count -= 1
+            total_size -= size
+        self._connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        self.evictions += len(evicted)
+
+    def clear(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM responses")
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> str:
+        return (f"{self.hits} hits, {self.misses} misses ({self.hit_rate:.0%} hit rate), {self.stores} stored, "
+                f"{self.evictions} evicted, {self.expired} expired")
+
+    def close(self) -> None:
+        self._connection.close()
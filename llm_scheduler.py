@@ -0,0 +1,355 @@
+"""
+Shared scheduler for OpenAI chat completions.
+
+Instead of every call site creating its own OpenAI client and firing requests one by one,
+all requests go through one LlmScheduler:
+- one pooled OpenAI client, so HTTP connections are kept alive and reused;
+- a limit on concurrent requests;
+- token buckets for requests per minute and tokens per minute, so bursts (e.g. a batch of
+  orders) stay below the account's rate limits instead of running into 429s;
+- retries with jittered exponential backoff on 429, 5xx and connection errors (honoring
+  Retry-After);
+- priority lanes: interactive steps (e.g. reading the calculator result) are started before
+  queued batch work.
+
+The base URL can be pointed to any OpenAI-compatible server, e.g. a local stub for testing
+(or set OPENAI_BASE_URL).
+
+Every request is recorded as an "openai.chat" tracing span (see tracing.py) with the model,
+the token usage reported by the API, the retries and the payload sizes.
+
+With an LlmCache (see llm_cache.py, enabled for the shared schedulers by LLM_CACHE=1), repeated
+requests are answered from disk without a round trip.
+
+chat_stream() streams the answer instead, so it can be processed while it is generated (e.g. with
+incremental_json.py). It shares the limits and retries (before the first piece) but not the cache.
+"""
+import asyncio
+import functools
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from llm_cache import LlmCache
+from session_recording import active_session, is_replaying, session_openai
+from token_estimate import estimate_tokens
+from tracing import span
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+# Rough token cost of an image in a vision request and default size of a completion
+IMAGE_TOKENS = 850
+DEFAULT_COMPLETION_TOKENS = 500
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate_per_minute`."""
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_second = rate_per_minute / 60
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_second)
+        self.updated_at = now
+
+    async def acquire(self, amount: float = 1) -> float:
+        """Take `amount` tokens, waiting until they are available. Returns the time waited."""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        self._refill()
+        while self.tokens < amount:
+            delay = (amount - self.tokens) / self.rate_per_second
+            await asyncio.sleep(delay)
+            waited += delay
+            self._refill()
+        self.tokens -= amount
+        return waited
+
+
+class _PrioritySlots:
+    """Like a semaphore, but waiters with a lower priority number are released first."""
+    def __init__(self, slots: int):
+        self.free = slots
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+    async def acquire(self, priority: int) -> None:
+        if self.free > 0:
+            self.free -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.free += 1
+
+
+def _is_retryable(ex: Exception) -> bool:
+    status_code = getattr(ex, "status_code", None)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    # Connection errors and timeouts have no status code
+    return type(ex).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def _retry_after(ex: Exception) -> Optional[float]:
+    response = getattr(ex, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def estimate_request_tokens(kwargs: Dict[str, Any]) -> int:
+    """Estimate the tokens a chat completion request will use (prompt plus completion)."""
+    tokens = 0
+    for message in kwargs.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            tokens += estimate_tokens(content)
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                tokens += estimate_tokens(part.get("text", ""))
+            elif part.get("type") == "image_url":
+                tokens += IMAGE_TOKENS
+    return tokens + (kwargs.get("max_tokens") or kwargs.get("max_completion_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+
+def _request_size(kwargs: Dict[str, Any]) -> int:
+    """Characters of the message contents (including base64 images) of a request."""
+    size = 0
+    for message in kwargs.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            size += len(content)
+            continue
+        for part in content or []:
+            size += len(part.get("text", "")) + len((part.get("image_url") or {}).get("url", ""))
+    return size
+
+
+def _usage_attributes(completion: Any) -> Dict[str, Any]:
+    """Token usage and response size of a completion, as span attributes."""
+    attributes: Dict[str, Any] = {}
+    usage = getattr(completion, "usage", None)
+    if usage is not None:
+        attributes["prompt_tokens"] = getattr(usage, "prompt_tokens", None) or 0
+        attributes["completion_tokens"] = getattr(usage, "completion_tokens", None) or 0
+        attributes["total_tokens"] = getattr(usage, "total_tokens", None) or 0
+    try:
+        attributes["response_bytes"] = len(completion.choices[0].message.content or "")
+    except (AttributeError, IndexError, TypeError):
+        pass
+    return attributes
+
+
+class LlmScheduler:
+    """Runs OpenAI chat completions with pooling, concurrency and rate limits, retries and priorities."""
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, openai_client=None,
+                 max_concurrency: int = 4, requests_per_minute: float = 500, tokens_per_minute: float = 30000,
+                 max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 30.0, timeout: float = 120.0,
+                 cache: Optional[LlmCache] = None):
+        """
+        Args:
+            api_key: OpenAI API key (used if openai_client is not given).
+            base_url: Alternative API base URL, e.g. of a local stub server.
+            openai_client: Use this client instead of creating a pooled one.
+            max_concurrency: Maximum number of requests in flight.
+            requests_per_minute: Request rate limit.
+            tokens_per_minute: Token rate limit (estimated locally, see estimate_request_tokens()).
+            max_retries: Retries on 429, 5xx and connection errors.
+            base_delay: First retry delay in seconds (doubled on each retry, with jitter).
+            max_delay: Upper bound for a retry delay.
+            timeout: Request timeout in seconds.
+            cache: Answer repeated requests from this cache (and store new answers in it).
+        """
+        if openai_client is None and not is_replaying():
+            from openai import OpenAI
+            # One client (and keep-alive connection pool) for all requests; retries are handled
+            # here instead of in the client
+            client_options = {"api_key": api_key, "base_url": base_url, "max_retries": 0, "timeout": timeout}
+            try:
+                import httpx
+                client_options["http_client"] = httpx.Client(
+                    timeout=timeout, limits=httpx.Limits(max_connections=max_concurrency,
+                                                         max_keepalive_connections=max_concurrency))
+            except ImportError:
+                pass  # The OpenAI client's default connection pool is used
+            openai_client = OpenAI(**client_options)
+        # Recorded or replayed if a session is active (see session_recording.py)
+        self.client = session_openai(openai_client)
+        self.cache = cache
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._slots = _PrioritySlots(max_concurrency)
+        self._request_bucket = TokenBucket(requests_per_minute)
+        self._token_bucket = TokenBucket(tokens_per_minute)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.rate_limit_wait = 0.0
+
+    async def chat(self, priority: int = PRIORITY_INTERACTIVE, **kwargs) -> Any:
+        """
+        Awaitable `chat.completions.create(**kwargs)`.
+
+        Args:
+            priority: PRIORITY_INTERACTIVE or PRIORITY_BATCH (lower numbers are started first).
+        """
+        estimated_tokens = estimate_request_tokens(kwargs)
+        with span("openai.chat", model=kwargs.get("model"), priority=priority,
+                  estimated_tokens=estimated_tokens, request_bytes=_request_size(kwargs)) as current:
+            # A streamed response is consumed while it arrives and can't be cached
+            cache = self.cache if not kwargs.get("stream") else None
+            if cache is not None:
+                # Raises LlmCacheMiss on a miss in offline mode
+                completion = cache.get(kwargs)
+                current.set(cache="hit" if completion is not None else "miss")
+                if completion is not None:
+                    return completion
+            await self._slots.acquire(priority)
+            try:
+                completion = await self._request(current, estimated_tokens,
+                                                 functools.partial(self.client.chat.completions.create, **kwargs))
+                current.set(**_usage_attributes(completion))
+                if cache is not None:
+                    cache.put(kwargs, completion)
+                return completion
+            finally:
+                self._slots.release()
+
+    async def _request(self, current: Any, estimated_tokens: int, create: Callable[[], Any]) -> Any:
+        """Run `create` on the thread pool within the rate limits, retrying 429, 5xx and connection errors."""
+        attempt = 0
+        while True:
+            self.rate_limit_wait += await self._request_bucket.acquire(1)
+            self.rate_limit_wait += await self._token_bucket.acquire(estimated_tokens)
+            self.requests += 1
+            try:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(self._executor, create)
+                current.set(retries=attempt)
+                return result
+            except Exception as ex:
+                if not _is_retryable(ex) or attempt >= self.max_retries:
+                    self.failures += 1
+                    current.set(retries=attempt)
+                    raise
+                delay = _retry_after(ex)
+                if delay is None:
+                    # Exponential backoff with full jitter
+                    delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                attempt += 1
+                self.retries += 1
+                print(f"OpenAI request failed ({ex.__class__.__name__}), retry {attempt}/{self.max_retries} in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+
+    async def chat_stream(self, priority: int = PRIORITY_INTERACTIVE, **kwargs) -> AsyncIterator[str]:
+        """
+        Streamed `chat.completions.create(stream=True, **kwargs)`: yields the pieces of the answer as they arrive.
+
+        Errors before the first piece are retried like in chat(); the cache is not used. While a
+        session is recorded or replayed (see session_recording.py), the answer is requested with
+        chat() and yielded as one piece.
+        """
+        pieces: asyncio.Queue = asyncio.Queue()
+        # The request runs in a task of its own, so its span doesn't stay open in the caller's context between pieces
+        producer = asyncio.create_task(self._stream(pieces, priority, kwargs))
+        try:
+            while (piece := await pieces.get()) is not None:
+                yield piece
+            await producer  # Raises the error of the request, if any
+        finally:
+            producer.cancel()
+
+    async def _stream(self, pieces: asyncio.Queue, priority: int, kwargs: Dict[str, Any]) -> None:
+        try:
+            if active_session() is not None:
+                completion = await self.chat(priority=priority, **kwargs)
+                pieces.put_nowait(completion.choices[0].message.content or "")
+                return
+            estimated_tokens = estimate_request_tokens(kwargs)
+            with span("openai.chat", model=kwargs.get("model"), priority=priority, stream=True,
+                      estimated_tokens=estimated_tokens, request_bytes=_request_size(kwargs)) as current:
+                await self._slots.acquire(priority)
+                stop = threading.Event()
+                try:
+                    start_time = time.perf_counter()
+                    stream = await self._request(current, estimated_tokens, functools.partial(
+                        self.client.chat.completions.create, stream=True, stream_options={"include_usage": True}, **kwargs))
+                    loop = asyncio.get_running_loop()
+
+                    def read() -> Dict[str, Any]:
+                        attributes: Dict[str, Any] = {"response_bytes": 0}
+                        for chunk in stream:
+                            if stop.is_set():
+                                getattr(stream, "close", lambda: None)()
+                                break
+                            if getattr(chunk, "usage", None) is not None:
+                                attributes.update(_usage_attributes(SimpleNamespace(usage=chunk.usage, choices=[])))
+                            content = chunk.choices[0].delta.content if chunk.choices else None
+                            if content:
+                                attributes.setdefault("first_piece_ms", round((time.perf_counter() - start_time) * 1000, 3))
+                                attributes["response_bytes"] += len(content)
+                                loop.call_soon_threadsafe(pieces.put_nowait, content)
+                        return attributes
+
+                    current.set(**await loop.run_in_executor(self._executor, read))
+                finally:
+                    stop.set()
+                    self._slots.release()
+        finally:
+            # The reader thread's pieces are queued with call_soon_threadsafe(), so this one comes after them
+            asyncio.get_running_loop().call_soon(pieces.put_nowait, None)
+
+    def stats(self) -> str:
+        stats = (f"{self.requests} requests, {self.retries} retries, {self.failures} failures, "
+                 f"{self.rate_limit_wait:.1f}s waited for rate limits")
+        if self.cache is not None:
+            stats += f"; cache: {self.cache.stats()}"
+        return stats
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        if self.cache is not None:
+            self.cache.close()
+
+
+_shared_schedulers: Dict[Tuple[Optional[str], Optional[str]], LlmScheduler] = {}
+
+
+def get_shared_scheduler(api_key: Optional[str], base_url: Optional[str] = None) -> LlmScheduler:
+    """Return the process-wide scheduler for an API key, creating it on first use."""
+    key = (api_key, base_url)
+    if key not in _shared_schedulers:
+        _shared_schedulers[key] = LlmScheduler(api_key=api_key, base_url=base_url, cache=LlmCache.from_env())
+    return _shared_schedulers[key]
+
+
+def set_shared_scheduler(api_key: Optional[str], scheduler: LlmScheduler, base_url: Optional[str] = None) -> None:
+    """Use `scheduler` as the process-wide scheduler for an API key (e.g. one with a fake client in benchmarks)."""
+    _shared_schedulers[(api_key, base_url)] = scheduler
@@ -0,0 +1,263 @@
+"""
+Ledger of processed order emails, so that a rerun doesn't extract or enter the same order again.
+
+Every opened email is identified by a fingerprint of its subject, sender, date and body, read from
+the message itself and not from the rest of the captured window (message list, unread counts,
+relative times like "2 hours ago"), so a rerun recognizes it. The ledger records how far the email got:
+
+    seen -> extracted (order stored) -> entering -> entered
+    failed (any stage before "entered" went wrong; retried on the next run)
+
+The flows look an email up right after opening it, before any screenshot or LLM work:
+- "entered": skipped;
+- "extracted" (or "failed" with a stored order): the stored order is entered without a new extraction;
+- "entering": the run stopped while the order was being entered, so it may or may not have been
+  saved. It is skipped and reported, check the ERP and call `reset()` to enter it again.
+
+The extracted orders are also indexed by a hash of the normalized order (customer, articles,
+quantities, prices), so the same order arriving in two emails can be recognized. The ledger
+also records how each order was extracted (local parser, OpenAI with the email text or with the
+screenshot, see order_parser.py), so `extraction_summary()` shows how often the slow path is needed.
+
+    ledger = OrderLedger()
+    entry = ledger.seen(email_fingerprint(email_text), email_text)
+
+The ledger is a SQLite file, "smooth-operator-orders.sqlite3" in the temp directory unless
+ORDER_LEDGER_PATH is set.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+SEEN = "seen"
+EXTRACTED = "extracted"
+ENTERING = "entering"
+ENTERED = "entered"
+FAILED = "failed"
+
+_HEADER_PATTERNS = {
+    "subject": re.compile(r"^(?:Subject:\s*)?(.*order.*)$", re.IGNORECASE | re.MULTILINE),
+    "sender": re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"),
+    "date": re.compile(r"\b(?:\d{1,2}:\d{2}\s*(?:[AP]M)?|\w{3},? \w{3} \d{1,2}(?:, \d{4})?|\d{1,2}\.\d{1,2}\.\d{2,4}|"
+                       r"\d{4}-\d{2}-\d{2})", re.IGNORECASE),
+}
+
+
+# Parts of the captured text that change between captures of the same email
+_VOLATILE_PATTERN = re.compile(
+    r"\(?\b(?:\d+|an?|one)\s+(?:seconds?|minutes?|mins?|hours?|days?|weeks?|months?|years?)\s+ago\)?|\bjust now\b|"
+    r"\(\d+\)|\b\d+\s+(?:unread|new)\b|^\s*\d+\s*$", re.IGNORECASE | re.MULTILINE)
+_GREETING_PATTERN = re.compile(r"^\s*(?:dear|hi|hello|hey|good (?:morning|afternoon|evening)|greetings)\b", re.IGNORECASE)
+_SIGN_OFF_PATTERN = re.compile(r"^\s*(?:best|kind|warm)?\s*regards\b|^\s*(?:sincerely|cheers|thanks|thank you)\b",
+                               re.IGNORECASE)
+
+
+def _body_end(lines: List[str], start: int) -> int:
+    """Index after the body starting at `start`: after the sign-off and the name below it, or at the next greeting."""
+    for index in range(start + 1, len(lines)):
+        if _GREETING_PATTERN.match(lines[index]):
+            return index
+        if _SIGN_OFF_PATTERN.match(lines[index]):
+            name = next((i for i in range(index + 1, len(lines)) if lines[i].strip()), index)
+            return name + 1
+    return len(lines)
+
+
+def email_message(email_text: str) -> Tuple[str, str]:
+    """
+    The header (subject, sender, date) and the body of the opened email in a captured text.
+
+    The capture holds more than the message: the navigation with unread counts, and in Outlook the
+    message list with the previews of the other emails. The body is the longest block from a
+    greeting to the sign-off (a preview is a single line), the header the text before it from the
+    closest subject line. Relative times ("2 hours ago") and counters are removed.
+    """
+    lines = _VOLATILE_PATTERN.sub("", email_text).splitlines()
+    blocks = [(start, _body_end(lines, start)) for start, line in enumerate(lines) if _GREETING_PATTERN.match(line)]
+    if not blocks:
+        # Without a greeting, everything from the subject on
+        subject = _HEADER_PATTERNS["subject"].search("\n".join(lines))
+        text = "\n".join(lines)
+        return text, text[subject.start():] if subject else text
+    start, end = max(blocks, key=lambda block: len("".join(lines[block[0]:block[1]])))
+    # The sender's address may contain "order" as well (orders@...)
+    header_start = next((index for index in range(start - 1, -1, -1)
+                         if _HEADER_PATTERNS["subject"].match(lines[index]) and "@" not in lines[index]), 0)
+    return "\n".join(lines[header_start:start]), "\n".join(lines[start:end])
+
+
+def email_header(email_text: str) -> Dict[str, str]:
+    """Best-effort subject, sender and date of an opened email, read from its text."""
+    header_text, _ = email_message(email_text)
+    header = {}
+    for field, pattern in _HEADER_PATTERNS.items():
+        match = pattern.search(header_text)
+        header[field] = (match.group(1) if match.groups() else match.group(0)).strip() if match else ""
+    return header
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def email_fingerprint(email_text: str) -> str:
+    """SHA-256 of the subject, sender, date and body of an email (see email_message())."""
+    header = email_header(email_text)
+    _, body = email_message(email_text)
+    body_hash = hashlib.sha256(_normalize(body).encode("utf-8")).hexdigest()
+    key = "\n".join([_normalize(header["subject"]), header["sender"].lower(), _normalize(header["date"]), body_hash])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def order_hash(order: Dict[str, Any]) -> str:
+    """SHA-256 of an order (in the JSON format of the extraction), independent of case, spacing and article order."""
+    articles = sorted((_normalize(str(article.get("articleName", ""))), int(article.get("quantity", 0)),
+                       f"{float(article.get('pricePerUnit', 0.0)):.2f}")
+                      for article in order.get("orderedArticles", []))
+    normalized = {"customerName": _normalize(str(order.get("customerName", ""))), "orderedArticles": articles}
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class LedgerEntry:
+    """State of one email in the ledger."""
+    def __init__(self, fingerprint: str, stage: str, order: Optional[Dict[str, Any]], order_hash: Optional[str],
+                 error: Optional[str], attempts: int, subject: str, updated_at: float):
+        self.fingerprint = fingerprint
+        self.stage = stage
+        self.order = order
+        self.order_hash = order_hash
+        self.error = error
+        self.attempts = attempts
+        self.subject = subject
+        self.updated_at = updated_at
+
+    @property
+    def needs_extraction(self) -> bool:
+        return self.order is None and self.stage not in (ENTERING, ENTERED)
+
+    @property
+    def is_done(self) -> bool:
+        """Entered, or possibly entered by a run that stopped during the entry."""
+        return self.stage in (ENTERING, ENTERED)
+
+
+class OrderLedger:
+    """SQLite ledger of order emails and the pipeline stage they reached."""
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: SQLite file (default: ORDER_LEDGER_PATH, or "smooth-operator-orders.sqlite3" in the temp directory).
+        """
+        self.path = (path or os.getenv("ORDER_LEDGER_PATH")
+                     or os.path.join(tempfile.gettempdir(), "smooth-operator-orders.sqlite3"))
+        self._connection = sqlite3.connect(self.path)
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS emails (
+                fingerprint TEXT PRIMARY KEY,
+                subject TEXT,
+                sender TEXT,
+                date TEXT,
+                stage TEXT NOT NULL,
+                order_json TEXT,
+                order_hash TEXT,
+                extracted_by TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                first_seen REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS emails_by_order_hash ON emails (order_hash);
+            CREATE INDEX IF NOT EXISTS emails_by_stage ON emails (stage);
+        """)
+        columns = [row[1] for row in self._connection.execute("PRAGMA table_info(emails)")]
+        if "extracted_by" not in columns:
+            # Ledger written before the extraction path was recorded
+            with self._connection:
+                self._connection.execute("ALTER TABLE emails ADD COLUMN extracted_by TEXT")
+
+    def get(self, fingerprint: str) -> Optional[LedgerEntry]:
+        row = self._connection.execute(
+            "SELECT fingerprint, stage, order_json, order_hash, error, attempts, subject, updated_at "
+            "FROM emails WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        if row is None:
+            return None
+        return LedgerEntry(row[0], row[1], json.loads(row[2]) if row[2] else None, row[3], row[4], row[5], row[6], row[7])
+
+    def seen(self, fingerprint: str, email_text: str) -> LedgerEntry:
+        """Register an opened email (if it is new) and return its entry."""
+        header = email_header(email_text)
+        now = time.time()
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR IGNORE INTO emails (fingerprint, subject, sender, date, stage, first_seen, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (fingerprint, header["subject"], header["sender"], header["date"], SEEN, now, now))
+        return self.get(fingerprint)
+
+    def _update(self, fingerprint: str, stage: str, **fields) -> None:
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connection:
+            self._connection.execute(
+                f"UPDATE emails SET stage = ?, updated_at = ?{', ' if fields else ''}{assignments} WHERE fingerprint = ?",
+                (stage, time.time(), *fields.values(), fingerprint))
+
+    def extracted(self, fingerprint: str, order: Dict[str, Any], extracted_by: Optional[str] = None) -> None:
+        """
+        Store the extracted order (in the JSON format of the extraction).
+
+        Args:
+            extracted_by: How the order was extracted, e.g. order_parser.PARSER.
+        """
+        self._update(fingerprint, EXTRACTED, order_json=json.dumps(order), order_hash=order_hash(order),
+                     extracted_by=extracted_by, error=None)
+
+    def entering(self, fingerprint: str) -> None:
+        """Mark the start of the ERP entry (the order may be saved from here on)."""
+        with self._connection:
+            self._connection.execute("UPDATE emails SET attempts = attempts + 1 WHERE fingerprint = ?", (fingerprint,))
+        self._update(fingerprint, ENTERING)
+
+    def entered(self, fingerprint: str) -> None:
+        self._update(fingerprint, ENTERED, error=None)
+
+    def failed(self, fingerprint: str, error: str, keep_order: bool = True) -> None:
+        """
+        Record a failure; the email is processed again on the next run.
+
+        Args:
+            keep_order: Keep the extracted order, so the next run enters it without a new extraction.
+                        Pass False if the order itself was the problem (e.g. it didn't pass validation).
+        """
+        if keep_order:
+            self._update(fingerprint, FAILED, error=error)
+        else:
+            self._update(fingerprint, FAILED, error=error, order_json=None, order_hash=None, extracted_by=None)
+
+    def reset(self, fingerprint: str) -> None:
+        """Process the email again from the start, e.g. after checking that an interrupted entry wasn't saved."""
+        self._update(fingerprint, SEEN, error=None, order_json=None, order_hash=None, extracted_by=None)
+
+    def emails_with_order(self, order: Dict[str, Any], stage: str = ENTERED) -> List[str]:
+        """Fingerprints of the emails with the same (normalized) order in the given stage."""
+        rows = self._connection.execute("SELECT fingerprint FROM emails WHERE order_hash = ? AND stage = ?",
+                                        (order_hash(order), stage)).fetchall()
+        return [row[0] for row in rows]
+
+    def summary(self) -> str:
+        counts = dict(self._connection.execute("SELECT stage, COUNT(*) FROM emails GROUP BY stage").fetchall())
+        return ", ".join(f"{counts[stage]} {stage}" for stage in (ENTERED, ENTERING, EXTRACTED, FAILED, SEEN)
+                         if stage in counts) or "empty"
+
+    def extraction_summary(self) -> str:
+        """How many of the stored orders were extracted by each path (parser, text llm, vision llm)."""
+        counts = self._connection.execute("SELECT extracted_by, COUNT(*) FROM emails WHERE order_json IS NOT NULL "
+                                          "GROUP BY extracted_by ORDER BY COUNT(*) DESC").fetchall()
+        return ", ".join(f"{count} {path or 'unknown'}" for path, count in counts) or "none"
+
+    def close(self) -> None:
+        self._connection.close()
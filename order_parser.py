@@ -0,0 +1,140 @@
+"""
+Local parser for order emails in the known format, so that most orders need no OpenAI request.
+
+    I just visited our customer Smith & Co. Ltd.
+    They want to order:
+
+    - Product Name: High-Speed Router X200
+      Quantity: 5 units
+      Price per unit: 120.00
+
+parse_order_text() reads the customer line and the product blocks from the email text and returns
+the order in the JSON format of the OpenAI extraction ("customerName", "orderedArticles"),
+together with a confidence between 0 and 1. Everything the parser can't account for lowers the
+confidence: no customer line or several different ones, a customer name followed by more text,
+a product without quantity or price, a number it can't read. Below MIN_CONFIDENCE the flows fall
+back to OpenAI, first with the email text and then with the screenshot.
+
+    parsed = parse_order_text(email_text)
+    if parsed.confident:
+        order = Order.from_dict(parsed.order)
+"""
+import re
+from typing import Any, Dict, List, Optional
+
+# How an order was extracted, as recorded in the order ledger
+PARSER = "parser"
+TEXT_LLM = "text llm"
+VISION_LLM = "vision llm"
+EXTRACTION_PATHS = (PARSER, TEXT_LLM, VISION_LLM)
+
+MIN_CONFIDENCE = 0.9
+
+_CUSTOMER_PATTERN = re.compile(r"\bcustomer\b\s*:?\s+(.+)$", re.IGNORECASE)
+_PRODUCT_PATTERN = re.compile(r"^[-*•]?\s*(?:product|article)(?:\s+name)?\s*:\s*(.+)$", re.IGNORECASE)
+_QUANTITY_PATTERN = re.compile(r"^[-*•]?\s*(?:quantity|qty)\s*:\s*(\S+)", re.IGNORECASE)
+_PRICE_PATTERN = re.compile(r"^[-*•]?\s*(?:unit price|price(?:\s+per\s+unit)?)\s*:\s*(?:[$€£]|usd|eur)?\s*([\d.,]+)",
+                            re.IGNORECASE)
+# Abbreviations that keep their period at the end of a customer name ("Smith & Co. Ltd.")
+_ABBREVIATION_AT_END = re.compile(r"\b(?:Ltd|Inc|Co|Corp|Bros|Jr|Sr)\.$")
+_SENTENCE_END = re.compile(r"[.!?]\s+")
+# Lowercase words that can be part of a company name; other lowercase words are prose
+_NAME_PARTICLES = {"and", "of", "the", "for", "de", "du", "da", "di", "la", "le", "von", "van", "der", "den", "und", "et", "y"}
+
+
+class ParsedOrder:
+    """An order read by the local parser, with what lowered the confidence."""
+    def __init__(self, order: Dict[str, Any], confidence: float, problems: List[str]):
+        self.order = order
+        self.confidence = confidence
+        self.problems = problems
+
+    @property
+    def confident(self) -> bool:
+        return self.confidence >= MIN_CONFIDENCE
+
+    def report(self) -> str:
+        articles = len(self.order["orderedArticles"])
+        return (f"{articles} article{'s' if articles != 1 else ''}, confidence {self.confidence:.2f}"
+                + (f" ({'; '.join(self.problems)})" if self.problems else ""))
+
+
+def _parse_number(text: str) -> Optional[float]:
+    text = text.strip().rstrip(".")
+    if re.fullmatch(r"\d{1,3}(,\d{3})+(\.\d+)?", text):
+        text = text.replace(",", "")
+    elif re.fullmatch(r"\d+,\d{1,2}", text):
+        text = text.replace(",", ".")
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _customer_name(line: str) -> Optional[str]:
+    match = _CUSTOMER_PATTERN.search(line)
+    if not match:
+        return None
+    name = match.group(1).strip()
+    # The name ends with its sentence: "Smith & Co. Ltd. today. They were happy." -> "Smith & Co. Ltd."
+    for end in _SENTENCE_END.finditer(name):
+        before, following = name[:end.start() + 1], name[end.end():]
+        if not _ABBREVIATION_AT_END.search(before) or following[:1].islower():
+            name = before
+            break
+    if name.endswith(".") and not _ABBREVIATION_AT_END.search(name):
+        name = name[:-1].rstrip()
+    return name or None
+
+
+def _has_prose(name: str) -> bool:
+    """True if the customer name contains lowercase words, i.e. probably text that follows the name."""
+    words = re.findall(r"[^\W\d_]+", name)
+    return any(word.islower() and word not in _NAME_PARTICLES for word in words)
+
+
+def parse_order_text(text: str) -> ParsedOrder:
+    """Read the customer and the ordered articles from the text of an order email."""
+    problems = []
+    customers: List[str] = []
+    articles: List[Dict[str, Any]] = []
+    for line in (line.strip() for line in text.splitlines()):
+        product = _PRODUCT_PATTERN.match(line)
+        if product:
+            articles.append({"articleName": product.group(1).strip(), "quantity": None, "pricePerUnit": None})
+            continue
+        quantity = _QUANTITY_PATTERN.match(line)
+        price = _PRICE_PATTERN.match(line)
+        if (quantity or price) and not articles:
+            problems.append(f"'{line}' before the first product")
+        elif quantity:
+            value = _parse_number(quantity.group(1))
+            if value is None or value != int(value):
+                problems.append(f"unreadable quantity '{quantity.group(1)}'")
+            else:
+                articles[-1]["quantity"] = int(value)
+        elif price:
+            articles[-1]["pricePerUnit"] = _parse_number(price.group(1))
+        else:
+            name = _customer_name(line)
+            if name and name not in customers:
+                customers.append(name)
+
+    if len(customers) > 1:
+        problems.append(f"{len(customers)} different customer lines")
+    problems += [f"customer '{name}' may include other text" for name in customers if _has_prose(name)]
+    for article in articles:
+        if article["quantity"] is None or article["pricePerUnit"] is None:
+            missing = "quantity" if article["quantity"] is None else "price"
+            problems.append(f"no {missing} for '{article['articleName']}'")
+    # Each doubt halves the confidence; without customer or products the result is unusable
+    confidence = 0.5 ** len(problems)
+    if not customers:
+        problems.append("no customer line")
+        confidence = 0.0
+    if not articles:
+        problems.append("no products")
+        confidence = 0.0
+    complete = [article for article in articles if article["quantity"] is not None and article["pricePerUnit"] is not None]
+    order = {"customerName": customers[0] if customers else "", "orderedArticles": complete}
+    return ParsedOrder(order, confidence, problems)
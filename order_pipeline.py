@@ -0,0 +1,287 @@
+"""
+Batch mode for the email-to-ERP example: process every order email of the search result list.
+
+Each email runs through four stages, connected by bounded queues:
+
+    capture (open email, parse its text) -> extract (GPT-4o) -> validate -> ERP entry
+
+Capture and ERP entry both drive the desktop, so they take turns (one email or one order at a
+time). Extraction doesn't touch the desktop and runs concurrently with both, so the LLM
+extraction of order N+1 overlaps the data entry of order N. The bounded queues keep capture
+from running too far ahead of the slower stages.
+
+Emails that the order ledger (see order_ledger.py) marks as entered are skipped right after
+capture, without a screenshot; emails with an order stored by an earlier run skip the extraction.
+So do emails whose order the local parser reads from the text (see order_parser.py); for the
+others, GPT-4o gets the email text first and the screenshot only if that fails.
+"""
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Awaitable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from smooth_operator_agent_tools import SmoothOperatorClient
+
+from async_operator import AsyncSmoothOperator
+from click_cache import click_cache, get_click_cache
+from console import wait_for_enter
+from collect_orders_erp import (ErpElementIds, OrderEmail, enter_order_into_erp, extract_order, get_erp_window_details,
+                                identify_erp_element_ids, iter_order_emails_from_gmail, iter_order_emails_from_outlook, launch_mock_erp,
+                                validate_order)
+from form_fill import FormFillError
+from llm_scheduler import PRIORITY_BATCH
+from order_ledger import ENTERING, OrderLedger
+from order_parser import EXTRACTION_PATHS
+from session_recording import session_client
+from server_lifecycle import shared_server
+from timing_stats import StageStats
+from tracing import span, traced
+
+STAGES = ("capture", "extract", "validate", "erp entry")
+
+
+class PipelineStats:
+    """Throughput and per-stage latency of a batch run."""
+    def __init__(self):
+        self.stages: Dict[str, StageStats] = {name: StageStats(name) for name in STAGES}
+        self.end_to_end = StageStats("end-to-end")
+        self.completed = 0
+        self.failures: List[Tuple[int, str]] = []
+        self.skipped: List[Tuple[int, str]] = []
+        # Orders extracted in this run, per path (parser, text llm, vision llm)
+        self.extracted_by: Dict[str, int] = {path: 0 for path in EXTRACTION_PATHS}
+        self.started_at = time.perf_counter()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def orders_per_minute(self) -> float:
+        return self.completed / (self.elapsed / 60) if self.elapsed > 0 else 0.0
+
+    def report(self) -> str:
+        lines = [f"Entered {self.completed} orders ({len(self.failures)} failed, {len(self.skipped)} skipped) "
+                 f"in {self.elapsed:.1f}s: {self.orders_per_minute:.2f} orders/minute",
+                 "Extraction paths: " + ", ".join(f"{count} {path}" for path, count in self.extracted_by.items()),
+                 "Stage latencies:"]
+        lines += [f"  {stage}" for stage in list(self.stages.values()) + [self.end_to_end]]
+        lines += [f"  Email {position} failed: {reason}" for position, reason in self.failures]
+        lines += [f"  Email {position} skipped: {reason}" for position, reason in self.skipped]
+        return "\n".join(lines)
+
+
+class OrderJob:
+    """One order email travelling through the pipeline."""
+    def __init__(self, email: OrderEmail, started_at: float):
+        self.position = email.position
+        self.fingerprint = email.fingerprint
+        self.email = email
+        self.started_at = started_at
+        # Set already if the local parser read the order, or an earlier run extracted it
+        self.order = email.order or email.stored_order
+
+
+async def _run_stages(*stages: Awaitable) -> None:
+    """
+    Run the stages concurrently. If one raises, the others are cancelled (they would wait on their
+    queues forever) and the exception is raised.
+    """
+    tasks = [asyncio.ensure_future(stage) for stage in stages]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    for task in tasks:
+        if not task.cancelled() and task.exception() is not None:
+            raise task.exception()
+
+
+async def run_order_pipeline(ops: AsyncSmoothOperator, emails: AsyncIterator, erp_window, erp_element_ids: ErpElementIds,
+                             queue_size: int = 2, extraction_workers: int = 2,
+                             ledger: Optional[OrderLedger] = None) -> PipelineStats:
+    """
+    Run captured emails through extraction, validation and ERP entry.
+
+    Args:
+        ops: The awaitable client facade (with an OpenAI client).
+        emails: Async iterator of OrderEmail, e.g. iter_order_emails_from_gmail().
+        erp_window: The mock ERP window.
+        erp_element_ids: The element IDs of the ERP form.
+        queue_size: Capacity of the queues between the stages.
+        extraction_workers: Number of orders extracted concurrently.
+        ledger: The order ledger the emails were looked up in (default: an in-memory ledger for this run).
+    """
+    ledger = ledger or OrderLedger(":memory:")
+    stats = PipelineStats()
+    desktop_lock = asyncio.Lock()
+    extract_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    validate_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    entry_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def fail(job: OrderJob, reason: str) -> None:
+        print(f"Email {job.position}: {reason}")
+        stats.failures.append((job.position, reason))
+
+    async def capture():
+        iterator = emails.__aiter__()
+        while True:
+            async with desktop_lock:
+                start_time = time.perf_counter()
+                try:
+                    email = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+            stats.stages["capture"].add(time.perf_counter() - start_time)
+            if email.entry and email.entry.is_done:
+                reason = ("an earlier run stopped while entering it, check the ERP" if email.entry.stage == ENTERING
+                          else "entered by an earlier run")
+                print(f"Email {email.position}: {reason}, skipped.")
+                stats.skipped.append((email.position, reason))
+                continue
+            await extract_queue.put(OrderJob(email, start_time))
+        for _ in range(extraction_workers):
+            await extract_queue.put(None)
+
+    async def extract():
+        while (job := await extract_queue.get()) is not None:
+            if job.order:
+                # Parsed from the text at capture (and recorded there), or extracted by an earlier run
+                if job.email.extracted_by:
+                    stats.extracted_by[job.email.extracted_by] += 1
+                await validate_queue.put(job)
+                continue
+            if ops.openai_client is None:
+                # The next run (with a key) tries again
+                ledger.failed(job.fingerprint, "order not readable by the local parser, no OpenAI API key", keep_order=False)
+                fail(job, "the local parser couldn't read the order and OPENAI_API_KEY is not set")
+                continue
+            start_time = time.perf_counter()
+            job.order = await extract_order(ops, job.email, priority=PRIORITY_BATCH)
+            job.email.screenshot = None  # Not needed anymore, free the memory
+            stats.stages["extract"].add(time.perf_counter() - start_time)
+            if job.order:
+                stats.extracted_by[job.email.extracted_by] += 1
+                ledger.extracted(job.fingerprint, job.order.to_dict(), extracted_by=job.email.extracted_by)
+                await validate_queue.put(job)
+            else:
+                ledger.failed(job.fingerprint, "order extraction failed", keep_order=False)
+                fail(job, "order extraction failed")
+
+    async def extract_all():
+        await _run_stages(*(extract() for _ in range(extraction_workers)))
+        await validate_queue.put(None)
+
+    async def validate():
+        while (job := await validate_queue.get()) is not None:
+            start_time = time.perf_counter()
+            with span("validate order", position=job.position):
+                problems = validate_order(job.order)
+            stats.stages["validate"].add(time.perf_counter() - start_time)
+            if problems:
+                # The next run extracts the order again
+                ledger.failed(job.fingerprint, f"invalid order: {', '.join(problems)}", keep_order=False)
+                fail(job, f"invalid order: {', '.join(problems)}")
+            else:
+                await entry_queue.put(job)
+        await entry_queue.put(None)
+
+    async def enter():
+        while (job := await entry_queue.get()) is not None:
+            async with desktop_lock:
+                start_time = time.perf_counter()
+                # From here on the order may be saved; if the run stops, the next one doesn't enter it twice
+                ledger.entering(job.fingerprint)
+                try:
+                    await ops.automation.bring_to_front(erp_window.id)
+                    await enter_order_into_erp(ops, erp_window, erp_element_ids, job.order)
+                except FormFillError as ex:
+                    # Nothing was saved, the next run enters the stored order again
+                    ledger.failed(job.fingerprint, str(ex))
+                    fail(job, f"ERP entry failed: {ex}")
+                    continue
+                except Exception as ex:
+                    # The order may have been saved, so the email stays marked as being entered
+                    fail(job, f"ERP entry failed: {ex}")
+                    continue
+                ledger.entered(job.fingerprint)
+            finished_at = time.perf_counter()
+            stats.stages["erp entry"].add(finished_at - start_time)
+            stats.end_to_end.add(finished_at - job.started_at)
+            stats.completed += 1
+            print(f"Email {job.position}: order for {job.order.customer_name} entered.")
+
+    await _run_stages(capture(), extract_all(), validate(), enter())
+    stats.finished_at = time.perf_counter()
+    return stats
+
+
+@traced("flow: collect orders batch")
+async def run_collect_orders_erp_batch(max_emails: int = 20, source: str = "gmail",
+                                       queue_size: int = 2, extraction_workers: int = 2):
+    """Enter all order emails found in Gmail (or Outlook) into the mock ERP."""
+    print("Starting Email-to-ERP Batch Example...")
+
+    # Load environment variables from .env file
+    load_dotenv()
+
+    screengrasp_api_key = os.getenv("SCREENGRASP_API_KEY")
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+
+    if not screengrasp_api_key:
+        print("Error: SCREENGRASP_API_KEY not found in .env file. Get a free key at https://screengrasp.com/api.html")
+        wait_for_enter()
+        return
+    if not openai_api_key:
+        # The local parser reads most orders; only the others need GPT-4o
+        print("Warning: OPENAI_API_KEY not found in .env file. Orders the local parser can't read will fail. "
+              "Get a key at https://platform.openai.com/api-keys")
+
+    client = session_client(click_cache(shared_server(SmoothOperatorClient, screengrasp_api_key)))
+    ops = AsyncSmoothOperator(client, openai_api_key=openai_api_key)
+    # Remembers which emails were processed, so a rerun skips them (or resumes where it stopped)
+    ledger = OrderLedger()
+
+    print("Starting server (or attaching to the running one; the first start can take a while, because it's installing the server)...")
+    await ops.start_server()
+
+    try:
+        # The ERP is prepared once for the whole batch
+        if not await launch_mock_erp(ops):
+            print("Error: Could not start the mock ERP.")
+            return
+        erp_window, window_details_json = await get_erp_window_details(ops)
+        if not erp_window:
+            return
+        erp_element_ids = await identify_erp_element_ids(ops, window_details_json)
+        if not erp_element_ids:
+            print("Error: Could not identify ERP element IDs.")
+            return
+
+        if source == "outlook":
+            emails = iter_order_emails_from_outlook(ops, max_emails, ledger)
+        else:
+            emails = iter_order_emails_from_gmail(ops, max_emails, ledger)
+        stats = await run_order_pipeline(ops, emails, erp_window, erp_element_ids, queue_size=queue_size,
+                                         extraction_workers=extraction_workers, ledger=ledger)
+        print(stats.report())
+        if ops.llm:
+            print(f"OpenAI: {ops.llm.stats()}")
+        print(f"Order ledger: {ledger.summary()}")
+        print(f"Order extraction paths (all runs): {ledger.extraction_summary()}")
+        print(f"Click cache: {get_click_cache().stats()}")
+    finally:
+        ledger.close()
+        print("Stopping server...")
+        await ops.stop_server()
+        ops.close()
+
+    print("\nEmail-to-ERP Batch Example finished.")
+    wait_for_enter()
+
+if __name__ == "__main__":
+    asyncio.run(run_collect_orders_erp_batch())
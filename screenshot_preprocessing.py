@@ -0,0 +1,137 @@
+"""
+Preprocessing of screenshots before they are sent to a vision model.
+
+A full-screen screenshot of an email is mostly browser chrome, the inbox sidebar and empty
+space. Cropping it to the email body, downscaling it to a target size and re-encoding it
+as a JPEG of moderate quality makes the upload smaller and the vision call faster and
+cheaper, without losing the text the model has to read.
+
+Requires Pillow (`pip install Pillow`). Without it, screenshots are passed through unchanged.
+"""
+import base64
+import io
+import os
+from typing import Any, Iterable, Optional, Tuple
+
+from ui_tree import get_field
+
+# (left, top, width, height) in screen pixels
+Region = Tuple[int, int, int, int]
+
+DEFAULT_MAX_LONG_EDGE = 1600
+DEFAULT_JPEG_QUALITY = 70
+# Regions smaller than this (in pixels, either side) are considered a wrong match and ignored
+MIN_REGION_SIZE = 200
+
+
+class PreprocessingReport:
+    """Payload size of an image before and after preprocessing."""
+    def __init__(self, before_bytes: int, after_bytes: int, before_size: Tuple[int, int],
+                 after_size: Tuple[int, int], region: Optional[Region] = None):
+        self.before_bytes = before_bytes
+        self.after_bytes = after_bytes
+        self.before_size = before_size
+        self.after_size = after_size
+        self.region = region
+
+    def __str__(self) -> str:
+        reduction = (1 - self.after_bytes / self.before_bytes) * 100 if self.before_bytes else 0.0
+        crop_info = f", cropped to {self.region}" if self.region else ""
+        return (f"{self.before_bytes} -> {self.after_bytes} bytes base64 ({reduction:.0f}% smaller), "
+                f"{self.before_size[0]}x{self.before_size[1]} -> {self.after_size[0]}x{self.after_size[1]} px{crop_info}")
+
+
+class PreprocessedScreenshot:
+    """A screenshot after preprocessing; can be used wherever a ScreenshotResponse is read."""
+    def __init__(self, image_base64: str, report: Optional[PreprocessingReport], success: bool = True):
+        self.success = success
+        self.image_base64 = image_base64
+        self.report = report
+
+    @property
+    def image_bytes(self) -> bytes:
+        return base64.b64decode(self.image_base64)
+
+    @property
+    def image_mime_type(self) -> str:
+        return "image/jpeg"
+
+
+def region_from_env(variable: str = "EMAIL_SCREENSHOT_REGION") -> Optional[Region]:
+    """Read a crop region "left,top,width,height" from an environment variable."""
+    value = os.getenv(variable)
+    if not value:
+        return None
+    try:
+        left, top, width, height = (int(part) for part in value.split(","))
+        return left, top, width, height
+    except ValueError:
+        print(f"Warning: Ignoring invalid {variable}='{value}', expected 'left,top,width,height'.")
+        return None
+
+
+def main_content_region(chrome_elements: Iterable[Any]) -> Optional[Region]:
+    """
+    Find the screen region of the page's main content (e.g. Gmail's message pane, without the
+    sidebar and the top bar) among the Chrome elements of a get_overview() focus info.
+
+    The bounding rect of a Chrome element is in page coordinates; its center point is in screen
+    coordinates. The screen region is derived from both.
+    """
+    best_region, best_area = None, 0
+    for element in chrome_elements or []:
+        role = (get_field(element, "role") or "").lower()
+        tag_name = (get_field(element, "tag_name") or "").lower()
+        if role != "main" and tag_name != "main":
+            continue
+        if get_field(element, "is_visible") is False:
+            continue
+        rect = get_field(element, "bounding_rect") or []
+        if len(rect) != 4:
+            continue
+        _, _, width, height = rect
+        center = get_field(element, "center_point")
+        if center is not None:
+            left, top = get_field(center, "x") - width // 2, get_field(center, "y") - height // 2
+        else:
+            left, top = rect[0], rect[1]
+        if width * height > best_area and width >= MIN_REGION_SIZE and height >= MIN_REGION_SIZE:
+            best_region, best_area = (int(left), int(top), int(width), int(height)), width * height
+    return best_region
+
+
+def preprocess_image(image_base64: str, region: Optional[Region] = None,
+                     max_long_edge: int = DEFAULT_MAX_LONG_EDGE, quality: int = DEFAULT_JPEG_QUALITY) -> PreprocessedScreenshot:
+    """
+    Crop, downscale and re-encode a base64 image.
+
+    Args:
+        image_base64: The image (as delivered by screenshot.take()).
+        region: Screen region to crop to (left, top, width, height); None keeps the whole image.
+        max_long_edge: The longer side is scaled down to at most this many pixels.
+        quality: JPEG quality of the re-encoded image.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return PreprocessedScreenshot(image_base64, None)
+
+    image = Image.open(io.BytesIO(base64.b64decode(image_base64)))
+    before_size = image.size
+    applied_region = None
+    if region:
+        left, top, width, height = region
+        box = (max(0, left), max(0, top), min(image.width, left + width), min(image.height, top + height))
+        if box[2] - box[0] >= MIN_REGION_SIZE and box[3] - box[1] >= MIN_REGION_SIZE:
+            image = image.crop(box)
+            applied_region = (box[0], box[1], box[2] - box[0], box[3] - box[1])
+
+    scale = max_long_edge / max(image.size)
+    if scale < 1:
+        image = image.resize((round(image.width * scale), round(image.height * scale)), Image.LANCZOS)
+
+    output = io.BytesIO()
+    image.convert("RGB").save(output, format="JPEG", quality=quality, optimize=True)
+    processed_base64 = base64.b64encode(output.getvalue()).decode("ascii")
+    report = PreprocessingReport(len(image_base64), len(processed_base64), before_size, image.size, applied_region)
+    return PreprocessedScreenshot(processed_base64, report)
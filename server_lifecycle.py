@@ -0,0 +1,516 @@
+"""
+One warm Smooth Operator server shared by the example scripts, instead of a start and a stop per run.
+
+Starting the server takes a while (installation check, process start, waiting until it answers
+its ping), and every script used to pay for that at the start and kill the server at the end.
+With the shared server:
+
+- the first script starts the server as a process of its own that outlives the script, and
+  writes its URL to a state file in the temp directory;
+- later scripts read the state file, check that the server answers the ping and attach to it;
+- scripts running at the same time share the server. Each holds a lease (a file named after its
+  process ID) while it uses the server; leases of processes that are gone don't count;
+- a small watchdog process stops the server when no lease has been held for `idle_timeout`
+  seconds, or forgets it when the server process has exited.
+
+    client = session_client(shared_server(SmoothOperatorClient, api_key))
+    client.start_server()   # attaches to the running server, or starts it
+    ...
+    client.stop_server()    # releases the lease, the server keeps running
+
+The client is created by start_server() with the URL of the shared server, through the public
+SmoothOperatorClient(api_key, base_url) constructor. The server installation is the one part
+that needs a private method of the library (see install_agent_server()).
+
+Environment:
+    SMOOTH_OPERATOR_SHARED_SERVER=0   start and stop a server per run, as before
+    SMOOTH_OPERATOR_IDLE_TIMEOUT      seconds the server keeps running without users (default: 600)
+    SMOOTH_OPERATOR_BASE_URL          attach to a server started elsewhere (it is never stopped)
+
+    python server_lifecycle.py status   show the shared server and its leases
+    python server_lifecycle.py stop     stop it now
+    python server_lifecycle.py check    cold start, attach, sharing and idle stop against a local fake server
+"""
+import atexit
+import json
+import os
+import platform
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+from smooth_operator_agent_tools import SmoothOperatorClient
+
+API_NAMES = ("screenshot", "system", "mouse", "keyboard", "chrome", "automation", "code")
+
+DEFAULT_IDLE_TIMEOUT = 600.0
+STARTUP_TIMEOUT = 300.0
+WATCH_INTERVAL = 5.0
+
+# Exit code that Windows reports for a process that is still running
+_STILL_ACTIVE = 259
+
+
+def ping(base_url: str, timeout: float = 2.0) -> bool:
+    """True if the server at `base_url` answers its ping."""
+    try:
+        response = requests.get(f"{base_url}/tools-api/ping", timeout=timeout)
+    except requests.RequestException:
+        return False
+    # The server sends the text including the JSON quotes
+    return response.ok and response.text.strip().strip('"') == "pong"
+
+
+def process_alive(pid: int) -> bool:
+    if os.name == "nt":
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        return exit_code.value == _STILL_ACTIVE
+    try:
+        # Signal 0 only checks that the process exists
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def detached_process_options() -> Dict[str, Any]:
+    """Popen options for a process that keeps running when the script exits."""
+    options: Dict[str, Any] = {"stdin": subprocess.DEVNULL, "stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+    if os.name == "nt":
+        options["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        options["start_new_session"] = True
+    return options
+
+
+def install_agent_server() -> str:
+    """Install (or update) the server shipped with smooth_operator_agent_tools. Returns the installation folder."""
+    # The library only installs the server inside start_server(); it has no public method for that
+    ensure_installed = getattr(SmoothOperatorClient, "_ensure_server_installed", None)
+    if ensure_installed is None:
+        raise RuntimeError("This version of smooth_operator_agent_tools has no SmoothOperatorClient._ensure_server_installed(), "
+                           "so the shared server can't be installed. Set SMOOTH_OPERATOR_SHARED_SERVER=0 to let the "
+                           "library start the server in every run.")
+    # Only the installation code runs: no HTTP session is opened and no server is started
+    installer = SmoothOperatorClient.__new__(SmoothOperatorClient)
+    try:
+        return ensure_installed(installer)
+    except (AttributeError, TypeError) as ex:
+        raise RuntimeError(f"Installing the Smooth Operator server failed ({ex}); the installation code of "
+                           "smooth_operator_agent_tools may have changed. Set SMOOTH_OPERATOR_SHARED_SERVER=0 to "
+                           "let the library start the server in every run.") from ex
+
+
+def launch_agent_server() -> Tuple[subprocess.Popen, str]:
+    """Start the installed Smooth Operator server on its own. Returns the process and the file it writes its port to."""
+    if platform.system() != "Windows":
+        raise NotImplementedError("Currently, the server executable only runs on Windows.")
+    installation_folder = install_agent_server()
+    port_file_name = f"portnr_{random.randint(1000000, 100000000)}.txt"
+    # The arguments of SmoothOperatorClient.start_server(), without "/close-with-parent-process"
+    process = subprocess.Popen([os.path.join(installation_folder, "smooth-operator-server.exe"), "/silent",
+                                "/managed-by-lib", "/apikey=no_api_key_provided", f"/portnrfile={port_file_name}"],
+                               cwd=installation_folder, **detached_process_options())
+    return process, os.path.join(installation_folder, port_file_name)
+
+
+class _FileLock:
+    """Lock between processes: a lock file created exclusively, taken over once it is older than `stale_after`."""
+    def __init__(self, path: str, stale_after: float = STARTUP_TIMEOUT + 60):
+        self.path = path
+        self.stale_after = stale_after
+
+    def __enter__(self) -> '_FileLock':
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > self.stale_after:
+                        os.remove(self.path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                time.sleep(0.05)
+
+    def __exit__(self, *exc_info) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class ServerManager:
+    """
+    Attaches to the shared server or starts it, and counts the users within this process.
+
+    Args:
+        idle_timeout: Seconds the server keeps running after the last lease was released.
+        state_dir: Directory of the state file, the leases and the lock (default: "smooth-operator-server" in the temp directory).
+        launcher: Starts the server process; returns it and the file it writes its port to (default: launch_agent_server).
+        base_url: URL of a server started elsewhere; it is only pinged, never started or stopped.
+    """
+    def __init__(self, idle_timeout: float = DEFAULT_IDLE_TIMEOUT, state_dir: Optional[str] = None,
+                 launcher: Optional[Callable[[], Tuple[subprocess.Popen, str]]] = None, base_url: Optional[str] = None):
+        self.idle_timeout = idle_timeout
+        self.state_dir = state_dir or os.path.join(tempfile.gettempdir(), "smooth-operator-server")
+        self.launcher = launcher or launch_agent_server
+        self.external_url = base_url
+        self.base_url: Optional[str] = None
+        self.references = 0
+        self.mode: Optional[str] = None
+        self.cold_start_time: Optional[float] = None
+        self.attach_time: Optional[float] = None
+        self._lease_path: Optional[str] = None
+        self._lock = threading.Lock()
+        os.makedirs(self._leases_dir, exist_ok=True)
+
+    @property
+    def _state_path(self) -> str:
+        return os.path.join(self.state_dir, "server.json")
+
+    @property
+    def _leases_dir(self) -> str:
+        return os.path.join(self.state_dir, "leases")
+
+    def _file_lock(self) -> _FileLock:
+        return _FileLock(os.path.join(self.state_dir, "lock"))
+
+    def read_state(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_state(self, state: Dict[str, Any]) -> None:
+        temp_path = f"{self._state_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(temp_path, self._state_path)
+
+    def acquire(self) -> str:
+        """Return the URL of the shared server (attaching to it or starting it) and hold a lease on it."""
+        with self._lock:
+            if self.references:
+                self.references += 1
+                self.mode = "shared"
+                return self.base_url
+            start_time = time.perf_counter()
+            if self.external_url:
+                if not ping(self.external_url):
+                    raise RuntimeError(f"The Smooth Operator server at {self.external_url} doesn't answer.")
+                self.base_url, self.mode = self.external_url, "attached"
+            else:
+                with self._file_lock():
+                    state = self.read_state()
+                    if state and ping(state["base_url"]):
+                        self.base_url, self.mode = state["base_url"], "attached"
+                    else:
+                        if state:
+                            # Exited or hung; a new one is started
+                            self._stop(state)
+                        self.base_url, self.mode = self._cold_start()["base_url"], "cold start"
+                    self._lease_path = os.path.join(self._leases_dir, f"{os.getpid()}-{uuid.uuid4().hex[:8]}")
+                    open(self._lease_path, "w").close()
+            elapsed = time.perf_counter() - start_time
+            if self.mode == "attached":
+                self.attach_time = elapsed
+            else:
+                self.cold_start_time = elapsed
+            self.references = 1
+            return self.base_url
+
+    def release(self) -> None:
+        """Release one reference; the lease is dropped (and the idle time starts) when the last one is released."""
+        with self._lock:
+            if not self.references:
+                return
+            self.references -= 1
+            if self.references or not self._lease_path:
+                return
+            with self._file_lock():
+                try:
+                    os.remove(self._lease_path)
+                except FileNotFoundError:
+                    pass
+                self._lease_path = None
+                state = self.read_state()
+                if state:
+                    state.update(last_used=time.time(), idle_timeout=self.idle_timeout)
+                    self._write_state(state)
+
+    def release_all(self) -> None:
+        while self.references:
+            self.release()
+
+    def _cold_start(self) -> Dict[str, Any]:
+        start_time = time.perf_counter()
+        process, port_file = self.launcher()
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+
+        def check_progress(what: str) -> None:
+            if process.poll() is not None:
+                raise RuntimeError(f"The Smooth Operator server exited (code {process.returncode}) before {what}.")
+            if time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError(f"The Smooth Operator server didn't {what} within {STARTUP_TIMEOUT:.0f}s.")
+
+        port = ""
+        while not port:
+            check_progress("reporting its port")
+            try:
+                with open(port_file, "r") as f:
+                    port = f.read().strip()
+            except FileNotFoundError:
+                pass
+            if not port:
+                time.sleep(0.1)
+        os.remove(port_file)
+        base_url = f"http://localhost:{port}"
+        while not ping(base_url):
+            check_progress("answering its ping")
+            time.sleep(0.2)
+        now = time.time()
+        state = {"base_url": base_url, "pid": process.pid, "started_at": now, "last_used": now,
+                 "idle_timeout": self.idle_timeout, "cold_start_seconds": round(time.perf_counter() - start_time, 3)}
+        self._write_state(state)
+        # The watchdog stops the server once it is idle
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "watch", self.state_dir],
+                         cwd=os.path.dirname(os.path.abspath(__file__)), **detached_process_options())
+        return state
+
+    def _stop(self, state: Dict[str, Any]) -> None:
+        """Stop the server of `state` and forget it (call with the file lock held)."""
+        if process_alive(state["pid"]):
+            try:
+                os.kill(state["pid"], signal.SIGTERM)
+            except OSError:
+                pass
+        for name in os.listdir(self._leases_dir):
+            os.remove(os.path.join(self._leases_dir, name))
+        try:
+            os.remove(self._state_path)
+        except FileNotFoundError:
+            pass
+
+    def live_leases(self) -> List[str]:
+        """The leases of running processes; the ones of exited processes are removed (call with the file lock held)."""
+        leases = []
+        for name in os.listdir(self._leases_dir):
+            if process_alive(int(name.split("-")[0])):
+                leases.append(name)
+                continue
+            os.remove(os.path.join(self._leases_dir, name))
+            # The process exited without releasing the lease; the idle time starts now
+            state = self.read_state()
+            if state:
+                state["last_used"] = time.time()
+                self._write_state(state)
+        return leases
+
+    def stop(self) -> bool:
+        """Stop the shared server now (even if it is in use). Returns False if none was running."""
+        with self._file_lock():
+            state = self.read_state()
+            if state:
+                self._stop(state)
+            return state is not None
+
+    def report(self) -> str:
+        if self.mode == "attached":
+            state = self.read_state() or {}
+            cold_start = (f" (starting it took {state['cold_start_seconds']:.1f}s)"
+                          if state.get("cold_start_seconds") else "")
+            return f"Attached to the running Smooth Operator server at {self.base_url} in {self.attach_time * 1000:.0f} ms{cold_start}."
+        if self.mode == "cold start":
+            return (f"Started the Smooth Operator server in {self.cold_start_time:.1f}s (cold start). It keeps running "
+                    f"for later scripts until it has been idle for {self.idle_timeout:.0f}s.")
+        if self.mode == "shared":
+            return f"Sharing the Smooth Operator server at {self.base_url} with the other flows of this process."
+        return "Not connected to the Smooth Operator server."
+
+
+def watch(state_dir: str) -> None:
+    """Watchdog loop (run in its own process): stop the server once it is idle, forget it once it has exited."""
+    manager = ServerManager(state_dir=state_dir)
+    while True:
+        state = manager.read_state()
+        if state is None:
+            return
+        time.sleep(max(0.2, min(WATCH_INTERVAL, state["idle_timeout"] / 4)))
+        with manager._file_lock():
+            state = manager.read_state()
+            if state is None:
+                # Stopped by someone else
+                return
+            if not process_alive(state["pid"]):
+                manager._stop(state)
+                return
+            leases = manager.live_leases()
+            state = manager.read_state() or state
+            if not leases and time.time() - state["last_used"] > state["idle_timeout"]:
+                manager._stop(state)
+                return
+
+
+class _ConnectedApi:
+    """An API category (screenshot, mouse, ...) of the client that start_server() creates."""
+    def __init__(self, owner: "SharedServerClient", api_name: str):
+        self._owner = owner
+        self._api_name = api_name
+
+    def __getattr__(self, name: str):
+        return getattr(getattr(self._owner.client, self._api_name), name)
+
+
+class SharedServerClient:
+    """
+    Stand-in for a SmoothOperatorClient on the shared server: start_server() attaches to the server
+    and creates the client with its URL, stop_server() releases the server.
+    """
+    def __init__(self, client_class: Callable[..., Any], api_key: Optional[str], manager: ServerManager):
+        self._client_class = client_class
+        self._api_key = api_key
+        self._manager = manager
+        self._client: Any = None
+        self.base_url: Optional[str] = None
+        for api_name in API_NAMES:
+            setattr(self, api_name, _ConnectedApi(self, api_name))
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            raise RuntimeError("Call start_server() before using the client.")
+        return self._client
+
+    def start_server(self) -> None:
+        base_url = self._manager.acquire()
+        if self._client is None or base_url != self.base_url:
+            self._client = self._client_class(self._api_key, base_url)
+            self.base_url = base_url
+        print(self._manager.report())
+
+    def stop_server(self) -> None:
+        self._manager.release()
+
+    def __getattr__(self, name: str):
+        if name.startswith("_") or self._client is None:
+            raise AttributeError(name)
+        return getattr(self._client, name)
+
+
+_shared_manager: Optional[ServerManager] = None
+_shared_manager_lock = threading.Lock()
+
+
+def get_server_manager() -> ServerManager:
+    """Return the process-wide server manager, configured by the environment (see the module docstring)."""
+    global _shared_manager
+    with _shared_manager_lock:
+        if _shared_manager is None:
+            _shared_manager = ServerManager(
+                idle_timeout=float(os.getenv("SMOOTH_OPERATOR_IDLE_TIMEOUT") or DEFAULT_IDLE_TIMEOUT),
+                base_url=os.getenv("SMOOTH_OPERATOR_BASE_URL") or None)
+            # Scripts that don't call stop_server() release their lease at exit
+            atexit.register(_shared_manager.release_all)
+        return _shared_manager
+
+
+def shared_server(client_class: Callable[..., Any], api_key: Optional[str] = None, base_url: Optional[str] = None) -> Any:
+    """
+    A client for the shared server: `client_class(api_key, base_url)` is created once start_server() has
+    attached to the server. A SmoothOperatorClient with a `base_url` of its own (a server started
+    elsewhere) and other client classes (fakes) are created right away and don't use the shared server.
+    """
+    if (os.getenv("SMOOTH_OPERATOR_SHARED_SERVER", "1").lower() in ("0", "false", "no")
+            or client_class is not SmoothOperatorClient or base_url is not None):
+        return client_class(api_key, base_url)
+    return SharedServerClient(client_class, api_key, get_server_manager())
+
+
+def check(idle_timeout: float = 2.0, startup_delay: float = 1.5) -> bool:
+    """Run the lifecycle against the fake server of fake_agent.py in a temporary state directory."""
+    from fake_agent import launch_fake_agent_server
+
+    state_dir = tempfile.mkdtemp(prefix="smooth-operator-server-check-")
+
+    def new_manager() -> ServerManager:
+        # One manager per simulated script
+        return ServerManager(idle_timeout=idle_timeout, state_dir=state_dir,
+                             launcher=lambda: launch_fake_agent_server(startup_delay=startup_delay))
+
+    first = new_manager()
+    base_url = first.acquire()
+    print(first.report())
+    first.release()
+    ok = first.mode == "cold start"
+
+    concurrent = [new_manager() for _ in range(2)]
+    for manager in concurrent:
+        ok = ok and manager.acquire() == base_url and manager.mode == "attached"
+        print(manager.report())
+    with first._file_lock():
+        leases = first.live_leases()
+    print(f"Leases while two scripts share the server: {len(leases)}")
+    ok = ok and len(leases) == 2
+    for manager in concurrent:
+        manager.release()
+
+    print(f"Waiting for the idle timeout ({idle_timeout:.0f}s)...")
+    deadline = time.monotonic() + idle_timeout + 10
+    while first.read_state() is not None and time.monotonic() < deadline:
+        time.sleep(0.2)
+    stopped = first.read_state() is None and not ping(base_url, timeout=0.5)
+    print("Server stopped after the idle timeout." if stopped else "Error: the server is still running.")
+    if not stopped:
+        first.stop()
+    return ok and stopped
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "status"
+    if command == "watch":
+        watch(argv[1])
+        return 0
+    if command == "check":
+        return 0 if check() else 1
+    manager = ServerManager()
+    if command == "stop":
+        print("Stopped the shared server." if manager.stop() else "No shared server is running.")
+        return 0
+    state = manager.read_state()
+    if state is None:
+        print("No shared server is running.")
+        return 0
+    with manager._file_lock():
+        leases = manager.live_leases()
+    usage = "in use" if leases else f"idle for {time.time() - state['last_used']:.0f}s of {state['idle_timeout']:.0f}s"
+    print(f"Shared server at {state['base_url']} (process {state['pid']}), "
+          f"{'answering' if ping(state['base_url']) else 'NOT answering'}")
+    print(f"Cold start took {state['cold_start_seconds']:.1f}s; {len(leases)} leases; {usage}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
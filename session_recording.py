@@ -0,0 +1,368 @@
+"""
+Record a live run of a flow into a session file and replay it without desktop and network.
+
+While recording, every SmoothOperatorClient call (with its response: screenshots, overview
+trees, page text, ...) and every OpenAI request (with its completion) is appended to a JSON lines
+file, with the time it was made and how long it took. A replay answers the same calls from the
+file, so the orchestration code of a flow can be profiled in isolation and changes can be compared
+against exactly the same workload.
+
+Replay speed:
+    1.0   real time: every call takes as long as it took while recording
+    10.0  accelerated: every call takes a tenth of the recorded time
+    0     zero latency: calls return immediately, only the Python code of the flow is measured
+
+The flows create their clients through session_client() and the LlmScheduler wraps its OpenAI
+client with session_openai(), so recording and replay are switched on by the environment:
+    SESSION_RECORD=session.jsonl          record this run
+    SESSION_REPLAY=session.jsonl          replay a recorded run (API keys can be dummies)
+    SESSION_REPLAY_SPEED=0                replay speed (default: 1.0)
+
+Calls are matched by name and arguments. If the flow makes a call the recording doesn't have
+with these arguments, the next unused recording of the same call is used (e.g. when concurrent
+calls finished in another order); a call that was not recorded at all returns None, like a
+failed client call.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from llm_cache import completion_from_data, completion_to_data, request_key
+
+SESSION_VERSION = 1
+API_NAMES = ("screenshot", "system", "mouse", "keyboard", "chrome", "automation", "code")
+
+
+class SessionReplayError(Exception):
+    """A replayed call failed while recording, or an OpenAI request is not in the recording."""
+
+
+def _encode_argument(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    return str(value)
+
+
+def _encode_result(result: Any) -> Any:
+    """Client responses are stored with their model class, so they can be rebuilt on replay."""
+    if hasattr(result, "to_dict") and hasattr(type(result), "from_dict"):
+        return {"model": type(result).__name__, "data": result.to_dict()}
+    return {"value": result}
+
+
+def _decode_result(encoded: Dict[str, Any]) -> Any:
+    if "model" not in encoded:
+        return encoded.get("value")
+    from smooth_operator_agent_tools.models import models
+    return getattr(models, encoded["model"]).from_dict(encoded["data"])
+
+
+def _call_key(call_name: str, args: Any, kwargs: Any) -> str:
+    return json.dumps([call_name, args, kwargs], sort_keys=True, default=_encode_argument)
+
+
+class SessionRecorder:
+    """Appends client calls and OpenAI exchanges to a session file."""
+    def __init__(self, path: str):
+        self.path = path
+        self.started_at = time.perf_counter()
+        self.events = 0
+        self._lock = threading.Lock()
+        self._file = open(path, "w", encoding="utf-8")
+        self._write({"type": "session", "version": SESSION_VERSION, "recorded_at": time.time()})
+
+    def _write(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            self._file.write(json.dumps(event, default=_encode_argument) + "\n")
+            # Flushed right away, so a crashed run still leaves a usable recording
+            self._file.flush()
+            self.events += 1
+
+    def record(self, kind: str, call_name: str, started_at: float, request: Dict[str, Any],
+               result: Optional[Dict[str, Any]], error: Optional[str]) -> None:
+        now = time.perf_counter()
+        self._write({"type": kind, "call": call_name, "offset": round(started_at - self.started_at, 6),
+                     "duration": round(now - started_at, 6), **request, "result": result, "error": error})
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class _RecordingApi:
+    def __init__(self, api: Any, api_name: str, recorder: SessionRecorder):
+        self._api = api
+        self._api_name = api_name
+        self._recorder = recorder
+
+    def __getattr__(self, method_name: str):
+        method = getattr(self._api, method_name)
+        if not callable(method):
+            return method
+        call_name = f"{self._api_name}.{method_name}"
+
+        def call(*args, **kwargs):
+            started_at = time.perf_counter()
+            request = {"args": list(args), "kwargs": kwargs}
+            try:
+                result = method(*args, **kwargs)
+            except Exception as ex:
+                self._recorder.record("client", call_name, started_at, request, None, f"{ex.__class__.__name__}: {ex}")
+                raise
+            self._recorder.record("client", call_name, started_at, request, _encode_result(result), None)
+            return result
+        return call
+
+
+class RecordingClient:
+    """Wraps a SmoothOperatorClient and records every call."""
+    def __init__(self, client: Any, recorder: SessionRecorder):
+        self._client = client
+        self._recorder = recorder
+        for api_name in API_NAMES:
+            setattr(self, api_name, _RecordingApi(getattr(client, api_name), api_name, recorder))
+
+    def start_server(self) -> None:
+        self._client.start_server()
+
+    def stop_server(self) -> None:
+        self._client.stop_server()
+
+    def __getattr__(self, name: str):
+        return getattr(self._client, name)
+
+
+class _Chat:
+    """The `chat` attribute of an OpenAI client stand-in."""
+    def __init__(self, completions: Any):
+        self.completions = completions
+
+
+class _RecordingCompletions:
+    def __init__(self, completions: Any, recorder: SessionRecorder):
+        self._completions = completions
+        self._recorder = recorder
+
+    def create(self, **kwargs):
+        started_at = time.perf_counter()
+        request = {"key": request_key(kwargs), "model": kwargs.get("model")}
+        try:
+            completion = self._completions.create(**kwargs)
+        except Exception as ex:
+            # Errors with a status code (429, 5xx) are retried by the LlmScheduler; replay raises them as
+            # SessionReplayError, which is not retried
+            self._recorder.record("openai", "openai.chat", started_at, request, None, f"{ex.__class__.__name__}: {ex}")
+            raise
+        self._recorder.record("openai", "openai.chat", started_at, request, completion_to_data(completion), None)
+        return completion
+
+
+class RecordingOpenAI:
+    """Wraps an OpenAI client and records every chat completion."""
+    def __init__(self, openai_client: Any, recorder: SessionRecorder):
+        self._openai_client = openai_client
+        self.chat = _Chat(_RecordingCompletions(openai_client.chat.completions, recorder))
+
+    def __getattr__(self, name: str):
+        return getattr(self._openai_client, name)
+
+
+class SessionReplayer:
+    """Answers client calls and OpenAI requests from a recorded session."""
+    def __init__(self, path: str, speed: float = 1.0):
+        """
+        Args:
+            path: Session file written by a SessionRecorder.
+            speed: 1.0 replays in real time, larger values faster, 0 without any latency.
+        """
+        self.path = path
+        self.speed = speed
+        with open(path, "r", encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        if not lines or lines[0].get("type") != "session" or lines[0].get("version") != SESSION_VERSION:
+            raise ValueError(f"{path} is not a session recording (version {SESSION_VERSION})")
+        self.events: List[Dict[str, Any]] = lines[1:]
+        self._lock = threading.Lock()
+        self.rewind()
+
+    def rewind(self) -> None:
+        """Start over, e.g. to replay the session once more."""
+        with self._lock:
+            self._by_key: Dict[str, Deque[Dict[str, Any]]] = {}
+            self._by_call: Dict[str, Deque[Dict[str, Any]]] = {}
+            for event in self.events:
+                self._by_key.setdefault(self._event_key(event), deque()).append(event)
+                self._by_call.setdefault(event["call"], deque()).append(event)
+            self._used: set = set()
+            self.replayed = 0
+            self.unmatched = 0
+            self.missing = 0
+
+    @staticmethod
+    def _event_key(event: Dict[str, Any]) -> str:
+        if event["type"] == "openai":
+            return event["key"]
+        return _call_key(event["call"], event["args"], event["kwargs"])
+
+    @staticmethod
+    def _next_unused(events: Optional[Deque[Dict[str, Any]]], used: set) -> Optional[Dict[str, Any]]:
+        while events:
+            event = events.popleft()
+            if id(event) not in used:
+                return event
+        return None
+
+    def take(self, call_name: str, key: str) -> Optional[Dict[str, Any]]:
+        """The recorded event for a call: same arguments first, otherwise the next one of the same call."""
+        with self._lock:
+            event = self._next_unused(self._by_key.get(key), self._used)
+            if event is None:
+                event = self._next_unused(self._by_call.get(call_name), self._used)
+                if event is None:
+                    self.missing += 1
+                    return None
+                self.unmatched += 1
+            self._used.add(id(event))
+            self.replayed += 1
+        if self.speed > 0:
+            time.sleep(event["duration"] / self.speed)
+        return event
+
+    def stats(self) -> str:
+        return (f"{self.replayed} of {len(self.events)} recorded calls replayed, "
+                f"{self.unmatched} with other arguments, {self.missing} not recorded")
+
+
+class _ReplayApi:
+    def __init__(self, replayer: SessionReplayer, api_name: str):
+        self._replayer = replayer
+        self._api_name = api_name
+
+    def __getattr__(self, method_name: str):
+        call_name = f"{self._api_name}.{method_name}"
+
+        def call(*args, **kwargs):
+            # Encoded like the recording, so that e.g. enums compare equal
+            request = json.loads(json.dumps({"args": list(args), "kwargs": kwargs}, default=_encode_argument))
+            event = self._replayer.take(call_name, _call_key(call_name, request["args"], request["kwargs"]))
+            if event is None:
+                return None
+            if event["error"]:
+                raise SessionReplayError(event["error"])
+            return _decode_result(event["result"])
+        return call
+
+
+class ReplayClient:
+    """Stand-in for a SmoothOperatorClient that answers from a recorded session."""
+    def __init__(self, replayer: SessionReplayer):
+        self.replayer = replayer
+        for api_name in API_NAMES:
+            setattr(self, api_name, _ReplayApi(replayer, api_name))
+
+    def start_server(self) -> None:
+        pass
+
+    def stop_server(self) -> None:
+        pass
+
+
+class _ReplayCompletions:
+    def __init__(self, replayer: SessionReplayer):
+        self._replayer = replayer
+
+    def create(self, **kwargs):
+        event = self._replayer.take("openai.chat", request_key(kwargs))
+        if event is None:
+            raise SessionReplayError(f"No recorded OpenAI request left for {kwargs.get('model')}")
+        if event["error"]:
+            raise SessionReplayError(event["error"])
+        return completion_from_data(event["result"])
+
+
+class ReplayOpenAI:
+    """Stand-in for the OpenAI client that answers from a recorded session."""
+    def __init__(self, replayer: SessionReplayer):
+        self.chat = _Chat(_ReplayCompletions(replayer))
+
+
+_session: Optional[Any] = None
+_session_from_env = False
+
+
+def start_recording(path: str) -> SessionRecorder:
+    """Record the clients created from now on into `path`."""
+    global _session
+    _session = SessionRecorder(path)
+    return _session
+
+
+def start_replay(path: str, speed: float = 1.0) -> SessionReplayer:
+    """Answer the clients created from now on from the recording in `path`."""
+    global _session
+    _session = SessionReplayer(path, speed)
+    return _session
+
+
+def active_session() -> Optional[Any]:
+    """The current SessionRecorder or SessionReplayer (set up from the environment on first use)."""
+    global _session_from_env
+    if _session is None and not _session_from_env:
+        _session_from_env = True
+        if os.getenv("SESSION_REPLAY"):
+            replayer = start_replay(os.getenv("SESSION_REPLAY"), float(os.getenv("SESSION_REPLAY_SPEED") or 1.0))
+            print(f"Replaying session {os.getenv('SESSION_REPLAY')}.")
+            atexit.register(lambda: print(f"Session replay: {replayer.stats()}"))
+        elif os.getenv("SESSION_RECORD"):
+            recorder = start_recording(os.getenv("SESSION_RECORD"))
+            print(f"Recording session to {os.getenv('SESSION_RECORD')}.")
+            atexit.register(recorder.close)
+    return _session
+
+
+def is_replaying() -> bool:
+    return isinstance(active_session(), SessionReplayer)
+
+
+def session_client(client: Any) -> Any:
+    """The client to use: `client` itself, or a recording / replaying stand-in for it."""
+    session = active_session()
+    if isinstance(session, SessionRecorder):
+        return RecordingClient(client, session)
+    if isinstance(session, SessionReplayer):
+        return ReplayClient(session)
+    return client
+
+
+def session_openai(openai_client: Any) -> Any:
+    """The OpenAI client to use: `openai_client` itself, or a recording / replaying stand-in for it."""
+    session = active_session()
+    if isinstance(session, SessionRecorder):
+        return RecordingOpenAI(openai_client, session)
+    if isinstance(session, SessionReplayer):
+        return ReplayOpenAI(session)
+    return openai_client
+
+
+def summarize_session(path: str) -> str:
+    """Calls of a recording with their count and recorded time, slowest first."""
+    totals: Dict[str, Tuple[int, float]] = {}
+    replayer = SessionReplayer(path, speed=0)
+    for event in replayer.events:
+        count, duration = totals.get(event["call"], (0, 0.0))
+        totals[event["call"]] = (count + 1, duration + event["duration"])
+    lines = [f"{path}: {len(replayer.events)} calls"]
+    lines += [f"  {call:<32} {count:>5} {duration:>8.2f}s"
+              for call, (count, duration) in sorted(totals.items(), key=lambda item: -item[1][1])]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import sys
+    for session_path in sys.argv[1:]:
+        print(summarize_session(session_path))
@@ -0,0 +1,188 @@
+"""
+Run the stages of a flow as a dependency graph, each as soon as its inputs are ready.
+
+    graph = StageGraph()
+    graph.add("email", capture_email)
+    graph.add("erp", download_erp)
+    graph.add("order", extract_order, "email")              # extract_order(email)
+    graph.add("entry", enter_order, "order", "erp")         # enter_order(order, erp)
+    results = await graph.run()
+    print(graph.report())
+
+A stage is a coroutine function that gets the results of its dependencies as arguments, in the
+order they were listed. A stage fails if it raises or returns None (the convention of the
+client and of the flows' helpers); its dependents are cancelled then. So are the stages that
+only fed cancelled stages: if the email can't be opened, a running ERP download is stopped
+because nothing needs it anymore.
+
+report() shows the critical path, the chain of stages that set the end-to-end latency, and for
+the other stages how much later they could have finished without delaying the flow (slack).
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class Stage:
+    """One stage of a StageGraph, with its outcome and timing (seconds since the start of the graph)."""
+    def __init__(self, name: str, run: Callable[..., Awaitable[Any]], dependencies: List["Stage"]):
+        self.name = name
+        self.run = run
+        self.dependencies = dependencies
+        self.dependents: List["Stage"] = []
+        self.status = PENDING
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def duration(self) -> float:
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+
+class StageGraph:
+    """Stages with dependencies, run concurrently as early as their dependencies allow."""
+    def __init__(self):
+        self.stages: Dict[str, Stage] = {}
+        self.elapsed = 0.0
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._doomed: Set[str] = set()
+        self._start = 0.0
+
+    def add(self, name: str, run: Callable[..., Awaitable[Any]], *dependencies: str) -> None:
+        """Add a stage; its dependencies must have been added before (which also rules out cycles)."""
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' was added twice")
+        unknown = [dependency for dependency in dependencies if dependency not in self.stages]
+        if unknown:
+            raise ValueError(f"Stage '{name}' depends on unknown stage(s) {', '.join(unknown)}; add them first")
+        stage = Stage(name, run, [self.stages[dependency] for dependency in dependencies])
+        for dependency in stage.dependencies:
+            dependency.dependents.append(stage)
+        self.stages[name] = stage
+
+    def _now(self) -> float:
+        return time.perf_counter() - self._start
+
+    async def run(self) -> Dict[str, Any]:
+        """Run all stages. Returns the results of the stages that succeeded, by name."""
+        self._start = time.perf_counter()
+        self._doomed = set()
+        self._tasks = {name: asyncio.create_task(self._run_stage(stage), name=f"stage: {name}")
+                       for name, stage in self.stages.items()}
+        try:
+            outcomes = await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        finally:
+            for task in self._tasks.values():
+                task.cancel()
+            self.elapsed = self._now()
+        for stage, outcome in zip(self.stages.values(), outcomes):
+            if isinstance(outcome, asyncio.CancelledError) and stage.name in self._doomed:
+                # Cancelled before it started, so _run_stage() couldn't record it
+                stage.status, stage.error = CANCELLED, stage.error or "not needed anymore"
+            elif isinstance(outcome, BaseException):
+                raise outcome
+        return {name: stage.result for name, stage in self.stages.items() if stage.status == DONE}
+
+    async def _run_stage(self, stage: Stage) -> None:
+        try:
+            if stage.dependencies:
+                # asyncio.wait() doesn't cancel the dependencies when this stage is cancelled
+                await asyncio.wait([self._tasks[dependency.name] for dependency in stage.dependencies])
+            missing = next((dependency for dependency in stage.dependencies if dependency.status != DONE), None)
+            if missing:
+                stage.status, stage.error = CANCELLED, f"{missing.name} {missing.status}"
+                return
+            stage.status, stage.started_at = RUNNING, self._now()
+            stage.result = await stage.run(*(dependency.result for dependency in stage.dependencies))
+            if stage.result is None:
+                stage.status, stage.error = FAILED, "no result"
+            else:
+                stage.status = DONE
+        except asyncio.CancelledError:
+            if stage.name not in self._doomed:
+                raise
+            stage.status, stage.error = CANCELLED, stage.error or "not needed anymore"
+        except Exception as ex:
+            stage.status, stage.error = FAILED, f"{ex.__class__.__name__}: {ex}"
+            print(f"Stage '{stage.name}' failed: {stage.error}")
+        finally:
+            if stage.started_at is not None:
+                stage.finished_at = self._now()
+        if stage.status != DONE:
+            self._give_up(stage)
+
+    def _give_up(self, stage: Stage) -> None:
+        """Cancel the dependents of a stage that didn't succeed, and the stages only they needed."""
+        doomed = {stage.name}
+        pending = list(stage.dependents)
+        while pending:
+            dependent = pending.pop()
+            if dependent.name not in doomed:
+                doomed.add(dependent.name)
+                dependent.error = dependent.error or f"{stage.name} {stage.status}"
+                pending.extend(dependent.dependents)
+        self._doomed |= doomed
+        changed = True
+        while changed:
+            changed = False
+            for other in self.stages.values():
+                if (other.name not in self._doomed and other.dependents
+                        and all(dependent.name in self._doomed for dependent in other.dependents)):
+                    self._doomed.add(other.name)
+                    changed = True
+        for name in self._doomed - {stage.name}:
+            task = self._tasks.get(name)
+            if task and not task.done():
+                task.cancel()
+
+    def critical_path(self) -> List[Stage]:
+        """The chain of stages that ended last: each one waited for the dependency that finished last."""
+        finished = [stage for stage in self.stages.values() if stage.finished_at is not None]
+        if not finished:
+            return []
+        path = [max(finished, key=lambda stage: stage.finished_at)]
+        while True:
+            finished_dependencies = [stage for stage in path[-1].dependencies if stage.finished_at is not None]
+            if not finished_dependencies:
+                break
+            path.append(max(finished_dependencies, key=lambda stage: stage.finished_at))
+        return list(reversed(path))
+
+    def _latest_finish(self, stage: Stage) -> float:
+        """The latest the stage could have finished without delaying the end of the graph."""
+        dependents = [dependent for dependent in stage.dependents if dependent.finished_at is not None]
+        if not dependents:
+            return self.elapsed
+        return min(self._latest_finish(dependent) - dependent.duration for dependent in dependents)
+
+    def _slack(self, stage: Stage) -> float:
+        return max(0.0, self._latest_finish(stage) - stage.finished_at)
+
+    def report(self) -> str:
+        path = self.critical_path()
+        lines = [f"Critical path ({self.elapsed:.2f}s end-to-end):"]
+        for stage in path:
+            share = stage.duration / self.elapsed if self.elapsed > 0 else 0.0
+            lines.append(f"  {stage.name:<14} {stage.started_at:6.2f}s - {stage.finished_at:6.2f}s "
+                         f"{stage.duration:6.2f}s {share:4.0%}" + (f"  ({stage.status}: {stage.error})" if stage.error else ""))
+        others = [stage for stage in self.stages.values() if stage not in path]
+        if others:
+            lines.append("Other stages:")
+        for stage in others:
+            if stage.finished_at is None:
+                lines.append(f"  {stage.name:<14} {stage.status}: {stage.error}")
+                continue
+            lines.append(f"  {stage.name:<14} {stage.started_at:6.2f}s - {stage.finished_at:6.2f}s "
+                         f"{stage.duration:6.2f}s  slack {self._slack(stage):.2f}s"
+                         + (f"  ({stage.status}: {stage.error})" if stage.error else ""))
+        return "\n".join(lines)
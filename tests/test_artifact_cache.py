@@ -0,0 +1,83 @@
+"""ArtifactCache against FakeArtifactServer: cache hits, verified downloads and resumed downloads."""
+import asyncio
+import hashlib
+import json
+import os
+
+import pytest
+
+from artifact_cache import ArtifactCache, DownloadError
+from fake_agent import FakeArtifactServer
+
+CONTENT = b"MZ" + bytes(range(256)) * 1024
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+
+def fetch(cache: ArtifactCache, url: str, sha256=None) -> str:
+    return asyncio.run(cache.fetch("mini-erp-mock.exe", url, sha256=sha256))
+
+
+def test_download_then_cache_hit_without_request(tmp_path):
+    cache = ArtifactCache(str(tmp_path))
+    with FakeArtifactServer(CONTENT) as server:
+        path = fetch(cache, server.url, SHA256)
+        assert fetch(cache, server.url, SHA256) == path
+    assert len(server.requests) == 1
+    with open(path, "rb") as f:
+        assert f.read() == CONTENT
+    with open(path + ".json", "r", encoding="utf-8") as f:
+        assert json.load(f)["sha256"] == SHA256
+
+
+def test_changed_cached_file_is_downloaded_again(tmp_path):
+    cache = ArtifactCache(str(tmp_path))
+    with FakeArtifactServer(CONTENT) as server:
+        path = fetch(cache, server.url)
+        with open(path, "r+b") as f:
+            f.write(b"XX")  # Same size, different content
+        assert cache.cached("mini-erp-mock.exe", server.url) is None
+        fetch(cache, server.url)
+    assert len(server.requests) == 2
+    with open(path, "rb") as f:
+        assert f.read() == CONTENT
+
+
+def test_other_url_is_a_miss(tmp_path):
+    cache = ArtifactCache(str(tmp_path))
+    with FakeArtifactServer(CONTENT) as server:
+        fetch(cache, server.url)
+        assert cache.cached("mini-erp-mock.exe", server.url + "?v=2") is None
+
+
+def test_interrupted_download_is_resumed(tmp_path):
+    cache = ArtifactCache(str(tmp_path))
+    with FakeArtifactServer(CONTENT, interruptions=1) as server:
+        path = fetch(cache, server.url, SHA256)
+    assert len(server.requests) == 2
+    assert "Range" not in server.requests[0]
+    offset = int(server.requests[1]["Range"][len("bytes="):-1])
+    assert 0 < offset < len(CONTENT)
+    assert server.requests[1]["If-Range"] == server.etag
+    with open(path, "rb") as f:
+        assert f.read() == CONTENT
+
+
+def test_changed_file_on_the_server_restarts_the_download(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_attempts=1)
+    new_content = CONTENT[::-1]
+    with FakeArtifactServer(CONTENT, interruptions=1) as server:
+        with pytest.raises(DownloadError):
+            fetch(cache, server.url)
+        # A new version with another ETag: the If-Range doesn't match, the whole file is sent
+        server.content, server.etag = new_content, '"v2"'
+        path = fetch(cache, server.url)
+    with open(path, "rb") as f:
+        assert f.read() == new_content
+
+
+def test_checksum_mismatch_keeps_nothing(tmp_path):
+    cache = ArtifactCache(str(tmp_path))
+    with FakeArtifactServer(CONTENT) as server:
+        with pytest.raises(DownloadError, match="Checksum mismatch"):
+            fetch(cache, server.url, "0" * 64)
+    assert os.listdir(tmp_path) == []
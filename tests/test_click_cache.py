@@ -0,0 +1,98 @@
+"""ClickCache on the fake desktop: vision lookups on a miss, plain clicks on a hit, refresh on a changed screen."""
+import base64
+import io
+import os
+
+import pytest
+
+from click_cache import ClickCache, ClickCacheClient
+from fake_agent import SCREEN_SIZE, CallRecorder, FakeDesktop, FakeSmoothOperatorClient
+
+Image = pytest.importorskip("PIL.Image")
+
+
+@pytest.fixture
+def calculator():
+    desktop = FakeDesktop()
+    desktop._show("calculator")
+    recorder = CallRecorder()
+    client = FakeSmoothOperatorClient(desktop=desktop, recorder=recorder, latency_scale=0)
+    return desktop, recorder, client
+
+
+def call_names(recorder: CallRecorder):
+    return [call_name for call_name, _ in recorder.take()]
+
+
+def test_miss_then_hit(calculator, tmp_path):
+    desktop, recorder, client = calculator
+    cache = ClickCache(path=str(tmp_path / "clicks.json"))
+    cached = ClickCacheClient(client, cache)
+
+    assert cached.mouse.click_by_description("the equals sign").success
+    calls = call_names(recorder)
+    assert calls.count("screenshot.find_ui_element") == 1
+    # The screen is read once, alongside the vision lookup
+    assert calls.count("system.get_overview") == 1
+    assert cache.misses == 1 and len(cache) == 1
+
+    saved = os.path.getmtime(cache.path)
+    assert cached.mouse.click_by_description("The equals  sign").success
+    calls = call_names(recorder)
+    assert "screenshot.find_ui_element" not in calls
+    assert "mouse.click" in calls
+    assert cache.hits == 1
+    # Hits are written at exit, not per click
+    assert os.path.getmtime(cache.path) == saved and cache._changed
+    cache.flush()
+    assert not cache._changed
+
+
+def test_entries_are_loaded_from_the_file(calculator, tmp_path):
+    desktop, recorder, client = calculator
+    path = str(tmp_path / "clicks.json")
+    ClickCacheClient(client, ClickCache(path=path)).mouse.click_by_description("the equals sign")
+    recorder.take()
+
+    cache = ClickCache(path=path)
+    ClickCacheClient(client, cache).mouse.click_by_description("the equals sign")
+    assert cache.hits == 1
+    assert "screenshot.find_ui_element" not in call_names(recorder)
+
+
+def test_changed_screen_is_looked_up_again(calculator, tmp_path):
+    desktop, recorder, client = calculator
+    cache = ClickCache(path=str(tmp_path / "clicks.json"))
+    cached = ClickCacheClient(client, cache)
+    cached.mouse.click_by_description("the equals sign")
+    recorder.take()
+
+    buffer = io.BytesIO()
+    Image.new("RGB", SCREEN_SIZE, (0, 0, 0)).save(buffer, format="PNG")
+    desktop.screenshot_base64 = base64.b64encode(buffer.getvalue()).decode("ascii")
+    assert cached.mouse.click_by_description("the equals sign").success
+    assert cache.mismatches == 1 and cache.hits == 0
+    assert call_names(recorder).count("screenshot.find_ui_element") == 1
+
+
+def test_failing_screenshot_still_clicks(calculator, tmp_path):
+    desktop, recorder, client = calculator
+    cache = ClickCache(path=str(tmp_path / "clicks.json"))
+    cached = ClickCacheClient(client, cache)
+
+    def screenshot_fails():
+        raise ConnectionError("screenshot failed")
+
+    desktop.screenshot_take = screenshot_fails
+    # Miss: the vision lookup succeeds, the click goes ahead without an entry
+    assert cached.mouse.click_by_description("the equals sign").success
+    assert "mouse.click" in call_names(recorder) and len(cache) == 0
+
+    del desktop.screenshot_take
+    cached.mouse.click_by_description("the equals sign")
+    assert len(cache) == 1
+    recorder.take()
+    # Entry, but the screen can't be read: click_by_description() as without the cache
+    desktop.screenshot_base64 = base64.b64encode(b"not an image").decode("ascii")
+    assert cached.mouse.click_by_description("the equals sign").success
+    assert "mouse.click_by_description" in call_names(recorder)
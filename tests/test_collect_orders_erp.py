@@ -0,0 +1,67 @@
+"""Clean-up of the email-to-ERP flow: the server, the ledger and a running order stream are stopped on errors."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import benchmark
+import collect_orders_erp
+from collect_orders_erp import OrderStream
+from fake_agent import FakeDesktop, FakeSmoothOperatorClient
+
+
+class StoppedClient(FakeSmoothOperatorClient):
+    stopped = 0
+
+    def stop_server(self) -> None:
+        StoppedClient.stopped += 1
+
+
+def test_server_is_stopped_when_the_stages_raise(monkeypatch):
+    async def interrupted(self):
+        raise KeyboardInterrupt
+
+    desktop = FakeDesktop()
+    monkeypatch.setattr(collect_orders_erp, "SmoothOperatorClient",
+                        lambda api_key=None, base_url=None: StoppedClient(desktop=desktop, latency_scale=0))
+    monkeypatch.setattr(collect_orders_erp.StageGraph, "run", interrupted)
+    closed = []
+    monkeypatch.setattr(collect_orders_erp.OrderLedger, "close", lambda self: closed.append(self))
+    StoppedClient.stopped = 0
+    with benchmark.fake_environment(0):
+        with pytest.raises(KeyboardInterrupt):
+            asyncio.run(collect_orders_erp.run_collect_orders_erp())
+    assert StoppedClient.stopped == 1
+    assert len(closed) == 1
+
+
+class HangingOps:
+    """Streams one piece of the order, then waits forever."""
+    def __init__(self):
+        self.cancelled = False
+
+    async def _stream(self):
+        yield '{"customerName": "Smith & Co. Ltd.",'
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+    def chat_stream(self, priority=None, **kwargs):
+        return self._stream()
+
+
+def test_closing_an_order_stream_stops_the_extraction():
+    async def run():
+        ops = HangingOps()
+        stream = OrderStream(ops, SimpleNamespace(text="New order", screenshot=None))
+        events = stream.events()
+        assert await events.__anext__() == ("customer", "Smith & Co. Ltd.")
+        await stream.close()
+        assert stream._task.done()
+        # The consumer of the events isn't left waiting
+        assert [event async for event in events] == []
+        return ops
+
+    assert asyncio.run(run()).cancelled
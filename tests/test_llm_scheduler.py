@@ -0,0 +1,112 @@
+"""LlmScheduler against FakeOpenAI: retries, priorities and the answers from the LlmCache."""
+import asyncio
+import time
+
+import pytest
+
+from fake_agent import FakeApiError, FakeOpenAI, LatencyModel
+from llm_cache import LlmCache
+from llm_scheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE, LlmScheduler
+
+FAST = {"openai.chat": LatencyModel(0.05, spread=0)}
+
+
+def request(text: str):
+    return {"model": "gpt-4o", "messages": [{"role": "user", "content": text}]}
+
+
+def prompts(openai_client: FakeOpenAI):
+    return [kwargs["messages"][0]["content"] for kwargs in openai_client.requests]
+
+
+def test_retries_rate_limits_and_server_errors():
+    openai_client = FakeOpenAI(FAST, errors=[FakeApiError(429, retry_after=0.01), FakeApiError(503)])
+    scheduler = LlmScheduler(openai_client=openai_client, base_delay=0.01)
+    completion = asyncio.run(scheduler.chat(**request("What does the calculator display?")))
+    assert completion.choices[0].message.content == "The calculator displays 7."
+    assert (scheduler.requests, scheduler.retries, scheduler.failures) == (3, 2, 0)
+
+
+def test_retry_after_is_honored():
+    openai_client = FakeOpenAI(FAST, errors=[FakeApiError(429, retry_after=0.3)])
+    scheduler = LlmScheduler(openai_client=openai_client, base_delay=0.0)
+    start_time = time.perf_counter()
+    asyncio.run(scheduler.chat(**request("calculator")))
+    assert time.perf_counter() - start_time >= 0.3
+
+
+def test_client_errors_are_not_retried():
+    openai_client = FakeOpenAI(FAST, errors=[FakeApiError(400)])
+    scheduler = LlmScheduler(openai_client=openai_client, base_delay=0.01)
+    with pytest.raises(FakeApiError):
+        asyncio.run(scheduler.chat(**request("calculator")))
+    assert (scheduler.requests, scheduler.retries, scheduler.failures) == (1, 0, 1)
+
+
+def test_gives_up_after_max_retries():
+    openai_client = FakeOpenAI(FAST, errors=[FakeApiError(500)] * 3)
+    scheduler = LlmScheduler(openai_client=openai_client, max_retries=2, base_delay=0.01)
+    with pytest.raises(FakeApiError):
+        asyncio.run(scheduler.chat(**request("calculator")))
+    assert (scheduler.requests, scheduler.retries, scheduler.failures) == (3, 2, 1)
+
+
+def test_interactive_requests_go_ahead_of_queued_batch_work():
+    openai_client = FakeOpenAI(FAST)
+    scheduler = LlmScheduler(openai_client=openai_client, max_concurrency=1)
+
+    async def run():
+        first = asyncio.create_task(scheduler.chat(PRIORITY_BATCH, **request("batch 1")))
+        await asyncio.sleep(0.01)  # The first request holds the only slot
+        queued = [asyncio.create_task(scheduler.chat(PRIORITY_BATCH, **request("batch 2"))),
+                  asyncio.create_task(scheduler.chat(PRIORITY_BATCH, **request("batch 3")))]
+        await asyncio.sleep(0.01)
+        interactive = asyncio.create_task(scheduler.chat(PRIORITY_INTERACTIVE, **request("interactive")))
+        await asyncio.gather(first, interactive, *queued)
+
+    asyncio.run(run())
+    assert prompts(openai_client) == ["batch 1", "interactive", "batch 2", "batch 3"]
+
+
+def test_cache_hit_skips_the_request(tmp_path):
+    openai_client = FakeOpenAI(FAST)
+    cache = LlmCache(path=str(tmp_path / "cache.sqlite3"))
+    scheduler = LlmScheduler(openai_client=openai_client, cache=cache)
+
+    async def run():
+        first = await scheduler.chat(**request("calculator"))
+        second = await scheduler.chat(**request("calculator"))
+        await scheduler.chat(**request("calculator, again"))
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert second.choices[0].message.content == first.choices[0].message.content
+    assert prompts(openai_client) == ["calculator", "calculator, again"]
+    assert (cache.hits, cache.misses, cache.stores) == (1, 2, 2)
+
+
+def test_expired_cache_entries_are_requested_again(tmp_path):
+    openai_client = FakeOpenAI(FAST)
+    cache = LlmCache(path=str(tmp_path / "cache.sqlite3"), ttl=0.1)
+    scheduler = LlmScheduler(openai_client=openai_client, cache=cache)
+
+    async def run():
+        await scheduler.chat(**request("calculator"))
+        await asyncio.sleep(0.2)
+        await scheduler.chat(**request("calculator"))
+
+    asyncio.run(run())
+    assert len(openai_client.requests) == 2
+    assert (cache.hits, cache.expired) == (0, 1)
+
+
+def test_streamed_requests_bypass_the_cache(tmp_path):
+    openai_client = FakeOpenAI(FAST)
+    cache = LlmCache(path=str(tmp_path / "cache.sqlite3"))
+    scheduler = LlmScheduler(openai_client=openai_client, cache=cache)
+
+    async def run():
+        return "".join([piece async for piece in scheduler.chat_stream(**request("calculator"))])
+
+    assert asyncio.run(run()) == "The calculator displays 7."
+    assert (cache.hits, cache.misses, cache.stores) == (0, 0, 0)
@@ -0,0 +1,76 @@
+"""Email fingerprints of the order ledger: stable across captures of one email, distinct between emails."""
+from order_ledger import ENTERED, OrderLedger, email_fingerprint, email_header
+
+BODY = """Dear you,
+I just visited our customer Smith & Co. Ltd. {number}.
+They want to order:
+- Product Name: High-Speed Router X200
+  Quantity: 5 units
+  Price per unit: 120.00
+Best regards,
+John Doe"""
+
+
+def gmail_capture(number=1, unread=12, age="2 hours ago"):
+    return f"""Gmail
+Inbox {unread}
+Starred
+New Computerstuff.com Order
+Inbox
+John Doe <orders@computerstuff.com>
+Mon, Oct 14, 2024, 2:35 PM ({age})
+to me
+{BODY.format(number=number)}
+Reply
+Forward"""
+
+
+def outlook_capture(number=1, unread=3, newest="Your parcel is on its way"):
+    # Folder pane, message list (with the previews of the other emails), reading pane
+    return f"""Inbox
+{unread}
+Sent Items
+Search results
+{newest}
+Parcel Service
+9:41
+Dear customer, your parcel...
+New Computerstuff.com Order
+John Doe
+Yesterday
+Dear you, I just visited our customer Smith & Co. Ltd. {number + 1}...
+New Computerstuff.com Order
+John Doe
+Mon 10/14
+Dear you, I just visited our customer Smith & Co. Ltd. {number}...
+New Computerstuff.com Order
+John Doe <orders@computerstuff.com>
+Mon 10/14/2024 2:35 PM
+{BODY.format(number=number)}"""
+
+
+def test_gmail_capture_with_other_counters_and_times():
+    assert email_fingerprint(gmail_capture()) == email_fingerprint(gmail_capture(unread=15, age="1 day ago"))
+    assert email_fingerprint(gmail_capture()) != email_fingerprint(gmail_capture(number=2))
+
+
+def test_outlook_capture_with_another_message_list():
+    assert email_fingerprint(outlook_capture()) == email_fingerprint(outlook_capture(unread=7, newest="Meeting notes"))
+    assert email_fingerprint(outlook_capture()) != email_fingerprint(outlook_capture(number=2))
+
+
+def test_header_is_read_from_the_opened_email():
+    assert email_header(outlook_capture()) == {"subject": "New Computerstuff.com Order",
+                                               "sender": "orders@computerstuff.com", "date": "2:35 PM"}
+
+
+def test_rerun_finds_the_entered_email(tmp_path):
+    ledger = OrderLedger(str(tmp_path / "orders.sqlite3"))
+    first = gmail_capture()
+    ledger.seen(email_fingerprint(first), first)
+    ledger.entering(email_fingerprint(first))
+    ledger.entered(email_fingerprint(first))
+
+    rerun = gmail_capture(unread=13, age="3 hours ago")
+    assert ledger.seen(email_fingerprint(rerun), rerun).stage == ENTERED
+    ledger.close()
@@ -0,0 +1,43 @@
+"""Local order parser: the known email format is read confidently, anything doubtful goes to the LLM."""
+from order_parser import parse_order_text
+
+ORDER = """Dear you,
+I just visited our customer {customer}
+They want to order:
+- Product Name: High-Speed Router X200
+  Quantity: 5 units
+  Price per unit: 120.00
+- Product Name: Cat6 Cable 10m
+  Quantity: 1,000
+  Price per unit: 2,50
+Best regards,
+John Doe"""
+
+
+def test_known_format():
+    parsed = parse_order_text(ORDER.format(customer="Smith & Co. Ltd."))
+    assert parsed.confident and not parsed.problems
+    assert parsed.order == {"customerName": "Smith & Co. Ltd.", "orderedArticles": [
+        {"articleName": "High-Speed Router X200", "quantity": 5, "pricePerUnit": 120.0},
+        {"articleName": "Cat6 Cable 10m", "quantity": 1000, "pricePerUnit": 2.5}]}
+
+
+def test_customer_name_ends_with_its_sentence():
+    for customer in ("Smith & Co. Ltd. today. The customer was happy.", "Smith & Co. Ltd. today!",
+                     "Smith & Co. Ltd.. They were happy."):
+        parsed = parse_order_text(ORDER.format(customer=customer))
+        assert parsed.order["customerName"] == "Smith & Co. Ltd.", customer
+    assert parse_order_text(ORDER.format(customer="Miller Bros.")).order["customerName"] == "Miller Bros."
+    assert parse_order_text(ORDER.format(customer="Bank of Scotland.")).confident
+
+
+def test_customer_name_with_trailing_text_goes_to_the_llm():
+    parsed = parse_order_text(ORDER.format(customer="Smith & Co. Ltd. Today they were happy"))
+    assert not parsed.confident
+    assert "may include other text" in parsed.report()
+
+
+def test_missing_price_lowers_the_confidence():
+    parsed = parse_order_text(ORDER.format(customer="Smith & Co. Ltd.").replace("  Price per unit: 120.00\n", ""))
+    assert not parsed.confident
+    assert parsed.order["orderedArticles"] == [{"articleName": "Cat6 Cable 10m", "quantity": 1000, "pricePerUnit": 2.5}]
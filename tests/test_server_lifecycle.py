@@ -0,0 +1,123 @@
+"""Leases on the shared server and its idle stop, against the fake server of fake_agent.py."""
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import server_lifecycle
+from fake_agent import launch_fake_agent_server
+from server_lifecycle import ServerManager, SharedServerClient, ping, shared_server
+
+IDLE_TIMEOUT = 1.0
+
+
+@pytest.fixture
+def new_manager(tmp_path):
+    """Creates the managers of simulated scripts sharing one state directory; the server is stopped afterwards."""
+    managers = []
+
+    def create() -> ServerManager:
+        manager = ServerManager(idle_timeout=IDLE_TIMEOUT, state_dir=str(tmp_path), launcher=launch_fake_agent_server)
+        managers.append(manager)
+        return manager
+
+    yield create
+    if managers:
+        managers[0].stop()
+
+
+def live_leases(manager: ServerManager):
+    with manager._file_lock():
+        return manager.live_leases()
+
+
+def test_cold_start_then_attach(new_manager):
+    first, second = new_manager(), new_manager()
+    base_url = first.acquire()
+    assert first.mode == "cold start"
+    assert ping(base_url)
+    assert second.acquire() == base_url
+    assert second.mode == "attached"
+    assert len(live_leases(first)) == 2
+
+
+def test_references_within_a_process_share_one_lease(new_manager):
+    manager = new_manager()
+    base_url = manager.acquire()
+    assert manager.acquire() == base_url
+    assert manager.mode == "shared"
+    manager.release()
+    assert len(live_leases(manager)) == 1
+    manager.release()
+    assert live_leases(manager) == []
+
+
+def test_idle_server_is_stopped_after_the_last_release(new_manager):
+    first, second = new_manager(), new_manager()
+    base_url = first.acquire()
+    second.acquire()
+    first.release()
+    time.sleep(IDLE_TIMEOUT * 2)
+    # Still leased by the second script
+    assert first.read_state() is not None
+    second.release()
+    deadline = time.monotonic() + IDLE_TIMEOUT + 10
+    while first.read_state() is not None and time.monotonic() < deadline:
+        time.sleep(0.2)
+    assert first.read_state() is None
+    assert not ping(base_url, timeout=0.5)
+
+
+def test_lease_of_an_exited_process_is_removed(new_manager):
+    manager = new_manager()
+    manager.acquire()
+    exited = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                            capture_output=True, text=True, check=True)
+    stale_lease = os.path.join(manager._leases_dir, f"{exited.stdout.strip()}-deadbeef")
+    open(stale_lease, "w").close()
+    assert len(live_leases(manager)) == 1
+    assert not os.path.exists(stale_lease)
+
+
+class RecordingClient:
+    """Client class that records its constructor arguments."""
+    def __init__(self, api_key=None, base_url=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.screenshot = self
+
+    def take(self):
+        return "screenshot"
+
+
+def test_shared_server_creates_the_client_with_the_server_url(new_manager, monkeypatch):
+    monkeypatch.delenv("SMOOTH_OPERATOR_SHARED_SERVER", raising=False)
+    monkeypatch.setattr(server_lifecycle, "SmoothOperatorClient", RecordingClient)
+    monkeypatch.setattr(server_lifecycle, "_shared_manager", new_manager())
+    client = shared_server(RecordingClient, "key")
+    assert isinstance(client, SharedServerClient)
+    with pytest.raises(RuntimeError):
+        client.screenshot.take()
+    client.start_server()
+    try:
+        assert client.client.api_key == "key"
+        assert client.client.base_url == client.base_url
+        assert ping(client.base_url)
+        assert client.screenshot.take() == "screenshot"
+    finally:
+        client.stop_server()
+
+
+def test_shared_server_is_not_used_with_a_base_url_or_another_class(monkeypatch):
+    monkeypatch.delenv("SMOOTH_OPERATOR_SHARED_SERVER", raising=False)
+    monkeypatch.setattr(server_lifecycle, "SmoothOperatorClient", RecordingClient)
+    client = shared_server(RecordingClient, "key", "http://localhost:54321")
+    assert isinstance(client, RecordingClient)
+    assert client.base_url == "http://localhost:54321"
+
+    class OtherClient(RecordingClient):
+        pass
+
+    assert isinstance(shared_server(OtherClient, "key"), OtherClient)
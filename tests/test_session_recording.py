@@ -0,0 +1,37 @@
+"""Round trip of a recorded session through the benchmark: record the orders flow, then replay it."""
+import json
+
+import pytest
+
+import benchmark
+import session_recording
+from session_recording import SessionReplayer
+
+FAST = ["--flows", "orders", "--iterations", "1", "--latency-scale", "0.05", "--sleep-scale", "0"]
+
+
+@pytest.fixture(autouse=True)
+def no_session():
+    yield
+    if isinstance(session_recording._session, session_recording.SessionRecorder):
+        session_recording._session.close()
+    session_recording._session = None
+
+
+def test_recorded_orders_flow_replays_every_call(tmp_path):
+    session_path = str(tmp_path / "orders.jsonl")
+    assert benchmark.main(FAST + ["--record", session_path]) == 0
+    session_recording._session.close()
+    session_recording._session = None
+    recorded = SessionReplayer(session_path).events
+    assert any(event["type"] == "client" for event in recorded)
+
+    results_path = str(tmp_path / "results.json")
+    assert benchmark.main(FAST + ["--replay", session_path, "--replay-speed", "0", "--json", results_path]) == 0
+    with open(results_path, "r", encoding="utf-8") as f:
+        assert json.load(f)["orders"]["failures"] == 0
+    replayer = session_recording._session
+    assert replayer.missing == 0
+    # Only system.open_application differs: the ERP download is in the fresh temp directory of each run
+    assert replayer.unmatched <= 1
+    assert replayer.replayed == len(recorded)
@@ -0,0 +1,49 @@
+"""StageGraph: results by dependency, and cancelling what a failed stage leaves without use."""
+import asyncio
+
+from stage_graph import CANCELLED, DONE, FAILED, StageGraph
+
+
+async def value(result, delay=0.0):
+    await asyncio.sleep(delay)
+    return result
+
+
+def test_stages_get_the_results_of_their_dependencies():
+    graph = StageGraph()
+    graph.add("email", lambda: value("email"))
+    graph.add("erp", lambda: value("erp", 0.01))
+    graph.add("entry", lambda email, erp: value(f"{email}+{erp}"), "email", "erp")
+    results = asyncio.run(graph.run())
+    assert results["entry"] == "email+erp"
+    assert [stage.name for stage in graph.critical_path()] == ["erp", "entry"]
+    assert "Critical path" in graph.report()
+
+
+def test_root_failing_before_a_sibling_started():
+    async def download_fails():
+        raise RuntimeError("download failed")
+
+    graph = StageGraph()
+    graph.add("erp download", download_fails)
+    # Only needed by "erp launch", so it is cancelled before it ever runs
+    graph.add("email", lambda: value("email", 1.0))
+    graph.add("erp launch", lambda erp, email: value("launched"), "erp download", "email")
+    assert asyncio.run(graph.run()) == {}
+    assert graph.stages["erp download"].status == FAILED
+    assert graph.stages["email"].status == CANCELLED
+    assert graph.stages["erp launch"].status == CANCELLED
+    assert graph.elapsed < 0.5
+    graph.report()
+
+
+def test_stage_returning_none_fails_its_dependents_only():
+    graph = StageGraph()
+    graph.add("order", lambda: value(None))
+    graph.add("entry", lambda order: value("entered"), "order")
+    graph.add("screenshot", lambda: value("png", 0.01))
+    results = asyncio.run(graph.run())
+    assert results == {"screenshot": "png"}
+    assert graph.stages["order"].status == FAILED
+    assert graph.stages["entry"].status == CANCELLED
+    assert graph.stages["screenshot"].status == DONE
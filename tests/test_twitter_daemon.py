@@ -0,0 +1,66 @@
+"""TwitterDaemon on the fake desktop: a failed poll doesn't break the next ones."""
+import asyncio
+
+import pytest
+from smooth_operator_agent_tools import ExistingChromeInstanceStrategy
+
+import benchmark
+from async_operator import AsyncSmoothOperator
+from fake_agent import FakeDesktop, FakeSmoothOperatorClient
+from tweet_store import TweetStore
+from twitter_daemon import TwitterDaemon
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    desktop = FakeDesktop()
+    client = FakeSmoothOperatorClient(desktop=desktop, latency_scale=0)
+    ops = AsyncSmoothOperator(client)
+    store = TweetStore(str(tmp_path / "tweets.sqlite3"))
+    opened = []
+    open_chrome = desktop.chrome_open_chrome
+
+    def counting_open_chrome(url=None, strategy=None):
+        opened.append(strategy)
+        return open_chrome(url, strategy)
+
+    desktop.chrome_open_chrome = counting_open_chrome
+    with benchmark.fake_environment(0):
+        yield TwitterDaemon(ops, ["sama"], store, min_interval=0, max_interval=0, report_every=100), desktop, opened
+    ops.close()
+    store.close()
+
+
+def test_poll_after_a_failed_one_uses_the_open_browser(daemon, monkeypatch):
+    daemon, desktop, opened = daemon
+    ingest = daemon.tweet_store.ingest
+    calls = []
+
+    def ingest_failing_once(account, page_text):
+        calls.append(account)
+        if len(calls) == 1:
+            raise ValueError("unexpected timeline layout")
+        return ingest(account, page_text)
+
+    monkeypatch.setattr(daemon.tweet_store, "ingest", ingest_failing_once)
+    asyncio.run(daemon.run(max_polls=3))
+    assert daemon.stats.errors == 1
+    assert daemon.schedules[0].polls == 3
+    assert daemon.schedules[0].new_tweets > 0
+    assert opened == [ExistingChromeInstanceStrategy.THROW_ERROR]
+
+
+def test_failed_navigation_reopens_chrome(daemon):
+    daemon, desktop, opened = daemon
+
+    def navigate_fails(url):
+        raise ConnectionError("Chrome is gone")
+
+    asyncio.run(daemon.run(max_polls=1))
+    desktop.chrome_navigate = navigate_fails
+    asyncio.run(daemon.run(max_polls=1))
+    assert daemon.stats.errors == 1 and not daemon.is_browser_open
+    del desktop.chrome_navigate
+    asyncio.run(daemon.run(max_polls=1))
+    assert daemon.is_browser_open
+    assert opened == [ExistingChromeInstanceStrategy.THROW_ERROR, ExistingChromeInstanceStrategy.FORCE_CLOSE]
@@ -0,0 +1,27 @@
+"""Waiting for UI conditions on the fake desktop."""
+import asyncio
+
+from async_operator import AsyncSmoothOperator
+from fake_agent import FakeDesktop, FakeSmoothOperatorClient
+from ui_wait import focused_window_titled, wait_until, window_exists
+
+
+def test_focused_window_titled():
+    desktop = FakeDesktop()
+    ops = AsyncSmoothOperator(FakeSmoothOperatorClient(desktop=desktop, latency_scale=0))
+
+    async def run():
+        assert not await wait_until(focused_window_titled(ops, "calculator"), timeout=0.2, verbose=False)
+        desktop._show("calculator")
+        desktop._show("erp")
+        # Open, but behind the ERP
+        assert await wait_until(window_exists(ops, "calculator"), timeout=0.2, verbose=False)
+        assert not await wait_until(focused_window_titled(ops, "calculator"), timeout=0.2, verbose=False)
+        desktop._show("calculator")
+        result = await wait_until(focused_window_titled(ops, "calculator"), timeout=0.2, verbose=False)
+        assert result.value.title == "Calculator"
+
+    try:
+        asyncio.run(run())
+    finally:
+        ops.close()
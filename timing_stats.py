@@ -0,0 +1,28 @@
+"""
+Latency statistics (count, mean, percentiles) for the timing reports of the examples.
+"""
+import math
+from typing import List
+
+
+class StageStats:
+    """Latencies (in seconds) measured for one stage."""
+    def __init__(self, name: str):
+        self.name = name
+        self.durations: List[float] = []
+
+    def add(self, duration: float) -> None:
+        self.durations.append(duration)
+
+    def percentile(self, percent: float) -> float:
+        if not self.durations:
+            return 0.0
+        ordered = sorted(self.durations)
+        return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+    def __str__(self) -> str:
+        if not self.durations:
+            return f"{self.name:<12} -"
+        mean = sum(self.durations) / len(self.durations)
+        return (f"{self.name:<12} n={len(self.durations):<3} mean={mean:.2f}s "
+                f"p50={self.percentile(50):.2f}s p95={self.percentile(95):.2f}s max={max(self.durations):.2f}s")
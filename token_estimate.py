@@ -0,0 +1,15 @@
+"""
+Local token estimate for prompts, without calling the API.
+
+GPT-4o averages roughly 4 characters per token for English text and JSON. That is accurate
+enough for size reports and for budgeting chunks; it is not meant for billing.
+"""
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Return the approximate number of tokens of `text`."""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
@@ -0,0 +1,316 @@
+"""
+Timed spans for the example flows, exported as JSON lines and as OpenMetrics histograms.
+
+Every SmoothOperatorClient call made through AsyncSmoothOperator (or TracedClient) and every
+OpenAI request made through the LlmScheduler is recorded as a span with its attributes
+(method, element ID, payload bytes, token usage, success). The flows open spans for their
+stages, and the call spans nest under them:
+
+    @traced("capture email")
+    async def open_order_email_in_gmail(ops, position, results_text):
+        ...
+        screenshot = await ops.screenshot.take()   # span "screenshot.take", child of "capture email"
+
+    with span("enter article", article=article.article_name):
+        await ops.automation.set_value(...)
+
+Each span records its "self time": the part of its duration not covered by child spans. For a
+stage this is the time spent in fixed sleeps and local code rather than in client or LLM calls.
+
+Export is configured with environment variables (or configure()):
+    TRACE_JSONL_PATH        every finished span is appended to this file as one JSON line
+    TRACE_OPENMETRICS_PATH  histogram summary per span name, written when the process exits
+
+The response size of client calls (response_bytes) is only recorded while spans are exported as
+JSON lines, because measuring it means serializing overviews and window trees again.
+"""
+import atexit
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Upper bounds (seconds) of the histogram buckets
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_span: contextvars.ContextVar[Optional['Span']] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed operation with attributes."""
+    def __init__(self, name: str, parent: Optional['Span'], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent = parent
+        self.attributes = dict(attributes)
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration = 0.0
+        self.child_time = 0.0
+        self.success = True
+        self.error: Optional[str] = None
+
+    def set(self, **attributes) -> None:
+        """Add attributes (None values are left out)."""
+        self.attributes.update({key: value for key, value in attributes.items() if value is not None})
+
+    def fail(self, error: str) -> None:
+        self.success = False
+        self.error = error
+
+    @property
+    def self_time(self) -> float:
+        # Concurrent children can add up to more than the span itself
+        return max(0.0, self.duration - self.child_time)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "start": self.start_time,
+            "duration_ms": round(self.duration * 1000, 3),
+            "self_ms": round(self.self_time * 1000, 3),
+            "success": self.success,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _Histogram:
+    def __init__(self):
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.self_sum = 0.0
+        self.errors = 0
+
+    def add(self, span: Span) -> None:
+        self.count += 1
+        self.sum += span.duration
+        self.self_sum += span.self_time
+        self.errors += 0 if span.success else 1
+        for index, bound in enumerate(BUCKETS):
+            if span.duration <= bound:
+                self.bucket_counts[index] += 1
+
+
+class Tracer:
+    """Collects finished spans and aggregates them per span name."""
+    def __init__(self, jsonl_path: Optional[str] = None, max_spans: int = 10000):
+        self.jsonl_path = jsonl_path
+        self.spans: deque = deque(maxlen=max_spans)
+        self.histograms: Dict[str, _Histogram] = {}
+        self.tokens: Dict[str, int] = {"prompt": 0, "completion": 0}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """Time the enclosed block as a child of the current span. Exceptions mark the span as failed."""
+        current = Span(name, _current_span.get(), attributes)
+        token = _current_span.set(current)
+        try:
+            yield current
+        except BaseException as ex:
+            current.fail(f"{ex.__class__.__name__}: {ex}")
+            raise
+        finally:
+            _current_span.reset(token)
+            current.duration = time.perf_counter() - current._start
+            self._finish(current)
+
+    @property
+    def exporting_spans(self) -> bool:
+        """Whether the attributes of single spans are written anywhere (the histograms don't use them)."""
+        return bool(self.jsonl_path)
+
+    def _finish(self, span: Span) -> None:
+        with self._lock:
+            if span.parent:
+                span.parent.child_time += span.duration
+            self.spans.append(span)
+            self.histograms.setdefault(span.name, _Histogram()).add(span)
+            self.tokens["prompt"] += span.attributes.get("prompt_tokens", 0)
+            self.tokens["completion"] += span.attributes.get("completion_tokens", 0)
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+    def openmetrics(self) -> str:
+        """Histogram summary of all finished spans in the OpenMetrics text format."""
+        def label(value: str) -> str:
+            return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            tokens = dict(self.tokens)
+        lines = ["# TYPE smooth_operator_span_duration_seconds histogram",
+                 "# UNIT smooth_operator_span_duration_seconds seconds",
+                 "# HELP smooth_operator_span_duration_seconds Duration of client calls, OpenAI requests and flow stages."]
+        for name, histogram in histograms:
+            # The bucket counts are cumulative already (see _Histogram.add())
+            for bound, count in zip(BUCKETS, histogram.bucket_counts):
+                lines.append(f'smooth_operator_span_duration_seconds_bucket{{span="{label(name)}",le="{bound}"}} {count}')
+            lines.append(f'smooth_operator_span_duration_seconds_bucket{{span="{label(name)}",le="+Inf"}} {histogram.count}')
+            lines.append(f'smooth_operator_span_duration_seconds_count{{span="{label(name)}"}} {histogram.count}')
+            lines.append(f'smooth_operator_span_duration_seconds_sum{{span="{label(name)}"}} {histogram.sum:.6f}')
+        lines += ["# TYPE smooth_operator_span_self_seconds counter",
+                  "# UNIT smooth_operator_span_self_seconds seconds",
+                  "# HELP smooth_operator_span_self_seconds Time of spans not covered by child spans (sleeps, local code)."]
+        lines += [f'smooth_operator_span_self_seconds_total{{span="{label(name)}"}} {histogram.self_sum:.6f}'
+                  for name, histogram in histograms]
+        lines += ["# TYPE smooth_operator_span_errors counter",
+                  "# HELP smooth_operator_span_errors Failed spans."]
+        lines += [f'smooth_operator_span_errors_total{{span="{label(name)}"}} {histogram.errors}'
+                  for name, histogram in histograms]
+        lines += ["# TYPE smooth_operator_llm_tokens counter",
+                  "# HELP smooth_operator_llm_tokens Tokens used by OpenAI requests."]
+        lines += [f'smooth_operator_llm_tokens_total{{kind="{kind}"}} {count}' for kind, count in tokens.items()]
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write_openmetrics(self, path: str) -> None:
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.openmetrics())
+        os.replace(temp_path, path)
+
+    def summary(self) -> str:
+        """Short table of total and self time per span name, slowest first."""
+        with self._lock:
+            histograms = sorted(self.histograms.items(), key=lambda item: -item[1].sum)
+        lines = [f"{'span':<36} {'count':>6} {'total':>9} {'self':>9} {'errors':>6}"]
+        lines += [f"{name:<36} {h.count:>6} {h.sum:>8.2f}s {h.self_sum:>8.2f}s {h.errors:>6}" for name, h in histograms]
+        return "\n".join(lines)
+
+
+tracer = Tracer(jsonl_path=os.getenv("TRACE_JSONL_PATH") or None)
+_openmetrics_path: Optional[str] = None
+
+
+def span(name: str, **attributes):
+    """Open a span on the process-wide tracer (see Tracer.span())."""
+    return tracer.span(name, **attributes)
+
+
+def traced(name: str, **attributes) -> Callable:
+    """Decorator that runs a function (or coroutine function) inside a span, e.g. for a flow stage."""
+    def decorator(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, **attributes):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def configure(jsonl_path: Optional[str] = None, openmetrics_path: Optional[str] = None) -> None:
+    """Set the export files of the process-wide tracer; the OpenMetrics file is written at exit."""
+    global _openmetrics_path
+    if jsonl_path:
+        tracer.jsonl_path = jsonl_path
+    if openmetrics_path:
+        if _openmetrics_path is None:
+            atexit.register(lambda: tracer.write_openmetrics(_openmetrics_path))
+        _openmetrics_path = openmetrics_path
+
+
+if os.getenv("TRACE_OPENMETRICS_PATH"):
+    configure(openmetrics_path=os.getenv("TRACE_OPENMETRICS_PATH"))
+
+
+# --- Attributes of client calls ---
+
+_ID_PARAMETERS = ("element_id", "window_id")
+
+
+def _payload_size(value: Any) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    image_base64 = getattr(value, "image_base64", None)
+    if image_base64:
+        return len(image_base64)
+    to_json_string = getattr(value, "to_json_string", None)
+    if to_json_string:
+        try:
+            return len(to_json_string())
+        except Exception:
+            return 0
+    return len(str(value))
+
+
+def call_attributes(call_name: str, args: tuple, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Attributes of a client call known before it runs: method, element/window ID, request size."""
+    attributes: Dict[str, Any] = {"method": call_name,
+                                  "request_bytes": sum(_payload_size(a) for a in list(args) + list(kwargs.values())
+                                                       if isinstance(a, (str, bytes)))}
+    for parameter in _ID_PARAMETERS:
+        if parameter in kwargs:
+            attributes[parameter] = kwargs[parameter]
+    # The automation and window APIs take the element or window ID as first argument
+    if args and isinstance(args[0], str) and call_name.split(".")[0] == "automation" and call_name != "automation.open_application":
+        attributes.setdefault("window_id" if "window" in call_name or call_name.endswith("bring_to_front") else "element_id", args[0])
+    elif args and isinstance(args[0], str) and call_name == "system.get_window_details":
+        attributes["window_id"] = args[0]
+    return attributes
+
+
+def record_result(current: Span, result: Any) -> None:
+    """Add the success of a client call to its span, and its response size if spans are exported."""
+    if tracer.exporting_spans:
+        current.set(response_bytes=_payload_size(result))
+    success = getattr(result, "success", None)
+    if result is None or success is False:
+        current.fail(getattr(result, "message", None) or "no response")
+
+
+class _TracedApi:
+    def __init__(self, api: Any, api_name: str):
+        self._api = api
+        self._api_name = api_name
+
+    def __getattr__(self, method_name: str):
+        method = getattr(self._api, method_name)
+        if not callable(method):
+            return method
+        call_name = f"{self._api_name}.{method_name}"
+
+        def call(*args, **kwargs):
+            with span(call_name, **call_attributes(call_name, args, kwargs)) as current:
+                result = method(*args, **kwargs)
+                record_result(current, result)
+                return result
+        return call
+
+
+class TracedClient:
+    """Wraps a (synchronous) SmoothOperatorClient so that every call is recorded as a span."""
+    def __init__(self, client: Any):
+        self._client = client
+        for api_name in ("screenshot", "system", "mouse", "keyboard", "chrome", "automation", "code"):
+            setattr(self, api_name, _TracedApi(getattr(client, api_name), api_name))
+
+    def __getattr__(self, name: str):
+        return getattr(self._client, name)
@@ -0,0 +1,115 @@
+"""
+Compaction of UI automation trees before they are sent to an LLM.
+
+The JSON produced by `to_json_string()` contains every property of every control, including
+layout panes, scroll bars and creation dates. For the questions we ask the model ("which
+element is the customer name field?", "what does the calculator display?") only a small part
+of it matters. compact_tree():
+- prunes decorative nodes (separators, images, scroll bars, the title bar, Smooth Operator's
+  own overlay) and empty containers;
+- collapses chains of unnamed containers that have a single child;
+- keeps only the properties needed to reason about a control (ID, type, name, value and
+  whether it can be set/invoked), under short keys;
+- optionally keeps only controls of the given types (e.g. Edit, Button, Text), hoisting them
+  out of the containers that are dropped.
+
+Element IDs are preserved, so the IDs the model returns can be used with the automation API.
+"""
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from token_estimate import estimate_tokens
+from ui_tree import get_field, load_tree, window_root
+
+DECORATIVE_CONTROL_TYPES = {"Separator", "Image", "ScrollBar", "Thumb", "TitleBar", "ToolTip"}
+
+
+class CompactionReport:
+    """Size of a tree before and after compaction."""
+    def __init__(self, before_bytes: int, after_bytes: int, before_tokens: int, after_tokens: int,
+                 before_nodes: int, after_nodes: int):
+        self.before_bytes = before_bytes
+        self.after_bytes = after_bytes
+        self.before_tokens = before_tokens
+        self.after_tokens = after_tokens
+        self.before_nodes = before_nodes
+        self.after_nodes = after_nodes
+
+    @property
+    def reduction_percent(self) -> float:
+        return (1 - self.after_bytes / self.before_bytes) * 100 if self.before_bytes else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.before_bytes} -> {self.after_bytes} bytes, "
+                f"~{self.before_tokens} -> ~{self.after_tokens} tokens, "
+                f"{self.before_nodes} -> {self.after_nodes} nodes ({self.reduction_percent:.0f}% smaller)")
+
+
+def _compact_node(node: Any, control_types: Optional[set]) -> List[Dict[str, Any]]:
+    """Return the compacted replacement(s) of a node: none, itself, or its hoisted descendants."""
+    control_type = get_field(node, "control_type", "")
+    if control_type in DECORATIVE_CONTROL_TYPES or get_field(node, "is_smooth_operator"):
+        return []
+
+    children = []
+    for child in get_field(node, "children", []):
+        if child is not None:
+            children.extend(_compact_node(child, control_types))
+
+    compact: Dict[str, Any] = {"id": get_field(node, "id"), "type": control_type}
+    name = get_field(node, "name")
+    value = get_field(node, "current_value")
+    if name:
+        compact["name"] = name
+    if value:
+        compact["value"] = value
+    if get_field(node, "supports_set_value"):
+        compact["set"] = True
+    if get_field(node, "supports_invoke"):
+        compact["invoke"] = True
+    if children:
+        compact["children"] = children
+
+    if control_types is not None and control_type not in control_types:
+        return children
+    is_bare = not (name or value or compact.get("set") or compact.get("invoke"))
+    if is_bare and len(children) <= 1:
+        # Unnamed container: drop it if empty, replace it by its child if it only has one
+        return children
+    return [compact]
+
+
+def _count_nodes(nodes: Iterable[Any]) -> int:
+    return sum(1 + _count_nodes(get_field(node, "children", [])) for node in nodes)
+
+
+def compact_tree(tree: Any, control_types: Optional[Iterable[str]] = None) -> Tuple[str, CompactionReport]:
+    """
+    Compact a UI automation tree for use in an LLM prompt.
+
+    Args:
+        tree: A window or control (model object, dict or `to_json_string()` output).
+        control_types: If given, only controls of these types are kept (e.g. ("Edit", "Button", "Text")).
+
+    Returns:
+        The compact JSON and a report of the size reduction.
+    """
+    if isinstance(tree, str):
+        original_json = tree
+    elif hasattr(tree, "to_json_string"):
+        original_json = tree.to_json_string()
+    else:
+        original_json = json.dumps(tree)
+    root = window_root(load_tree(original_json))
+    nodes = _compact_node(root, set(control_types) if control_types is not None else None) if root is not None else []
+    compact_json = json.dumps(nodes[0] if len(nodes) == 1 else nodes, separators=(",", ":"), ensure_ascii=False)
+
+    report = CompactionReport(
+        before_bytes=len(original_json.encode("utf-8")),
+        after_bytes=len(compact_json.encode("utf-8")),
+        before_tokens=estimate_tokens(original_json),
+        after_tokens=estimate_tokens(compact_json),
+        before_nodes=_count_nodes([root]) if root is not None else 0,
+        after_nodes=_count_nodes(nodes),
+    )
+    return compact_json, report
@@ -0,0 +1,129 @@
+"""
+Persistent store of already seen tweets, so that only new tweets are summarized.
+
+The text of a timeline page (chrome.get_text()) is split into individual tweets. Each tweet
+is identified by a hash of its author and content; volatile parts such as the relative
+timestamp ("2h") and the reply/repost/like counters are not part of the hash. The store
+keeps every seen hash plus a high-water mark per account (the newest tweet seen on the
+last visit), so a visit only returns tweets that are newer than that mark and not seen before.
+
+Usage:
+    store = TweetStore()
+    new_tweets = store.ingest("kimmonismus", response.result_value)
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import tempfile
+import time
+from typing import List, Optional
+
+_HANDLE_LINE = re.compile(r"^@\w{1,15}$")
+_COUNTER_LINE = re.compile(r"^[\d.,]+[KMB]?$")
+_TIMESTAMP_LINE = re.compile(r"^(\d+[smhd]|[A-Z][a-z]{2} \d{1,2}(, \d{4})?)$")
+# Context lines X shows above a tweet ("Pinned", "Sam reposted")
+_CONTEXT_LINE = re.compile(r"^(Pinned|.+ reposted)$")
+
+
+class Tweet:
+    """A single tweet as read from a timeline page."""
+    def __init__(self, author: str, text: str, pinned: bool = False):
+        self.author = author
+        self.text = text
+        self.pinned = pinned
+        normalized = " ".join(text.split()).lower()
+        self.hash = hashlib.sha256(f"{author.lower()}\n{normalized}".encode("utf-8")).hexdigest()
+
+    def __str__(self) -> str:
+        return f"{self.author}: {self.text}"
+
+
+def split_tweets(page_text: str) -> List[Tweet]:
+    """
+    Split the text of an X/Twitter timeline page into tweets (in page order, newest first
+    apart from pinned tweets).
+
+    A tweet starts with the author's display name, followed by a line with the @handle, a
+    "·" and a timestamp line. Text before the first tweet (profile header) is ignored.
+    """
+    lines = [line.strip() for line in (page_text or "").splitlines()]
+    starts = [i for i, line in enumerate(lines) if _HANDLE_LINE.match(line)
+              and "·" in lines[i + 1:i + 3]]
+    tweets = []
+    for index, start in enumerate(starts):
+        # The display name line in front of the next handle belongs to the next tweet
+        end = starts[index + 1] - 1 if index + 1 < len(starts) else len(lines)
+        body = lines[start + 1:end]
+        while body and (body[0] == "·" or _TIMESTAMP_LINE.match(body[0])):
+            body.pop(0)
+        while body and (not body[-1] or _COUNTER_LINE.match(body[-1]) or _CONTEXT_LINE.match(body[-1])):
+            body.pop()
+        text = "\n".join(line for line in body if line)
+        if text:
+            tweets.append(Tweet(lines[start], text, pinned=start >= 2 and lines[start - 2] == "Pinned"))
+    return tweets
+
+
+class TweetStore:
+    """SQLite store of seen tweets and per-account high-water marks."""
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(tempfile.gettempdir(), "smooth-operator-tweets.sqlite3")
+        self._connection = sqlite3.connect(self.path)
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS tweets (
+                hash TEXT PRIMARY KEY,
+                account TEXT NOT NULL,
+                author TEXT NOT NULL,
+                text TEXT NOT NULL,
+                first_seen REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS tweets_by_account ON tweets (account, first_seen);
+            CREATE TABLE IF NOT EXISTS accounts (
+                account TEXT PRIMARY KEY,
+                high_water_mark TEXT,
+                updated_at REAL NOT NULL
+            );
+        """)
+
+    def high_water_mark(self, account: str) -> Optional[str]:
+        """Hash of the newest tweet seen on the last visit of the account."""
+        row = self._connection.execute(
+            "SELECT high_water_mark FROM accounts WHERE account = ?", (account,)).fetchone()
+        return row[0] if row else None
+
+    def is_seen(self, tweet_hash: str) -> bool:
+        return self._connection.execute("SELECT 1 FROM tweets WHERE hash = ?", (tweet_hash,)).fetchone() is not None
+
+    def ingest(self, account: str, page_text: str) -> List[Tweet]:
+        """Store the tweets of a timeline page and return the ones not seen before."""
+        tweets = split_tweets(page_text)
+        high_water_mark = self.high_water_mark(account)
+        now = time.time()
+        new_tweets = []
+        with self._connection:
+            for tweet in tweets:
+                if tweet.hash == high_water_mark and not tweet.pinned:
+                    # Everything below was there on the last visit already
+                    break
+                if tweet.hash in (t.hash for t in new_tweets) or self.is_seen(tweet.hash):
+                    continue
+                new_tweets.append(tweet)
+                self._connection.execute(
+                    "INSERT INTO tweets (hash, account, author, text, first_seen) VALUES (?, ?, ?, ?, ?)",
+                    (tweet.hash, account, tweet.author, tweet.text, now))
+            # Pinned tweets stay on top, the newest tweet is the first one that isn't pinned
+            newest = next((tweet.hash for tweet in tweets if not tweet.pinned), high_water_mark)
+            self._connection.execute(
+                "INSERT INTO accounts (account, high_water_mark, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(account) DO UPDATE SET high_water_mark = excluded.high_water_mark, updated_at = excluded.updated_at",
+                (account, newest, now))
+        return new_tweets
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+def format_tweets(account: str, tweets: List[Tweet]) -> str:
+    """Format new tweets of an account for the summarizer prompt."""
+    return f"Tweets of @{account}:\n" + "\n".join(f"- {tweet}" for tweet in tweets) + "\n--------------------\n"
@@ -0,0 +1,143 @@
+"""
+Map-reduce summarization of tweets within a token budget.
+
+Putting the tweets of all accounts into one request makes the request slower the more accounts
+there are, and long timelines can overflow the context window. Instead, the tweets are split
+into chunks of at most `max_chunk_tokens` (estimated locally, one or more accounts per chunk;
+accounts that don't fit are split at line boundaries):
+
+    map:    every chunk is summarized on its own, all chunks in parallel
+    reduce: the partial summaries are merged into the final JSON
+
+    { "summaryBulletPoints": ["...", "...", "..."], "breakingNewsProbabilityInPercent": 50 }
+
+The map requests run concurrently (within the LlmScheduler's limits), so the latency stays
+roughly at one map plus one reduce request, however many accounts there are. If everything
+fits into a single chunk, only one request is made.
+"""
+import asyncio
+import json
+from typing import List
+
+from llm_scheduler import PRIORITY_INTERACTIVE
+from token_estimate import estimate_tokens
+from tracing import traced
+
+DEFAULT_MAX_CHUNK_TOKENS = 6000
+
+ANSWER_FORMAT = """Answer with a JSON in this form:
+{
+    "summaryBulletPoints": [
+        "bullet point 1",
+        "bullet point 2",
+        "bullet point 3"
+    ],
+    "breakingNewsProbabilityInPercent": 50
+}"""
+
+SUMMARY_PROMPT = ("These are the new tweets (since the last check) of some twitter accounts that are typically very up-to-date on AI news. "
+                  "Give me a summary on the concrete topics they write about (3 bullet points, one short sentence, each) and a rating 0-100 if you have the impression that actual very big breaking news has just occurred within the last hour.")
+
+MAP_PROMPT = ("These are some of the new tweets of twitter accounts that are typically very up-to-date on AI news (the other tweets are summarized separately). "
+              "Summarize the concrete topics they write about (up to 5 bullet points, one short sentence each, most important first) and give a rating 0-100 if you have the impression that actual very big breaking news has just occurred within the last hour.")
+
+REDUCE_PROMPT = ("These are partial summaries of the new tweets of some twitter accounts that are typically very up-to-date on AI news, each with its own breaking news rating. "
+                 "Merge them into one summary on the concrete topics (3 bullet points, one short sentence, each) and one rating 0-100 if actual very big breaking news has just occurred within the last hour. "
+                 "A high rating of a single part should not be averaged away if its topic is real breaking news.")
+
+
+def _split_section(section: str, max_tokens: int) -> List[str]:
+    """Split a text that is larger than the budget at line boundaries (or hard, for very long lines)."""
+    max_chars = max_tokens * 4
+    parts, current = [], ""
+    for line in section.splitlines(keepends=True):
+        while len(line) > max_chars:
+            parts.append(line[:max_chars])
+            line = line[max_chars:]
+        if current and estimate_tokens(current + line) > max_tokens:
+            parts.append(current)
+            current = ""
+        current += line
+    if current:
+        parts.append(current)
+    return parts
+
+
+def chunk_sections(sections: List[str], max_tokens: int = DEFAULT_MAX_CHUNK_TOKENS) -> List[str]:
+    """Pack sections (e.g. the tweets of one account each) into chunks of at most `max_tokens`."""
+    chunks, current = [], ""
+    for section in sections:
+        pieces = [section] if estimate_tokens(section) <= max_tokens else _split_section(section, max_tokens)
+        for piece in pieces:
+            if current and estimate_tokens(current + piece) > max_tokens:
+                chunks.append(current)
+                current = ""
+            current += piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def _ask(llm, prompt: str, content: str, priority: int) -> str:
+    chat_completion = await llm.chat(
+        priority=priority,
+        model="gpt-4o",
+        response_format={"type": "json_object"},
+        messages=[{"role": "user", "content": f"{prompt}<tweets>{content}</tweets>{ANSWER_FORMAT}"}]
+    )
+    return chat_completion.choices[0].message.content
+
+
+async def _ask_all(llm, prompt: str, chunks: List[str], priority: int) -> List[str]:
+    """Run one request per chunk concurrently; failed chunks are reported and left out."""
+    results = await asyncio.gather(*(_ask(llm, prompt, chunk, priority) for chunk in chunks), return_exceptions=True)
+    answers = []
+    for index, result in enumerate(results):
+        if isinstance(result, Exception):
+            print(f"Warning: Summarizing chunk {index + 1}/{len(chunks)} failed: {result}")
+        else:
+            answers.append(result)
+    if not answers:
+        raise RuntimeError(f"Summarizing all {len(chunks)} chunks failed.")
+    return answers
+
+
+def _format_partial(index: int, answer: str) -> str:
+    try:
+        partial = json.loads(answer)
+        bullet_points = "\n".join(f"- {point}" for point in partial.get("summaryBulletPoints", []))
+        return f"Part {index + 1} (breaking news rating {partial.get('breakingNewsProbabilityInPercent')}):\n{bullet_points}\n"
+    except (json.JSONDecodeError, AttributeError):
+        return f"Part {index + 1}:\n{answer}\n"
+
+
+@traced("summarize tweets")
+async def summarize_tweet_sections(llm, sections: List[str], max_chunk_tokens: int = DEFAULT_MAX_CHUNK_TOKENS,
+                                   priority: int = PRIORITY_INTERACTIVE) -> str:
+    """
+    Summarize tweets (one section per account, see tweet_store.format_tweets()) with map-reduce.
+
+    Args:
+        llm: Anything with an awaitable chat(priority, **kwargs), e.g. AsyncSmoothOperator or LlmScheduler.
+        sections: The texts to summarize, e.g. the new tweets of one account each.
+        max_chunk_tokens: Token budget of one chunk.
+        priority: Scheduler priority of the requests.
+
+    Returns:
+        The JSON text with summaryBulletPoints and breakingNewsProbabilityInPercent.
+    """
+    chunks = chunk_sections(sections, max_chunk_tokens)
+    if len(chunks) <= 1:
+        return await _ask(llm, SUMMARY_PROMPT, "".join(chunks), priority)
+
+    print(f"Summarizing {len(chunks)} chunks (~{estimate_tokens(''.join(chunks))} tokens) in parallel...")
+    partials = [_format_partial(index, answer)
+                for index, answer in enumerate(await _ask_all(llm, MAP_PROMPT, chunks, priority))]
+    # Merge in more than one step only if even the partial summaries exceed the budget
+    while len(partials) > 1 and estimate_tokens("".join(partials)) > max_chunk_tokens:
+        groups = chunk_sections(partials, max_chunk_tokens)
+        if len(groups) >= len(partials):
+            break
+        partials = [_format_partial(index, answer)
+                    for index, answer in enumerate(await _ask_all(llm, REDUCE_PROMPT, groups, priority))]
+    return await _ask(llm, REDUCE_PROMPT, "".join(partials), priority)
@@ -2,34 +2,33 @@ import os
 import asyncio
 import json
 from dotenv import load_dotenv
-from openai import OpenAI
+from llm_scheduler import get_shared_scheduler
 from smooth_operator_agent_tools import SmoothOperatorClient
+from tracing import TracedClient, traced
+from session_recording import session_client
+from server_lifecycle import shared_server
+from tweet_store import TweetStore, format_tweets
+from tweet_summarizer import summarize_tweet_sections
 
 # this is just to show how short & minimalistic the code can be.
 # for production use you should add some error handling, logging etc.
 
-async def get_openai_summary(tweets_text, api_key):
-    """Calls OpenAI API to summarize tweets and returns the JSON result."""
-    openai_client = OpenAI(api_key=api_key)
-    chat_completion = openai_client.chat.completions.create(
-        model="gpt-4o", response_format={"type": "json_object"},
-        messages=[{
-            "role": "user",
-            "content": f"Latest tweets from AI accounts. Summarize topics (3 short bullet points) & rate breaking news probability (0-100) in the last hour. <tweets>{tweets_text}</tweets> Answer JSON: {{ \"summaryBulletPoints\": [\"p1\", \"p2\", \"p3\"], \"breakingNewsProbabilityInPercent\": 50 }}"
-        }]
-    )
+async def get_openai_summary(tweet_sections, api_key):
+    """Summarizes the tweets (in parallel chunks if they are long) and returns the JSON result."""
+    result_text = await summarize_tweet_sections(get_shared_scheduler(api_key), tweet_sections)
     try:
-        return json.dumps(json.loads(chat_completion.choices[0].message.content), indent=4)
+        return json.dumps(json.loads(result_text), indent=4)
     except json.JSONDecodeError:
-        return chat_completion.choices[0].message.content # Return raw if not JSON
+        return result_text # Return raw if not JSON
 
-async def run_minimal_twitter_checker():
+@traced("flow: minimal twitter checker")
+async def run_minimal_twitter_checker(accounts=None):
     load_dotenv()
     screengrasp_key, openai_key = os.getenv("SCREENGRASP_API_KEY"), os.getenv("OPENAI_API_KEY")
-    client = SmoothOperatorClient(screengrasp_key)
+    client = TracedClient(session_client(shared_server(SmoothOperatorClient, screengrasp_key))) # records every call as a span, see tracing.py
     client.start_server()
-    tweets_text = ""
-    accounts = ["sama", "datachaz", "kimmonismus", "ai_for_success", "slow_developer"]    
+    tweet_sections, store = [], TweetStore() # store remembers tweets of previous runs
+    accounts = accounts or ["sama", "datachaz", "kimmonismus", "ai_for_success", "slow_developer"]
     for i, account in enumerate(accounts):
         if i == 0:
             client.chrome.open_chrome(f"https://x.com/{accounts[i]}") # assumes currently no other chrome browser open, otherwise won't work
@@ -37,8 +36,9 @@ async def run_minimal_twitter_checker():
             client.chrome.navigate(f"https://x.com/{accounts[i]}")
         for _ in range(3): client.mouse.scroll(200, 200, 20);
         response = client.chrome.get_text()
-        if response and response.result_value: tweets_text += response.result_value + "\n"
-    print(await get_openai_summary(tweets_text, openai_key))
+        new_tweets = store.ingest(account, response.result_value) if response and response.result_value else []
+        if new_tweets: tweet_sections.append(format_tweets(account, new_tweets))
+    print(await get_openai_summary(tweet_sections, openai_key) if tweet_sections else "No new tweets since the last run.")
 
 if __name__ == "__main__":
     asyncio.run(run_minimal_twitter_checker()) 
\ No newline at end of file
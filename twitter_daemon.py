@@ -0,0 +1,234 @@
+"""
+Daemon mode for the Twitter AI news checker.
+
+Instead of starting the server and Chrome for every check (e.g. from cron), the daemon starts
+them once and keeps polling:
+- every account has its own schedule: after a poll with new tweets its interval is halved,
+  after a quiet poll it grows by 50% (within min_interval and max_interval);
+- new tweets of an account are summarized right away, and an alert is printed when the
+  breaking news probability reaches the threshold;
+- every `report_every` polls (and on exit) the loop timing statistics are printed: duration
+  of each poll phase and how late polls started compared to their schedule.
+
+Run with `python twitter_daemon.py`, stop with Ctrl+C.
+Settings: TWITTER_ALERT_THRESHOLD (default 70), TWITTER_MIN_INTERVAL / TWITTER_MAX_INTERVAL
+(seconds, default 120 / 1800).
+"""
+import asyncio
+import json
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from smooth_operator_agent_tools import ExistingChromeInstanceStrategy, SmoothOperatorClient
+
+from async_operator import AsyncSmoothOperator
+from session_recording import session_client
+from server_lifecycle import shared_server
+from timing_stats import StageStats
+from tracing import span
+from tweet_store import TweetStore, format_tweets
+from twitter_ai_news_checker import summarize_tweets
+from ui_wait import page_text_contains, wait_until
+
+ACCOUNTS = ["kimmonismus", "ai_for_success", "slow_developer"]
+POLL_PHASES = ("navigate", "scroll", "read", "summarize", "poll")
+
+
+class AccountSchedule:
+    """Adaptive polling schedule of one account."""
+    def __init__(self, account: str, min_interval: float, max_interval: float):
+        self.account = account
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.next_due = time.monotonic()
+        self.polls = 0
+        self.new_tweets = 0
+
+    def update(self, new_tweet_count: int) -> None:
+        """Poll more often while the account is active, back off while it is quiet."""
+        self.polls += 1
+        self.new_tweets += new_tweet_count
+        if new_tweet_count:
+            self.interval = max(self.min_interval, self.interval / 2)
+        else:
+            self.interval = min(self.max_interval, self.interval * 1.5)
+        self.next_due = time.monotonic() + self.interval
+
+
+class DaemonStats:
+    """Timing of the polling loop."""
+    def __init__(self):
+        self.phases: Dict[str, StageStats] = {name: StageStats(name) for name in POLL_PHASES}
+        self.lag = StageStats("start lag")
+        self.alerts = 0
+        self.errors = 0
+        self.started_at = time.monotonic()
+
+    def report(self, schedules: List[AccountSchedule]) -> str:
+        lines = [f"Daemon running for {(time.monotonic() - self.started_at) / 60:.1f} minutes, "
+                 f"{self.alerts} alerts, {self.errors} failed polls. Loop timing:"]
+        lines += [f"  {stats}" for stats in list(self.phases.values()) + [self.lag]]
+        lines += [f"  @{schedule.account}: {schedule.polls} polls, {schedule.new_tweets} new tweets, "
+                  f"polling every {schedule.interval:.0f}s" for schedule in schedules]
+        return "\n".join(lines)
+
+
+def print_alert(account: str, probability: int, result: dict) -> None:
+    """Default alert: print it prominently."""
+    print("!" * 60)
+    print(f"ALERT: breaking news probability {probability}% after new tweets of @{account}")
+    for bullet_point in result.get("summaryBulletPoints", []):
+        print(f"  - {bullet_point}")
+    print("!" * 60)
+
+
+class TwitterDaemon:
+    """Keeps the server and Chrome open and polls the accounts on adaptive schedules."""
+    def __init__(self, ops: AsyncSmoothOperator, accounts: List[str], tweet_store: TweetStore,
+                 alert_threshold: int = 70, min_interval: float = 120, max_interval: float = 1800,
+                 report_every: int = 10, on_alert: Callable[[str, int, dict], None] = print_alert):
+        self.ops = ops
+        self.tweet_store = tweet_store
+        self.alert_threshold = alert_threshold
+        self.report_every = report_every
+        self.on_alert = on_alert
+        self.schedules = [AccountSchedule(account, min_interval, max_interval) for account in accounts]
+        self.stats = DaemonStats()
+        self.is_browser_open = False
+        self.reopen_browser = False
+
+    async def _timed(self, phase: str, awaitable):
+        start_time = time.perf_counter()
+        try:
+            with span(phase):
+                return await awaitable
+        finally:
+            self.stats.phases[phase].add(time.perf_counter() - start_time)
+
+    async def _open_page(self, url: str) -> bool:
+        if not self.is_browser_open:
+            # After a failed navigation the daemon's own Chrome may still be running
+            strategy = (ExistingChromeInstanceStrategy.FORCE_CLOSE if self.reopen_browser
+                        else ExistingChromeInstanceStrategy.THROW_ERROR)
+            open_result = await self.ops.chrome.open_chrome(url, strategy)
+            print(open_result.message)
+            if open_result.message.startswith('Error'):
+                return False
+            self.is_browser_open = True
+        else:
+            try:
+                navigate_result = await self.ops.chrome.navigate(url)
+            except Exception:
+                navigate_result = None
+            if not navigate_result or not navigate_result.success:
+                # Chrome may have been closed; it is reopened on the next poll
+                self.is_browser_open = False
+                self.reopen_browser = True
+                return False
+        account = url.rsplit("/", 1)[-1]
+        await wait_until(page_text_contains(self.ops, f"@{account}"), timeout=15,
+                         description=f"timeline of @{account}", verbose=False)
+        return True
+
+    async def poll(self, schedule: AccountSchedule) -> int:
+        """Read the timeline of an account, summarize new tweets; returns the number of new tweets."""
+        account = schedule.account
+        url = f"https://x.com/{account}"
+        if not await self._timed("navigate", self._open_page(url)):
+            raise RuntimeError(f"Could not open {url}")
+
+        async def scroll():
+            for _ in range(3):
+                await self.ops.mouse.scroll(200, 200, 20)
+                await asyncio.sleep(1)
+        await self._timed("scroll", scroll())
+
+        response = await self._timed("read", self.ops.chrome.get_text())
+        if not response or not response.result_value:
+            raise RuntimeError(f"Could not get text from {url}")
+        new_tweets = self.tweet_store.ingest(account, response.result_value)
+        print(f"{len(new_tweets)} new tweets from @{account}.")
+        if new_tweets and self.ops.llm:
+            result_text = await self._timed("summarize", summarize_tweets(self.ops, [format_tweets(account, new_tweets)]))
+            self._handle_result(account, result_text)
+        return len(new_tweets)
+
+    def _handle_result(self, account: str, result_text: str) -> None:
+        try:
+            result = json.loads(result_text)
+            probability = int(result.get("breakingNewsProbabilityInPercent", 0))
+        except (json.JSONDecodeError, TypeError, ValueError, AttributeError):
+            print(f"Unexpected OpenAI answer: {result_text}")
+            return
+        print(f"@{account}: breaking news probability {probability}%")
+        for bullet_point in result.get("summaryBulletPoints", []):
+            print(f"  - {bullet_point}")
+        if probability >= self.alert_threshold:
+            self.stats.alerts += 1
+            self.on_alert(account, probability, result)
+
+    async def run(self, max_polls: Optional[int] = None) -> None:
+        """Poll until cancelled (or until max_polls polls are done)."""
+        polls = 0
+        while max_polls is None or polls < max_polls:
+            schedule = min(self.schedules, key=lambda s: s.next_due)
+            delay = schedule.next_due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.stats.lag.add(max(0.0, time.monotonic() - schedule.next_due))
+
+            start_time = time.perf_counter()
+            try:
+                # Every poll is a trace of its own, with the phases as child spans
+                with span("poll", account=schedule.account):
+                    new_tweet_count = await self.poll(schedule)
+            except Exception as ex:
+                self.stats.errors += 1
+                print(f"Polling @{schedule.account} failed: {ex}")
+                new_tweet_count = 0
+            self.stats.phases["poll"].add(time.perf_counter() - start_time)
+            schedule.update(new_tweet_count)
+            polls += 1
+            if polls % self.report_every == 0:
+                print(self.stats.report(self.schedules))
+
+
+async def run_twitter_daemon(accounts: Optional[List[str]] = None):
+    load_dotenv()
+    screengrasp_api_key = os.getenv("SCREENGRASP_API_KEY")
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not screengrasp_api_key:
+        print("Error: SCREENGRASP_API_KEY not found in .env file or environment variables. Get a free key at https://screengrasp.com/api.html")
+        return
+    if not openai_api_key:
+        print("Warning: OPENAI_API_KEY not found. New tweets are recorded, but not summarized and no alerts are raised.")
+
+    client = session_client(shared_server(SmoothOperatorClient, screengrasp_api_key))
+    ops = AsyncSmoothOperator(client, openai_api_key=openai_api_key)
+    tweet_store = TweetStore()
+    daemon = TwitterDaemon(ops, accounts or ACCOUNTS, tweet_store,
+                           alert_threshold=int(os.getenv("TWITTER_ALERT_THRESHOLD", "70")),
+                           min_interval=float(os.getenv("TWITTER_MIN_INTERVAL", "120")),
+                           max_interval=float(os.getenv("TWITTER_MAX_INTERVAL", "1800")))
+
+    print("Starting server (or attaching to the running one; the first start can take a while, because it's installing the server)...")
+    await ops.start_server()
+    try:
+        await daemon.run()
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        print(daemon.stats.report(daemon.schedules))
+        print("Stopping server...")
+        await ops.stop_server()
+        ops.close()
+        tweet_store.close()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(run_twitter_daemon())
+    except KeyboardInterrupt:
+        pass
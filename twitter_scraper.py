@@ -0,0 +1,185 @@
+"""
+Reading the timelines of several Twitter/X accounts, one after another or in parallel tabs.
+
+Sequentially, every account costs a navigation, a fixed wait for the page, three scrolls with
+a pause each (so more tweets get loaded) and a pause before the next account. Most of that time
+is spent waiting for the page to load.
+
+In tab mode, a wave of accounts is opened in background tabs at once, so their pages load at the
+same time. The tabs are then visited round-robin (Ctrl+<tab number>): each visit scrolls once and
+moves on to the next tab while the scrolled tab loads more tweets. As soon as a tab has been
+scrolled often enough, its text is read and the next visit goes to the next tab. Mouse and keyboard
+are still used by one tab at a time, only the waiting overlaps.
+
+    scraper = TwitterScraper(ops)
+    result = await scraper.scrape_in_tabs(accounts, tabs=3)
+
+Run `python twitter_scraper.py` to compare the wall-clock time of both modes.
+"""
+import asyncio
+import os
+import time
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from smooth_operator_agent_tools import SmoothOperatorClient
+
+from async_operator import AsyncSmoothOperator
+from session_recording import session_client
+from server_lifecycle import shared_server
+from tracing import span
+from ui_wait import page_text_contains, wait_until
+
+# Ctrl+1 ... Ctrl+8 select the first eight tabs; tab 1 stays open, so at most 7 tabs per wave
+MAX_TABS = 7
+
+
+class ScrapeResult:
+    """Page text per account and how long it took to read them."""
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.pages: Dict[str, str] = {}
+        self.failed: List[str] = []
+        self.started_at = time.perf_counter()
+        self.elapsed = 0.0
+
+    def finish(self) -> 'ScrapeResult':
+        self.elapsed = time.perf_counter() - self.started_at
+        return self
+
+    def __str__(self) -> str:
+        accounts = len(self.pages) + len(self.failed)
+        per_account = self.elapsed / accounts if accounts else 0.0
+        return (f"{self.mode}: {len(self.pages)}/{accounts} accounts read in {self.elapsed:.1f}s "
+                f"({per_account:.1f}s per account)")
+
+
+class TwitterScraper:
+    """Reads account timelines with the browser opened by open_chrome()."""
+    def __init__(self, ops: AsyncSmoothOperator, scrolls: int = 3, scroll_pause: float = 1.0,
+                 load_timeout: float = 15.0):
+        self.ops = ops
+        self.scrolls = scrolls
+        self.scroll_pause = scroll_pause
+        self.load_timeout = load_timeout
+        self.is_browser_open = False
+
+    @staticmethod
+    def url(account: str) -> str:
+        return f"https://x.com/{account}"
+
+    async def _open_browser(self, url: Optional[str] = None) -> bool:
+        open_result = await self.ops.chrome.open_chrome(url)
+        print(open_result.message)
+        if open_result.message.startswith('Error'):
+            return False
+        self.is_browser_open = True
+        return True
+
+    async def _read_page(self, account: str, result: ScrapeResult) -> None:
+        print(f"Getting text from {self.url(account)}...")
+        response = await self.ops.chrome.get_text()
+        if response and response.result_value and f"@{account}".lower() in response.result_value.lower():
+            result.pages[account] = response.result_value
+        else:
+            print(f"Warning: Could not get text from {self.url(account)}")
+            result.failed.append(account)
+
+    async def scrape_sequentially(self, accounts: List[str]) -> ScrapeResult:
+        """Visit the accounts one after another in the current tab, with fixed waits."""
+        result = ScrapeResult("sequential")
+        for account in accounts:
+            with span("scrape account", account=account):
+                url = self.url(account)
+                if not self.is_browser_open:
+                    if not await self._open_browser(url):
+                        return result.finish()
+                    print("Waiting for browser to load...")
+                    await asyncio.sleep(7) # give the newly opened browser some time to load that page
+                else:
+                    await self.ops.chrome.navigate(url)
+                    print(f"Navigated to {url}, waiting...")
+                    await asyncio.sleep(4) # give navigation some time
+
+                print("Scrolling down...")
+                for _ in range(self.scrolls):
+                    await self.ops.mouse.scroll(200, 200, 20) # scroll down slightly
+                    await asyncio.sleep(self.scroll_pause)
+
+                await self._read_page(account, result)
+                await asyncio.sleep(1) # Small delay between accounts
+        return result.finish()
+
+    async def scrape_in_tabs(self, accounts: List[str], tabs: int = 3) -> ScrapeResult:
+        """Load `tabs` accounts at a time in background tabs and scroll them round-robin."""
+        tabs = max(1, min(tabs, MAX_TABS))
+        result = ScrapeResult(f"{tabs} tabs")
+        if not self.is_browser_open and not await self._open_browser():
+            return result.finish()
+
+        for wave_start in range(0, len(accounts), tabs):
+            wave = accounts[wave_start:wave_start + tabs]
+            with span("scrape wave", accounts=len(wave)):
+                print(f"Opening {len(wave)} tabs: {', '.join(wave)}...")
+                for account in wave:
+                    await self.ops.chrome.new_tab(self.url(account))
+
+                # Tab 1 is the tab open_chrome() opened, the tabs of this wave follow it
+                last_scrolled: Dict[str, float] = {}
+                for round_nr in range(self.scrolls + 1):
+                    for index, account in enumerate(wave):
+                        pause_left = last_scrolled.get(account, 0.0) + self.scroll_pause - time.perf_counter()
+                        if pause_left > 0:
+                            await asyncio.sleep(pause_left)
+                        await self.ops.keyboard.press(f"Ctrl+{index + 2}")
+                        if round_nr == 0:
+                            await wait_until(page_text_contains(self.ops, f"@{account}"), timeout=self.load_timeout,
+                                             description=f"timeline of @{account}")
+                        if round_nr < self.scrolls:
+                            await self.ops.mouse.scroll(200, 200, 20)
+                            last_scrolled[account] = time.perf_counter()
+                        else:
+                            await self._read_page(account, result)
+
+                # Close this wave's tabs (Ctrl+W closes the active tab), so the next wave has the same tab numbers
+                for index in reversed(range(len(wave))):
+                    await self.ops.keyboard.press(f"Ctrl+{index + 2}")
+                    await self.ops.keyboard.press("Ctrl+W")
+        return result.finish()
+
+    async def scrape(self, accounts: List[str], tabs: int = 1) -> ScrapeResult:
+        """Read the accounts' timelines; in parallel tabs if `tabs` > 1."""
+        with span("scrape timelines", accounts=len(accounts), tabs=tabs):
+            if tabs > 1:
+                return await self.scrape_in_tabs(accounts, tabs)
+            return await self.scrape_sequentially(accounts)
+
+
+async def run_scrape_comparison(accounts: Optional[List[str]] = None, tabs: int = 3):
+    """Read the same accounts sequentially and in tabs, and compare the wall-clock times."""
+    accounts = accounts or ["sama", "datachaz", "kimmonismus", "ai_for_success", "slow_developer"]
+    load_dotenv()
+    screengrasp_api_key = os.getenv("SCREENGRASP_API_KEY")
+    if not screengrasp_api_key:
+        print("Error: SCREENGRASP_API_KEY not found in .env file or environment variables. Get a free key at https://screengrasp.com/api.html")
+        return
+
+    client = session_client(shared_server(SmoothOperatorClient, screengrasp_api_key))
+    ops = AsyncSmoothOperator(client)
+    print("Starting server (or attaching to the running one; the first start can take a while, because it's installing the server)...")
+    await ops.start_server()
+    try:
+        scraper = TwitterScraper(ops)
+        sequential = await scraper.scrape_sequentially(accounts)
+        parallel = await scraper.scrape_in_tabs(accounts, tabs)
+        print(sequential)
+        print(parallel)
+        if parallel.elapsed > 0:
+            print(f"Speedup: {sequential.elapsed / parallel.elapsed:.1f}x")
+    finally:
+        print("Stopping server...")
+        await ops.stop_server()
+        ops.close()
+
+if __name__ == "__main__":
+    asyncio.run(run_scrape_comparison())
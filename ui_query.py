@@ -0,0 +1,163 @@
+"""
+Local selector engine over UI automation trees.
+
+Finding a control in a `get_overview()` / `get_window_details()` tree doesn't need an LLM when
+we know what we are looking for. UiIndex indexes one snapshot of a tree once (by element ID,
+control type and name) and answers selector queries from those indexes:
+
+    index = UiIndex(window_details)
+    display = index.find('Text[name^="Display is"]')
+    customer = index.find('Pane[name="Order"] Edit[name*="customer"]')
+    button = index.find('#42.1.7')
+
+Selector syntax (a small subset of CSS):
+- `Edit`                control type
+- `#<id>`               element ID
+- `[name="..."]`        name equals, `[name^="..."]` starts with, `[name*="..."]` contains
+                        (all case-insensitive); `[value...]` works the same on the current value
+- `A B`                 B somewhere below A (ancestor path, any depth)
+"""
+import re
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from ui_tree import get_field, load_tree, window_root
+
+_PART_PATTERN = re.compile(r'(?P<type>[A-Za-z]+)?(?:#(?P<id>[^\s\[]+))?(?P<attrs>(?:\[[^\]]*\])*)$')
+_ATTR_PATTERN = re.compile(r'\[\s*(?P<field>name|value)\s*(?P<op>\^=|\*=|=)\s*"(?P<text>[^"]*)"\s*\]')
+_ATTR_FIELDS = {"name": "name", "value": "current_value"}
+
+
+class SelectorPart:
+    """One step of a selector: control type, element ID and attribute conditions."""
+    def __init__(self, control_type: Optional[str] = None, element_id: Optional[str] = None,
+                 conditions: Optional[List[Tuple[str, str, str]]] = None):
+        self.control_type = control_type
+        self.element_id = element_id
+        self.conditions = conditions or []  # (field, operator, lowercased text)
+
+    def matches(self, node: Any) -> bool:
+        if self.control_type and get_field(node, "control_type") != self.control_type:
+            return False
+        if self.element_id and get_field(node, "id") != self.element_id:
+            return False
+        for field, op, text in self.conditions:
+            actual = str(get_field(node, field, "")).lower()
+            if op == "=" and actual != text:
+                return False
+            if op == "^=" and not actual.startswith(text):
+                return False
+            if op == "*=" and text not in actual:
+                return False
+        return True
+
+    def exact_name(self) -> Optional[str]:
+        return next((text for field, op, text in self.conditions if field == "name" and op == "="), None)
+
+
+def parse_selector(selector: str) -> List[SelectorPart]:
+    """Parse a selector string into its parts (outermost ancestor first)."""
+    parts = []
+    # Split on whitespace outside of quotes
+    for token in re.findall(r'(?:[^\s"]|"[^"]*")+', selector.strip()):
+        match = _PART_PATTERN.match(token)
+        if not match or not token:
+            raise ValueError(f"Invalid selector part '{token}' in '{selector}'")
+        conditions = []
+        attrs = match.group("attrs")
+        for attr in _ATTR_PATTERN.finditer(attrs):
+            conditions.append((_ATTR_FIELDS[attr.group("field")], attr.group("op"), attr.group("text").lower()))
+        if len(_ATTR_PATTERN.sub("", attrs).strip()) > 0:
+            raise ValueError(f"Invalid attribute condition in '{token}'")
+        parts.append(SelectorPart(match.group("type"), match.group("id"), conditions))
+    if not parts:
+        raise ValueError("Empty selector")
+    return parts
+
+
+class UiIndex:
+    """Index over one snapshot of a UI automation tree, built once and queried many times."""
+    def __init__(self, tree: Any):
+        """
+        Args:
+            tree: A window or control from get_overview()/get_window_details(), its dict or its JSON.
+        """
+        self.root = window_root(load_tree(tree))
+        self.by_id: Dict[str, Any] = {}
+        self.by_type: Dict[str, List[Any]] = defaultdict(list)
+        self.by_type_and_name: Dict[Tuple[str, str], List[Any]] = defaultdict(list)
+        self.nodes: List[Any] = []
+        self._parents: Dict[int, Any] = {}
+
+        stack = [(self.root, None)] if self.root is not None else []
+        while stack:
+            node, parent = stack.pop()
+            self.nodes.append(node)
+            self._parents[id(node)] = parent
+            element_id = get_field(node, "id")
+            if element_id:
+                self.by_id[element_id] = node
+            control_type = get_field(node, "control_type", "")
+            self.by_type[control_type].append(node)
+            self.by_type_and_name[(control_type, str(get_field(node, "name", "")).lower())].append(node)
+            children = get_field(node, "children", [])
+            stack.extend((child, node) for child in reversed(children) if child is not None)
+
+    def parent(self, node: Any) -> Optional[Any]:
+        return self._parents.get(id(node))
+
+    def ancestors(self, node: Any) -> List[Any]:
+        """Ancestors of a node, closest first."""
+        result = []
+        current = self.parent(node)
+        while current is not None:
+            result.append(current)
+            current = self.parent(current)
+        return result
+
+    def _candidates(self, part: SelectorPart) -> List[Any]:
+        if part.element_id:
+            node = self.by_id.get(part.element_id)
+            return [node] if node is not None else []
+        exact_name = part.exact_name()
+        if part.control_type and exact_name is not None:
+            return self.by_type_and_name.get((part.control_type, exact_name), [])
+        if part.control_type:
+            return self.by_type.get(part.control_type, [])
+        return self.nodes
+
+    def _matches_ancestor_path(self, node: Any, ancestor_parts: List[SelectorPart]) -> bool:
+        remaining = list(reversed(ancestor_parts))  # innermost first
+        for ancestor in self.ancestors(node):
+            if remaining and remaining[0].matches(ancestor):
+                remaining.pop(0)
+        return not remaining
+
+    def find_all(self, selector: str) -> List[Any]:
+        """Return all controls matching the selector, in tree order."""
+        parts = parse_selector(selector)
+        target, ancestor_parts = parts[-1], parts[:-1]
+        return [node for node in self._candidates(target)
+                if target.matches(node) and self._matches_ancestor_path(node, ancestor_parts)]
+
+    def find(self, selector: str) -> Optional[Any]:
+        """Return the only control matching the selector, or None if there is none or it is ambiguous."""
+        matches = self.find_all(selector)
+        return matches[0] if len(matches) == 1 else None
+
+    def find_labeled(self, control_type: str, label: str) -> Optional[Any]:
+        """
+        Return the control of `control_type` that follows a Text label containing `label`
+        among the label's siblings (for forms where inputs have no name of their own).
+        """
+        label = label.lower()
+        for text in self.by_type.get("Text", []):
+            if label not in str(get_field(text, "name", "")).lower():
+                continue
+            parent = self.parent(text)
+            siblings = get_field(parent, "children", []) if parent is not None else []
+            following = siblings[next(i for i, s in enumerate(siblings) if s is text) + 1:]
+            match = next((s for s in following if get_field(s, "control_type") == control_type), None)
+            if match is not None:
+                return match
+        return None
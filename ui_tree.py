@@ -0,0 +1,73 @@
+"""
+Helpers for walking the UI automation trees returned by the Smooth Operator server.
+
+The trees come in two shapes: the model objects returned by the client
+(`ControlDTO`, `WindowInfoDTO`, ... with snake_case attributes) and the JSON produced by
+their `to_json_string()` (dicts with PascalCase keys). These helpers accept both.
+"""
+import json
+from typing import Any, Iterator, Optional
+
+
+def _pascal_case(name: str) -> str:
+    return ''.join(word.capitalize() for word in name.split('_'))
+
+
+def get_field(node: Any, name: str, default: Any = None) -> Any:
+    """Read a field (given in snake_case) from a model object or a PascalCase JSON dict."""
+    if node is None:
+        return default
+    if isinstance(node, dict):
+        value = node.get(_pascal_case(name), node.get(name))
+        return default if value is None else value
+    value = getattr(node, name, None)
+    return default if value is None else value
+
+
+def load_tree(tree: Any) -> Any:
+    """Accept a JSON string, dict or model object and return something get_field() can read."""
+    if isinstance(tree, str):
+        return json.loads(tree)
+    return tree
+
+
+def window_root(window: Any) -> Any:
+    """
+    Return the root control of a window.
+
+    Accepts a `WindowInfoDTO` (from get_overview), a `WindowDetailInfosDTO` (from
+    get_window_details), their JSON dicts, or a control itself.
+    """
+    window = load_tree(window)
+    detail_infos = get_field(window, "detail_infos")
+    if detail_infos is not None:
+        window = get_field(detail_infos, "details", detail_infos)
+    root = get_field(window, "user_interface_elements")
+    return root if root is not None else window
+
+
+def iter_controls(root: Any) -> Iterator[Any]:
+    """Yield every control of a tree (depth-first, root first)."""
+    stack = [root] if root is not None else []
+    while stack:
+        node = stack.pop()
+        yield node
+        children = get_field(node, "children", [])
+        stack.extend(reversed([child for child in children if child is not None]))
+
+
+def find_control_by_id(root: Any, element_id: str) -> Optional[Any]:
+    """Return the control with the given element ID, or None."""
+    for node in iter_controls(root):
+        if get_field(node, "id") == element_id:
+            return node
+    return None
+
+
+def control_texts(root: Any) -> Iterator[str]:
+    """Yield the visible texts (names and current values) of all controls in a tree."""
+    for node in iter_controls(root):
+        for field in ("name", "current_value"):
+            value = get_field(node, field)
+            if value:
+                yield str(value)
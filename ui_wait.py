@@ -0,0 +1,172 @@
+"""
+Condition-based waiting for UI readiness.
+
+Instead of sleeping for a fixed time after each action, poll the Smooth Operator server
+until the UI is in the expected state. The poll interval starts small and backs off, so
+fast machines move on almost immediately while slow machines still get enough time.
+
+Usage:
+    result = await wait_until(window_exists(client, "ERP system"), timeout=30,
+                              description="ERP window")
+    if result:
+        erp_window = result.value
+"""
+import asyncio
+import inspect
+import time
+from typing import Any, Callable, Optional
+
+from tracing import span
+from ui_tree import control_texts, find_control_by_id, window_root
+
+
+class WaitResult:
+    """Outcome of a wait: whether the condition was met, how long it took and the last value."""
+    def __init__(self, success: bool, elapsed: float, attempts: int, value: Any = None, description: str = ""):
+        self.success = success
+        self.elapsed = elapsed
+        self.attempts = attempts
+        self.value = value
+        self.description = description
+
+    def __bool__(self) -> bool:
+        return self.success
+
+    def __str__(self) -> str:
+        state = "ready" if self.success else "timed out"
+        return f"{self.description}: {state} after {self.elapsed:.2f}s ({self.attempts} checks)"
+
+
+async def wait_until(condition: Callable[[], Any], timeout: float = 10.0, description: str = "condition",
+                     initial_interval: float = 0.1, max_interval: float = 1.0, backoff: float = 1.5,
+                     verbose: bool = True) -> WaitResult:
+    """
+    Poll `condition` until it returns a truthy value or `timeout` seconds have passed.
+
+    The condition may be a plain function or a coroutine function. Exceptions raised by the
+    condition count as "not ready yet". The interval between checks grows by `backoff`
+    up to `max_interval`.
+    """
+    with span("wait_until", description=description, timeout=timeout) as current:
+        start = time.monotonic()
+        interval = initial_interval
+        attempts = 0
+        value = None
+        while True:
+            attempts += 1
+            try:
+                value = condition()
+                if inspect.isawaitable(value):
+                    value = await value
+            except Exception:
+                value = None
+
+            elapsed = time.monotonic() - start
+            if value:
+                result = WaitResult(True, elapsed, attempts, value, description)
+                break
+            if elapsed >= timeout:
+                result = WaitResult(False, elapsed, attempts, value, description)
+                break
+
+            await asyncio.sleep(min(interval, timeout - elapsed))
+            interval = min(interval * backoff, max_interval)
+
+        current.set(attempts=attempts)
+        if not result.success:
+            current.fail(f"timed out after {timeout}s")
+
+    if verbose:
+        print(f"Waited for {result}")
+    return result
+
+
+async def _resolve(value: Any) -> Any:
+    return await value if inspect.isawaitable(value) else value
+
+
+# --- Conditions ---
+# Each factory returns a callable suitable for wait_until(). The callables return the
+# matched object (window, control, text) when the condition holds and None otherwise.
+# `client` may be a SmoothOperatorClient or an AsyncSmoothOperator.
+
+def window_exists(client, title: str) -> Callable[[], Any]:
+    """A window whose title contains `title` (case-insensitive) is open."""
+    async def check():
+        overview = await _resolve(client.system.get_overview())
+        if not overview:
+            return None
+        return next((w for w in overview.windows if w.title and title.lower() in w.title.lower()), None)
+    return check
+
+
+def focused_window_titled(client, title: str) -> Callable[[], Any]:
+    """The focused element belongs to a window whose title contains `title`."""
+    async def check():
+        overview = await _resolve(client.system.get_overview())
+        window = overview.focus_info.focused_element_parent_window if overview and overview.focus_info else None
+        if window and window.title and title.lower() in window.title.lower():
+            return window
+        return None
+    return check
+
+
+def focused_element_is(client, control_type: str) -> Callable[[], Any]:
+    """The focused element has the given control type (e.g. "Edit" for a search box)."""
+    async def check():
+        overview = await _resolve(client.system.get_overview())
+        element = overview.focus_info.focused_element if overview and overview.focus_info else None
+        if element and element.control_type == control_type:
+            return element
+        return None
+    return check
+
+
+def element_present(client, window_id: str, element_id: str) -> Callable[[], Any]:
+    """The control with `element_id` exists in the automation tree of the window."""
+    async def check():
+        details = await _resolve(client.system.get_window_details(window_id))
+        return find_control_by_id(window_root(details), element_id) if details else None
+    return check
+
+
+def window_contains_text(client, window_id: str, text: str) -> Callable[[], Any]:
+    """Some control in the window shows `text` (case-insensitive) as name or value."""
+    async def check():
+        details = await _resolve(client.system.get_window_details(window_id))
+        if not details:
+            return None
+        return next((t for t in control_texts(window_root(details)) if text.lower() in t.lower()), None)
+    return check
+
+
+def window_tree_changed(client, window_id: str, baseline_json: Optional[str]) -> Callable[[], Any]:
+    """The automation tree of the window differs from `baseline_json` (e.g. a list row was added)."""
+    async def check():
+        details = await _resolve(client.system.get_window_details(window_id))
+        if not details:
+            return None
+        current = details.to_json_string()
+        return current if current != baseline_json else None
+    return check
+
+
+def page_text_contains(client, *texts: str) -> Callable[[], Any]:
+    """The text of the current Chrome tab contains all of `texts` (case-insensitive)."""
+    async def check():
+        response = await _resolve(client.chrome.get_text())
+        page_text = response.result_value if response else None
+        if page_text and all(text.lower() in page_text.lower() for text in texts):
+            return page_text
+        return None
+    return check
+
+
+def page_text_changed(client, baseline_text: Optional[str]) -> Callable[[], Any]:
+    """The text of the current Chrome tab is non-empty and differs from `baseline_text`."""
+    async def check():
+        response = await _resolve(client.chrome.get_text())
+        page_text = response.result_value if response else None
+        return page_text if page_text and page_text != baseline_text else None
+    return check
+